@@ -0,0 +1,187 @@
+#Batch runner: audits many datasets, given in a manifest, over a shared pool of worker processes
+import argparse
+import json
+import math
+import os
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import NormativeApproach as daddna
+from Encoding import EncodedDataset
+
+#check families, in the order they run on every dataset
+FAMILIES = ['Vi', 'Vd', 'Ve', 'Vx']
+
+
+def ReadManifest(manifest_path):
+    '''
+    Reads a manifest of datasets to audit. It is a json list of entries
+        {'name': <str> (optional), 'csv': <str>, 'config': <str>, 'streaming': <bool> (optional), 'chunksize': <int> (optional),
+         'cache_dir': <str> (optional)}
+    where relative paths are taken from the folder of the manifest.
+
+    Returns:
+    list<dict> . entries, with absolute paths and a unique name
+    '''
+    with open(manifest_path) as f:
+        entries = json.load(f)
+    folder = os.path.dirname(os.path.abspath(manifest_path))
+    return NormalizeManifest(entries, folder)
+
+
+def NormalizeManifest(entries, folder = '.'):
+    '''
+    Completes manifest entries (see ReadManifest) given as a list of dicts
+    '''
+    names = set()
+    normalized = []
+    for entry in entries:
+        entry = dict(entry)
+        for key in ('csv', 'config'):
+            if(key not in entry):
+                raise ValueError('Manifest entry {} has no {}'.format(entry, key))
+            entry[key] = os.path.join(folder, entry[key])
+        if(entry.get('cache_dir') is not None):
+            entry['cache_dir'] = os.path.join(folder, entry['cache_dir'])
+        name = entry.get('name') or os.path.splitext(os.path.basename(entry['csv']))[0]
+        unique_name, k = name, 1
+        while(unique_name in names):
+            k += 1
+            unique_name = '{}_{}'.format(name, k)
+        names.add(unique_name)
+        entry['name'] = unique_name
+        normalized.append(entry)
+    return normalized
+
+
+def _Result(entry):
+    '''
+    Returns the empty result of a manifest entry (see RunBatch)
+    '''
+    return {'name': entry['name'], 'csv': entry['csv'], 'config': entry['config'],
+            'status': 'ok', 'violations': {}, 'timings': {'load': 0.0}, 'errors': {}}
+
+
+def _Load(na):
+    '''
+    Loads the data the checks of an audit run on (the dataframe, the count tables in streaming mode or the cached
+    dataset), and encodes every column of the dataframe, so that the checks only time themselves
+    '''
+    encoded = na._Encode(na._Data())
+    if(isinstance(encoded, EncodedDataset)):
+        for column in dict.fromkeys(na.config['I'] + na.config['P'] + [na.config['O']]):
+            encoded.Codes(column)
+
+
+def RunDataset(entry):
+    '''
+    Audits one dataset of a manifest: it is loaded once, and every check family then runs on it in sequence.
+    Never raises: failures are reported in the result, under the check family that failed ('load' if the
+    dataset could not be loaded). The intersectional family (Vx) only runs for the datasets whose config sets
+    _Intersectional.
+
+    Returns:
+    dict . result of the dataset, see RunBatch ('wall' is left to the batch)
+    '''
+    result = _Result(entry)
+    start = time.time()
+    try:
+        na = daddna.NormativeApproachDiscrimination(entry['csv'], entry['config'],
+                                                    streaming = entry.get('streaming', False),
+                                                    chunksize = entry.get('chunksize', 100000),
+                                                    cache_dir = entry.get('cache_dir'))
+        na._CheckConfig()
+        _Load(na)
+    except Exception:
+        result['status'] = 'error'
+        result['errors']['load'] = traceback.format_exc()
+    result['timings']['load'] = time.time() - start
+    if(result['status'] == 'error'):
+        return result
+    for violation_type in FAMILIES:
+        start = time.time()
+        try:
+            if(violation_type != 'Vx' or na._Intersectional):
+                result['violations'][violation_type] = na.RunCheck(violation_type)
+        except Exception:
+            result['status'] = 'error'
+            result['errors'][violation_type] = traceback.format_exc()
+        result['timings'][violation_type] = time.time() - start
+    return result
+
+
+def ToJSON(value):
+    '''
+    Converts violations (with numpy numbers, tuples and infinite ratios) to plain json values
+    '''
+    if(isinstance(value, dict)):
+        return {str(k): ToJSON(v) for k, v in value.items()}
+    if(isinstance(value, (list, tuple))):
+        return [ToJSON(v) for v in value]
+    if(isinstance(value, np.integer)):
+        return int(value)
+    if(isinstance(value, (float, np.floating))):
+        value = float(value)
+        #json has no infinity: it is written as a string, as the ratio of an output no one in the second group got
+        return value if math.isfinite(value) else str(value)
+    if(isinstance(value, np.ndarray)):
+        return ToJSON(value.tolist())
+    return value
+
+
+def RunBatch(entries, output_folder = None, max_workers = None):
+    '''
+    Audits every dataset of a manifest over a shared pool of worker processes. Every dataset is a single task,
+    which loads it once and runs its check families in sequence (see RunDataset). A dataset that fails (missing
+    file, wrong config, ...) is reported as such without stopping the rest of the batch.
+
+    Input:
+    entries : list<dict> . manifest entries (see ReadManifest / NormalizeManifest)
+    output_folder : <str> . folder where a <name>.json result per dataset (and summary.json) is written (None to skip)
+    max_workers : <int> . worker processes (None for one per core)
+    Returns:
+    dict<str, dict> . result of every dataset, by name:
+        {'name', 'csv', 'config', 'status': 'ok'|'error', 'violations': {'Ve','Vi','Vd'} (and 'Vx', see RunDataset),
+         'timings': {'load','Ve','Vi','Vd','Vx','wall'}, 'errors': {violation type, 'load' or 'worker': traceback}}
+        The load timing covers the reading and encoding of the dataset, the timing of every check only the check.
+    '''
+    start = time.time()
+    results = OrderedDict()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(entry, executor.submit(RunDataset, entry)) for entry in entries]
+        for entry, future in futures:
+            try:
+                results[entry['name']] = future.result()
+            except Exception:
+                #the worker itself died (e.g. out of memory)
+                results[entry['name']] = dict(_Result(entry), status = 'error', errors = {'worker': traceback.format_exc()})
+    wall = time.time() - start
+    for result in results.values():
+        result['timings']['wall'] = wall
+        result['violations'] = {k: result['violations'][k] for k in ('Ve', 'Vi', 'Vd', 'Vx') if k in result['violations']}
+
+    if(output_folder is not None):
+        os.makedirs(output_folder, exist_ok=True)
+        for name, result in results.items():
+            with open(os.path.join(output_folder, '{}.json'.format(name)), 'w') as f:
+                json.dump(ToJSON(result), f, indent=2)
+        summary = {'seconds': wall,
+                   'datasets': {name: {'status': r['status'],
+                                       'violations': {k: len(v) for k, v in r['violations'].items()}}
+                                for name, r in results.items()}}
+        with open(os.path.join(output_folder, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Audits every dataset of a manifest for discrimination norm violations')
+    parser.add_argument('manifest', help='json list of {"name", "csv", "config"} entries')
+    parser.add_argument('--output', default='results', help='folder for the json results (default: results)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    args = parser.parse_args()
+    batch = RunBatch(ReadManifest(args.manifest), output_folder=args.output, max_workers=args.workers)
+    for name, result in batch.items():
+        print('{}: {} {}'.format(name, result['status'], {k: len(v) for k, v in result['violations'].items()}))
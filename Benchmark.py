@@ -0,0 +1,325 @@
+#Benchmark suite: times every phase of the three checks on seeded synthetic datasets, and compares runs across commits
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import NormativeApproach as daddna
+from Encoding import EncodedDataset
+from MutualInformation import NMIKernel
+from ChiSquare import BatchChi2Contingency
+from Instrumentation import PeakRSS
+
+#phases timed for every case, in order
+PHASES = ['load', 'explicit', 'encode', 'combinations', 'nmi', 'implicit', 'crosstabs', 'chi2', 'indirect']
+#a phase is reported as a regression when it is this much slower than in the baseline
+DEFAULT_TOLERANCE = 0.25
+#phases faster than this (seconds) are too noisy to be compared
+_MIN_COMPARED_SECONDS = 0.005
+#seconds that importing NormativeApproach may take (see ImportTime)
+DEFAULT_IMPORT_BUDGET = 0.5
+#heavy dependencies that are only imported once a check needs them
+_LAZY_MODULES = ('pandas', 'scipy', 'sklearn')
+
+
+def SyntheticDataset(n_rows, n_inputs = 4, n_protected = 2, i_cardinality = 5, p_cardinality = 3,
+                     proxy_strength = 0.9, impact = 0.5, seed = 0):
+    '''
+    Generates a categorical dataset with planted discrimination:
+        - input i0 is a proxy of protected p0: it copies the value of p0 with probability proxy_strength
+        - the output is positive for half of the rows, but for only (1 - impact) of that rate in the first group of p0
+    Every other column is uniformly random.
+
+    Input:
+    n_rows : int . number of rows
+    n_inputs, n_protected : int . number of input (i0, i1, ...) and protected (p0, p1, ...) columns
+    i_cardinality, p_cardinality : int . distinct values of every input and protected column
+    proxy_strength : float in [0,1] . strength of the planted proxy (0 for none)
+    impact : float in [0,1] . strength of the planted disparate impact (0 for none)
+    seed : int . seed of the generator, the same arguments always give the same dataset
+    Returns:
+    df : dataframe with columns i0.., p0.., output
+    config : {'I', 'P', 'PNU', 'O'} . roles of the columns, as in the CONFIG of a config file
+    '''
+    rng = np.random.default_rng(seed)
+    data = {}
+    protected = [rng.integers(0, p_cardinality, n_rows) for _ in range(n_protected)]
+    for k in range(n_inputs):
+        codes = rng.integers(0, i_cardinality, n_rows)
+        if(k == 0 and n_protected > 0):
+            copy = rng.random(n_rows) < proxy_strength
+            codes[copy] = protected[0][copy] % i_cardinality
+        data['i{}'.format(k)] = np.char.add('v', codes.astype(str))
+    for k, codes in enumerate(protected):
+        data['p{}'.format(k)] = np.char.add('g', codes.astype(str))
+    rate = np.full(n_rows, 0.5)
+    if(n_protected > 0):
+        rate[protected[0] == 0] *= 1 - impact
+    data['output'] = np.where(rng.random(n_rows) < rate, 'yes', 'no')
+    df = pd.DataFrame(data)
+    config = {'I': ['i{}'.format(k) for k in range(n_inputs)],
+              'P': ['p{}'.format(k) for k in range(n_protected)],
+              'PNU': [],
+              'O': 'output'}
+    return df, config
+
+
+def WriteConfig(path, config, max_comb_size = 3, min_corr = 0.6, threshold = 0.8, min_pvalue = 0.05):
+    '''
+    Writes a config file (see config_template.py) for a dataset, with no exceptions
+    '''
+    with open(path, 'w') as f:
+        f.write('CONFIG = {!r}\n'.format(config))
+        f.write("EXCEPTIONS = {'Explicit': [], 'Implicit': [], 'Indirect': []}\n")
+        f.write('_ImplicitDiscrimination_max_proxy_combo_size = {!r}\n'.format(max_comb_size))
+        f.write('_ImplicitDiscrimination_min_corr = {!r}\n'.format(min_corr))
+        f.write('_IndirectDiscrimination_Threshold = {!r}\n'.format(threshold))
+        f.write('_IndirectDiscrimination_MinPValue = {!r}\n'.format(min_pvalue))
+
+
+def _Measure(function, repeat):
+    '''
+    Runs function once under tracemalloc for its peak memory, then repeat times for its time.
+
+    Returns:
+    {'seconds': best time, 'mean_seconds', 'peak_bytes'}, and the value returned by the last run
+    '''
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'mean_seconds': float(np.mean(times)), 'peak_bytes': peak}, result
+
+
+def _Load(csv_path, config_path):
+    na = daddna.NormativeApproachDiscrimination(csv_path, config_path)
+    #the dataframe is only parsed the first time it is used
+    na.df
+    return na
+
+
+def BenchmarkCase(folder, n_rows, n_inputs = 4, n_protected = 2, i_cardinality = 5, p_cardinality = 3,
+                  max_comb_size = 3, proxy_strength = 0.9, impact = 0.5, seed = 0, repeat = 3):
+    '''
+    Times every phase of the three checks on a synthetic dataset (see SyntheticDataset):
+        load : NormativeApproachDiscrimination construction and csv parsing (config import, header and dataframe)
+        explicit : CheckExplicitDiscrimination
+        encode : integer encoding of the I, P and O columns
+        combinations : generation of the combinations of inputs and of their combined keys
+        nmi : NMI of every combination with every protected column
+        implicit : CheckImplicitDiscrimination (from the dataframe, encoding included)
+        crosstabs : protected x output count tables
+        chi2 : chi-square tests of every pair of subpopulations of every protected column
+        indirect : CheckIndirectDiscrimination (from the dataframe, encoding included)
+
+    Input:
+    folder : <str> . folder where the csv and config of the case are written
+    n_rows ... seed : see SyntheticDataset. max_comb_size : see config_template.py
+    repeat : int . timed runs of every phase (the best one is reported)
+    Returns:
+    {'params': arguments of the case, 'phases': {phase: {'seconds', 'mean_seconds', 'peak_bytes'}},
+     'violations': {'Ve', 'Vi', 'Vd'}: number of violations found}
+    '''
+    params = {'n_rows': n_rows, 'n_inputs': n_inputs, 'n_protected': n_protected, 'i_cardinality': i_cardinality,
+              'p_cardinality': p_cardinality, 'max_comb_size': max_comb_size, 'proxy_strength': proxy_strength,
+              'impact': impact, 'seed': seed}
+    df, config = SyntheticDataset(n_rows, n_inputs, n_protected, i_cardinality, p_cardinality, proxy_strength, impact, seed)
+    csv_path = os.path.join(folder, 'synthetic_{}.csv'.format(_CaseKey(params)))
+    config_path = os.path.join(folder, 'config_synthetic_{}.py'.format(_CaseKey(params)))
+    df.to_csv(csv_path, index=False)
+    WriteConfig(config_path, config, max_comb_size)
+    I, P, O = config['I'], config['P'], config['O']
+
+    phases = {}
+    phases['load'], na = _Measure(lambda: _Load(csv_path, config_path), repeat)
+    phases['explicit'], ve = _Measure(lambda: na.CheckExplicitDiscrimination(na.df, P, []), repeat)
+
+    def Encode():
+        encoded = EncodedDataset(na.df)
+        for c in I + P + [O]:
+            encoded.Codes(c)
+        return encoded
+    phases['encode'], encoded = _Measure(Encode, repeat)
+
+    def Combinations():
+        combos = [list(c) for size in range(1, min(max_comb_size, len(I)) + 1) for c in combinations(I, size)]
+        for combo in combos:
+            encoded.Combine(combo)
+        return combos
+    phases['combinations'], combos = _Measure(Combinations, repeat)
+
+    def Scores():
+        kernel = NMIKernel()
+        return [kernel.EvaluateContingencies(*encoded.Contingencies(combo, P)) for combo in combos]
+    phases['nmi'], _ = _Measure(Scores, repeat)
+
+    def Implicit():
+        na._encoded = None
+        return na.CheckImplicitDiscrimination(na.df, I, P, [], na._ImplicitDiscrimination_min_corr, max_comb_size = max_comb_size)
+    phases['implicit'], vi = _Measure(Implicit, repeat)
+
+    phases['crosstabs'], crosstabs = _Measure(lambda: [encoded.Crosstab(p, O) for p in P], repeat)
+
+    #one 2xk table per pair of values of every protected column, whether it shows disparate impact or not
+    tables = np.array([counts[list(pair)] for counts in crosstabs for pair in combinations(range(len(counts)), 2)]
+                      ).reshape((-1, 2, encoded.Cardinality(O)))
+    phases['chi2'], _ = _Measure(lambda: BatchChi2Contingency(tables), repeat)
+
+    def Indirect():
+        na._encoded = None
+        return na.CheckIndirectDiscrimination(na.df, P, O, [], na._IndirectDiscrimination_min_prop, na._IndirectDiscrimination_min_pvalue)
+    phases['indirect'], vd = _Measure(Indirect, repeat)
+
+    return {'params': params, 'phases': phases, 'violations': {'Ve': len(ve), 'Vi': len(vi), 'Vd': len(vd)}}
+
+
+def _CaseKey(params):
+    return '_'.join('{}{}'.format(k, params[k]) for k in sorted(params))
+
+
+def _Commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def RunBenchmark(rows = (10000, 100000), inputs = (4,), protected = (2,), i_cardinality = 5, p_cardinality = 3,
+                 max_comb_size = 3, seed = 0, repeat = 3, folder = None):
+    '''
+    Runs BenchmarkCase over the grid rows x inputs x protected, giving the scaling curves of every phase.
+
+    Returns:
+    {'commit', 'python', 'numpy', 'pandas', 'platform', 'peak_rss_bytes', 'cases': list of BenchmarkCase results}
+    '''
+    cases = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows, n_inputs, n_protected in itertools.product(rows, inputs, protected):
+            cases.append(BenchmarkCase(folder or tmp, n_rows, n_inputs, n_protected, i_cardinality, p_cardinality,
+                                       max_comb_size, seed = seed, repeat = repeat))
+    return {'commit': _Commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'peak_rss_bytes': PeakRSS(),
+            'cases': cases}
+
+
+def ImportTime(module = 'NormativeApproach', repeat = 5):
+    '''
+    Measures the time it takes to import a module, each time in a fresh interpreter, and which of the heavy
+    dependencies (_LAZY_MODULES) that import pulls in.
+
+    Input:
+    module : <str> . module imported
+    repeat : int . timed imports (the best one is reported)
+    Returns:
+    {'module', 'seconds': best time, 'mean_seconds', 'imported': list<str> . heavy dependencies imported}
+    '''
+    script = ('import json, sys, time\n'
+              'start = time.perf_counter()\n'
+              'import {}\n'
+              'seconds = time.perf_counter() - start\n'
+              'print(json.dumps([seconds, [m for m in {!r} if m in sys.modules]]))').format(module, _LAZY_MODULES)
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        seconds, imported = json.loads(output.strip().splitlines()[-1])
+        times.append(seconds)
+    return {'module': module, 'seconds': min(times), 'mean_seconds': float(np.mean(times)), 'imported': imported}
+
+
+def Compare(baseline, current, tolerance = DEFAULT_TOLERANCE):
+    '''
+    Compares two RunBenchmark results, case by case and phase by phase.
+
+    Input:
+    baseline, current : RunBenchmark results (e.g. read from the json of two commits)
+    tolerance : float . relative slowdown (time or peak memory) above which a phase is a regression
+    Returns:
+    list<{'case', 'phase', 'metric', 'baseline', 'current', 'ratio'}> . regressions found
+    '''
+    baseline_cases = {_CaseKey(case['params']): case for case in baseline['cases']}
+    regressions = []
+    for case in current['cases']:
+        key = _CaseKey(case['params'])
+        if(key not in baseline_cases):
+            continue
+        for phase, measure in case['phases'].items():
+            before = baseline_cases[key]['phases'].get(phase)
+            if(before is None):
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if(metric == 'seconds' and max(before[metric], measure[metric]) < _MIN_COMPARED_SECONDS):
+                    continue
+                if(before[metric] > 0 and measure[metric] > before[metric] * (1 + tolerance)):
+                    regressions.append({'case': key, 'phase': phase, 'metric': metric, 'baseline': before[metric],
+                                        'current': measure[metric], 'ratio': measure[metric] / before[metric]})
+    return regressions
+
+
+def _Print(results):
+    print('{:>9} {:>3} {:>3} '.format('rows', 'I', 'P') + ' '.join('{:>12}'.format(p) for p in PHASES))
+    for case in results['cases']:
+        params = case['params']
+        print('{:>9} {:>3} {:>3} '.format(params['n_rows'], params['n_inputs'], params['n_protected']) +
+              ' '.join('{:>11.4f}s'.format(case['phases'][p]['seconds']) for p in PHASES))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times every phase of the discrimination checks on synthetic datasets')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='dataset sizes (default: 10000 100000)')
+    parser.add_argument('--inputs', type=int, nargs='+', default=[4], help='numbers of input columns (default: 4)')
+    parser.add_argument('--protected', type=int, nargs='+', default=[2], help='numbers of protected columns (default: 2)')
+    parser.add_argument('--i-cardinality', type=int, default=5, help='values of every input column (default: 5)')
+    parser.add_argument('--p-cardinality', type=int, default=3, help='values of every protected column (default: 3)')
+    parser.add_argument('--max-comb-size', type=int, default=3, help='largest combination of inputs (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic datasets (default: 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of every phase (default: 3)')
+    parser.add_argument('--output', default=None, help='json file where the results are written')
+    parser.add_argument('--compare', default=None, help='json results of a previous run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='relative slowdown reported as a regression (default: 0.25)')
+    parser.add_argument('--import-budget', type=float, nargs='?', const=DEFAULT_IMPORT_BUDGET, default=None,
+                        help='only check that importing NormativeApproach takes at most this many seconds (default: 0.5) '
+                             'and imports none of {}, failing otherwise'.format(', '.join(_LAZY_MODULES)))
+    args = parser.parse_args()
+    if(args.import_budget is not None):
+        measure = ImportTime(repeat = args.repeat)
+        print('import {module}: {seconds:.4f}s (mean {mean_seconds:.4f}s)'.format(**measure))
+        failed = False
+        if(measure['seconds'] > args.import_budget):
+            print('[!] over the budget of {:.4f}s'.format(args.import_budget))
+            failed = True
+        if(len(measure['imported']) > 0):
+            print('[!] imports {} right away'.format(', '.join(measure['imported'])))
+            failed = True
+        raise SystemExit(1 if failed else 0)
+    results = RunBenchmark(args.rows, args.inputs, args.protected, args.i_cardinality, args.p_cardinality,
+                           args.max_comb_size, args.seed, args.repeat)
+    _Print(results)
+    if(args.output is not None):
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if(args.compare is not None):
+        with open(args.compare) as f:
+            regressions = Compare(json.load(f), results, args.tolerance)
+        for r in regressions:
+            print('[!] {case} {phase}: {metric} {baseline:.4g} -> {current:.4g} (x{ratio:.2f})'.format(**r))
+        if(len(regressions) > 0):
+            raise SystemExit(1)
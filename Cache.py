@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+from Encoding import EncodedDataset, FactorizeColumn
+from Loading import LoadDataset, ReadColumns
+
+#default size of a cache folder, in bytes
+DEFAULT_MAX_BYTES = 1 << 30
+#bytes read at once while hashing a csv
+_HASH_BLOCK = 1 << 20
+#index of the content hash of every csv already hashed, by (path, size, modification time)
+_HASH_INDEX = 'hashes.json'
+
+
+def _Digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _AtomicWrite(path, write):
+    '''
+    Writes a file through a temporary one, so that readers (possibly other processes) never see it half written
+    '''
+    tmp = '{}.tmp-{}'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _FolderBytes(folder):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+
+
+class CachedDataset(EncodedDataset):
+    def __init__(self, folder, cache = None):
+        '''
+        EncodedDataset backed by an entry of a DatasetCache. Codes are memory-mapped .npy files, so opening
+        an entry reads no data, and the results that do not depend on thresholds nor exceptions (NMI scores
+        of the proxy combinations and crosstabs of protected and output columns) are stored in the entry
+        the first time they are computed.
+
+        Input:
+        folder : <str> . folder of the cache entry (see DatasetCache.Open)
+        cache : DatasetCache . cache the entry belongs to, kept within its size as results are stored
+        '''
+        self.folder = folder
+        self.cache = cache
+        with open(os.path.join(folder, 'meta.json')) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(folder, 'labels.pkl'), 'rb') as f:
+            self._labels, self._appearance = pickle.load(f)
+        self.df = None
+        self.n_rows = self.meta['n_rows']
+        #empty files cannot be mapped
+        mmap_mode = 'r' if self.n_rows > 0 else None
+        self._codes = {c: np.load(os.path.join(folder, 'codes', '{}.npy'.format(k)), mmap_mode=mmap_mode)
+                       for k, c in enumerate(self.meta['encoded'])}
+
+    def _Factorize(self, column):
+        if(column not in self._codes):
+            raise KeyError('Column {} is not in the cache entry {}'.format(column, self.folder))
+
+    def LabelsByAppearance(self, column):
+        self._Factorize(column)
+        return list(self._appearance[column])
+
+    def _Load(self, name):
+        path = os.path.join(self.folder, name)
+        return np.load(path) if os.path.exists(path) else None
+
+    def _Store(self, name, values):
+        _AtomicWrite(os.path.join(self.folder, name), lambda f: np.save(f, values))
+        if(self.cache is not None):
+            self.cache.Evict(keep = os.path.basename(self.folder))
+
+    def Crosstab(self, a, b):
+        name = 'crosstab_{}.npy'.format(_Digest([a, b]))
+        counts = self._Load(name)
+        if(counts is None):
+            counts = super().Crosstab(a, b)
+            self._Store(name, counts)
+        return counts
+
+    def Scores(self, combos, P):
+        '''
+        Returns the NMI matrix of the combinations of columns with the protected columns stored in the entry,
+        as np.array<float> of shape (combinations, protected columns), or None if it was never stored
+        '''
+        return self._Load('scores_{}.npy'.format(_Digest([combos, P])))
+
+    def StoreScores(self, combos, P, scores):
+        self._Store('scores_{}.npy'.format(_Digest([combos, P])), np.array(scores, dtype=float).reshape((len(combos), len(P))))
+
+
+class DatasetCache():
+    def __init__(self, folder, max_bytes = DEFAULT_MAX_BYTES):
+        '''
+        On-disk cache of integer-encoded datasets. An entry is keyed by the content hash of the csv and the
+        roles of its columns (I, P, O), and holds the codes of those columns as .npy files together with
+        the NMI scores and crosstabs computed on them (see CachedDataset). Re-auditing a dataset with other
+        thresholds or exceptions then neither parses the csv nor recomputes any NMI or crosstab.
+        The folder is kept under max_bytes by evicting the least recently used entries.
+
+        Input:
+        folder : <str> . cache folder (created if it does not exist)
+        max_bytes : int . maximum size of the cache folder
+        '''
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(folder, exist_ok=True)
+
+    def FileHash(self, csv_path_dataset):
+        '''
+        Returns the sha256 of the contents of a file. It is only recomputed when the size or
+        modification time of the file changed since it was last hashed.
+        '''
+        stat = os.stat(csv_path_dataset)
+        signature = [os.path.abspath(csv_path_dataset), stat.st_size, stat.st_mtime_ns]
+        index_path = os.path.join(self.folder, _HASH_INDEX)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        known = index.get(signature[0])
+        if(known is not None and known[:2] == signature[1:]):
+            return known[2]
+        digest = hashlib.sha256()
+        with open(csv_path_dataset, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+                digest.update(block)
+        index[signature[0]] = signature[1:] + [digest.hexdigest()]
+        _AtomicWrite(index_path, lambda f: f.write(json.dumps(index).encode('utf-8')))
+        return digest.hexdigest()
+
+    def Key(self, csv_path_dataset, I, P, O):
+        '''
+        Key of the entry of a dataset: content hash of the csv and roles of its columns
+        '''
+        return '{}-{}'.format(self.FileHash(csv_path_dataset)[:32], _Digest({'I': list(I), 'P': list(P), 'O': O}))
+
+    def Open(self, csv_path_dataset, I, P, O):
+        '''
+        Returns the CachedDataset of a csv dataset, parsing and encoding the csv only if it is not cached yet.
+
+        Input:
+        csv_path_dataset : <str> . csv dataset, in which the first row are the columns
+        I, P : list<str> . input and protected attributes as column names
+        O : <str> . output column name
+        Returns:
+        CachedDataset
+        '''
+        key = self.Key(csv_path_dataset, I, P, O)
+        folder = os.path.join(self.folder, key)
+        if(not os.path.exists(os.path.join(folder, 'meta.json'))):
+            self._Build(csv_path_dataset, I, P, O, folder)
+            self.Evict(keep = key)
+        #the modification time of meta.json records when the entry was last used
+        os.utime(os.path.join(folder, 'meta.json'))
+        return CachedDataset(folder, self)
+
+    def _Build(self, csv_path_dataset, I, P, O, folder):
+        columns = list(dict.fromkeys(list(I) + list(P) + [O]))
+        header = ReadColumns(csv_path_dataset)
+        df = LoadDataset(csv_path_dataset, columns)
+        #the entry is built aside and moved in place at once, so concurrent runs never see it half built
+        tmp = '{}.tmp-{}'.format(folder, os.getpid())
+        os.makedirs(os.path.join(tmp, 'codes'), exist_ok=True)
+        labels, appearance = {}, {}
+        for k, c in enumerate(columns):
+            codes, labels[c] = FactorizeColumn(df[c])
+            uniques, first = np.unique(codes, return_index=True)
+            appearance[c] = [labels[c][u] for u in uniques[np.argsort(first, kind='stable')]]
+            np.save(os.path.join(tmp, 'codes', '{}.npy'.format(k)), codes)
+        with open(os.path.join(tmp, 'labels.pkl'), 'wb') as f:
+            pickle.dump((labels, appearance), f)
+        meta = {'csv': os.path.abspath(csv_path_dataset), 'columns': header, 'encoded': columns,
+                'roles': {'I': list(I), 'P': list(P), 'O': O}, 'n_rows': len(df), 'created': time.time()}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        try:
+            os.rename(tmp, folder)
+        except OSError:
+            #another process built the same entry meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def Entries(self):
+        '''
+        Returns the entries of the cache as list<(key, last used time, bytes)>, least recently used first
+        '''
+        entries = []
+        for key in os.listdir(self.folder):
+            meta = os.path.join(self.folder, key, 'meta.json')
+            if('.tmp-' in key or not os.path.exists(meta)):
+                continue
+            entries.append((key, os.path.getmtime(meta), _FolderBytes(os.path.join(self.folder, key))))
+        return sorted(entries, key=lambda e: e[1])
+
+    def Bytes(self):
+        return sum(size for _, _, size in self.Entries())
+
+    def Evict(self, keep = None):
+        '''
+        Removes the least recently used entries until the cache fits in max_bytes. The entry keep is never removed.
+        '''
+        entries = self.Entries()
+        total = sum(size for _, _, size in entries)
+        for key, _, size in entries:
+            if(total <= self.max_bytes):
+                break
+            if(key == keep):
+                continue
+            #entries still mapped by another process remain readable until they are closed
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors=True)
+            total -= size
+
+    def Clear(self):
+        for key, _, _ in self.Entries():
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors=True)
@@ -0,0 +1,69 @@
+import numpy as np
+
+#multiple-comparison corrections available for the p-values of a family of tests
+CORRECTIONS = ('holm', 'bh')
+
+
+def BatchChi2Contingency(tables, correction = True):
+    '''
+    Chi-square test of independence of many 2xk contingency tables at once, following the same
+    arithmetic as scipy.stats.chi2_contingency (including Yates' correction when a table has one
+    degree of freedom). Columns whose total is zero are left out of their table.
+
+    Input:
+    tables : np.array of shape (m, 2, k) . observed counts of the m tables
+    correction : bool . apply Yates' continuity correction to tables with one degree of freedom
+    Returns:
+    chi2 : np.array<float> of shape (m,) . test statistics
+    pvalues : np.array<float> of shape (m,)
+    dof : np.array<int> of shape (m,) . degrees of freedom
+    '''
+    from scipy import stats
+    observed = np.asarray(tables, dtype=np.float64)
+    row_totals = observed.sum(axis=2)
+    col_totals = observed.sum(axis=1)
+    totals = row_totals.sum(axis=1)
+    valid = col_totals > 0
+    dof = valid.sum(axis=1) - 1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = row_totals[:, :, None] * col_totals[:, None, :] / totals[:, None, None]
+        if(correction):
+            diff = expected - observed
+            yates = (dof == 1)[:, None, None]
+            observed = np.where(yates, observed + np.minimum(0.5, np.abs(diff)) * np.sign(diff), observed)
+        terms = np.where(valid[:, None, :], (observed - expected) ** 2 / expected, 0.0)
+    chi2 = terms.sum(axis=(1, 2))
+    pvalues = stats.chi2.sf(chi2, np.maximum(dof, 1))
+    #tables with a single output value carry no evidence
+    chi2[dof <= 0] = 0.0
+    pvalues[dof <= 0] = 1.0
+    return chi2, pvalues, dof
+
+
+def AdjustPValues(pvalues, method):
+    '''
+    Adjusts a family of p-values for multiple comparisons.
+
+    Input:
+    pvalues : array-like<float> . p-values of every test in the family
+    method : 'holm' (Holm-Bonferroni, controls the family-wise error rate) or
+             'bh' (Benjamini-Hochberg, controls the false discovery rate)
+    Returns:
+    np.array<float> . adjusted p-values, in the same order
+    '''
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    m = len(pvalues)
+    if(m == 0):
+        return pvalues
+    order = np.argsort(pvalues, kind='stable')
+    ranked = pvalues[order]
+    if(method == 'holm'):
+        adjusted = np.maximum.accumulate(ranked * (m - np.arange(m)))
+    elif(method == 'bh'):
+        adjusted = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError('Unknown p-value correction {}, expected one of {}'.format(method, CORRECTIONS))
+    result = np.empty(m)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
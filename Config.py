@@ -0,0 +1,290 @@
+#Audit configs: python, json or toml files, parsed into a validated AuditConfig once and again only when they change
+import argparse
+import copy
+import importlib.util
+import json
+import numbers
+import os
+import sys
+from ChiSquare import CORRECTIONS
+
+#config format of every file extension
+FORMATS = {'.py': 'py', '.json': 'json', '.toml': 'toml'}
+#roles of the columns in CONFIG (PNU is optional)
+ROLES = ('I', 'P', 'PNU', 'O')
+#families of EXCEPTIONS, those not given are empty
+EXCEPTION_FAMILIES = ('Explicit', 'Implicit', 'Indirect', 'Intersectional')
+
+_configs = {}
+
+
+def _IsNumber(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _IsInteger(value):
+    return isinstance(value, numbers.Integral) and not isinstance(value, bool)
+
+
+def _IsColumns(value):
+    return isinstance(value, (list, tuple)) and all(isinstance(c, str) for c in value)
+
+
+#options besides CONFIG and EXCEPTIONS: (required, what a valid value is, test of the value)
+#the optional ones left out of a config get their default in NormativeApproachDiscrimination
+OPTIONS = {
+    '_ImplicitDiscrimination_max_proxy_combo_size': (True, 'a positive integer or None', lambda v: v is None or (_IsInteger(v) and v >= 1)),
+    '_ImplicitDiscrimination_min_corr': (True, 'a number in [0, 1]', lambda v: _IsNumber(v) and 0 <= v <= 1),
+    '_IndirectDiscrimination_Threshold': (True, 'a number in [0, 1]', lambda v: _IsNumber(v) and 0 <= v <= 1),
+    '_IndirectDiscrimination_MinPValue': (True, 'a number in [0, 1]', lambda v: _IsNumber(v) and 0 <= v <= 1),
+    '_IndirectDiscrimination_PValueCorrection': (False, 'one of {}'.format((None,) + CORRECTIONS), lambda v: v in (None,) + CORRECTIONS),
+    '_ImplicitDiscrimination_nmi_backend': (False, "'native' or 'sklearn'", lambda v: v in ('native', 'sklearn')),
+    '_ImplicitDiscrimination_search': (False, "'exhaustive' or 'lattice'", lambda v: v in ('exhaustive', 'lattice')),
+    '_ImplicitDiscrimination_time_budget': (False, 'a positive number or None', lambda v: v is None or (_IsNumber(v) and v >= 0)),
+    '_ImplicitDiscrimination_memory_budget': (False, 'a positive number or None', lambda v: v is None or (_IsNumber(v) and v >= 0)),
+    '_ImplicitDiscrimination_n_jobs': (False, 'an integer or None', lambda v: v is None or _IsInteger(v)),
+    '_ImplicitDiscrimination_top_k': (False, 'a positive integer or None', lambda v: v is None or (_IsInteger(v) and v >= 0)),
+    '_Intersectional': (False, 'True or False', lambda v: isinstance(v, bool)),
+    '_Intersectional_max_comb_size': (False, 'a positive integer or None', lambda v: v is None or (_IsInteger(v) and v >= 1)),
+    '_Intersectional_min_support': (False, 'a positive number', lambda v: _IsNumber(v) and v >= 0),
+    '_Cache_dir': (False, 'a folder or None', lambda v: v is None or isinstance(v, str)),
+    '_Cache_max_bytes': (False, 'a positive integer', lambda v: _IsInteger(v) and v >= 0),
+    '_Approximate': (False, 'True or False', lambda v: isinstance(v, bool)),
+    '_Approximate_sample_rows': (False, 'a positive integer', lambda v: _IsInteger(v) and v >= 1),
+    '_Approximate_confidence': (False, 'a number in (0, 1)', lambda v: _IsNumber(v) and 0 < v < 1),
+    '_Approximate_refine': (False, 'True or False', lambda v: isinstance(v, bool)),
+    '_Approximate_seed': (False, 'an integer or None', lambda v: v is None or _IsInteger(v)),
+}
+
+
+def _Freeze(value):
+    '''
+    Hashable equivalent of a config value: dicts become sorted tuples of items, and lists tuples
+    '''
+    if(isinstance(value, dict)):
+        return (dict, tuple(sorted((k, _Freeze(v)) for k, v in value.items())))
+    if(isinstance(value, (list, tuple))):
+        return tuple(_Freeze(v) for v in value)
+    return value
+
+
+class AuditConfig():
+    def __init__(self, values, path = None):
+        '''
+        Validated audit config: CONFIG, EXCEPTIONS and the options of OPTIONS set in a config file, read as
+        attributes (config.CONFIG, getattr(config, '_Approximate', False), ...). It is read-only and hashable,
+        and two configs with the same values are equal whatever their file or format.
+        CONFIG and EXCEPTIONS are returned as copies, which can be modified without changing the config.
+
+        Input:
+        values : dict . CONFIG, EXCEPTIONS and options, already validated (see Validate)
+        path : <str> . file the config was read from
+        '''
+        object.__setattr__(self, '_values', values)
+        object.__setattr__(self, 'path', path)
+        object.__setattr__(self, 'key', _Freeze(values))
+
+    def __getattr__(self, name):
+        values = self.__dict__.get('_values', {})
+        if(name not in values):
+            raise AttributeError('The config {} does not set {}'.format(self.__dict__.get('path'), name))
+        return copy.deepcopy(values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError('AuditConfig is read-only')
+
+    def __eq__(self, other):
+        return isinstance(other, AuditConfig) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'AuditConfig({})'.format(self.path)
+
+    def ToDict(self):
+        return copy.deepcopy(self._values)
+
+
+def _Error(path, message):
+    return ValueError('Invalid config {}: {}'.format(path, message))
+
+
+def _ValidateExceptions(path, exceptions):
+    if(not isinstance(exceptions, dict)):
+        raise _Error(path, 'EXCEPTIONS must be a dict of {}'.format(list(EXCEPTION_FAMILIES)))
+    unknown = set(exceptions) - set(EXCEPTION_FAMILIES)
+    if(unknown):
+        raise _Error(path, 'unknown exception families {}, they are {}'.format(sorted(unknown), list(EXCEPTION_FAMILIES)))
+    exceptions = {family: list(exceptions.get(family) or []) for family in EXCEPTION_FAMILIES}
+    if(not _IsColumns(exceptions['Explicit'])):
+        raise _Error(path, 'Explicit exceptions must be a list of protected columns')
+    for ex in exceptions['Implicit']:
+        if(not isinstance(ex, dict) or not _IsColumns(ex.get('I')) or not ex.get('I') or not isinstance(ex.get('P'), str)):
+            raise _Error(path, "Implicit exceptions must be of the form {{'I': list<str>, 'P': str}}, not {}".format(ex))
+    for k, ex in enumerate(exceptions['Indirect']):
+        if(not isinstance(ex, dict) or not isinstance(ex.get('P'), str) or not isinstance(ex.get('O'), str) or 'Ov' not in ex
+           or not isinstance(ex.get('Pv'), (list, tuple)) or len(ex['Pv']) != 2):
+            raise _Error(path, "Indirect exceptions must be of the form {{'P': str, 'Pv': (str, str), 'O': str, 'Ov': str}}, not {}".format(ex))
+        #json and toml have no tuples
+        exceptions['Indirect'][k] = dict(ex, Pv=tuple(ex['Pv']))
+    for k, ex in enumerate(exceptions['Intersectional']):
+        if(not isinstance(ex, dict) or not _IsColumns(ex.get('P')) or not isinstance(ex.get('O'), str) or 'Ov' not in ex
+           or not isinstance(ex.get('Pv'), (list, tuple)) or len(ex['Pv']) != 2
+           or any(not isinstance(values, (list, tuple)) or len(values) != len(ex['P']) for values in ex['Pv'])):
+            raise _Error(path, "Intersectional exceptions must be of the form "
+                               "{{'P': list<str>, 'Pv': (list<str>, list<str>), 'O': str, 'Ov': str}}, not {}".format(ex))
+        exceptions['Intersectional'][k] = dict(ex, Pv=tuple(list(values) for values in ex['Pv']))
+    return exceptions
+
+
+def Validate(values, path = None, strict = True):
+    '''
+    Validates the values of a config: the columns of CONFIG, the form of every exception, and the type and range
+    of every option of OPTIONS. Raises ValueError on the first invalid value, naming it.
+
+    Input:
+    values : dict . names set in the config file
+    path : <str> . config file, for the error messages
+    strict : bool . whether names that are not config options are errors (they are ignored otherwise, e.g. the
+        imports and helper variables of python configs)
+    Returns:
+    dict . CONFIG, EXCEPTIONS (with every family) and the options set
+    '''
+    names = set(values) - {'CONFIG', 'EXCEPTIONS'} - set(OPTIONS)
+    if(strict and names):
+        raise _Error(path, 'unknown options {}'.format(sorted(names)))
+    missing = [name for name in ['CONFIG', 'EXCEPTIONS'] + [n for n, (required, _, _) in OPTIONS.items() if required] if name not in values]
+    if(missing):
+        raise _Error(path, 'missing {}'.format(missing))
+    config = values['CONFIG']
+    if(not isinstance(config, dict) or set(config) - set(ROLES) or any(role not in config for role in ('I', 'P', 'O'))):
+        raise _Error(path, "CONFIG must be of the form {{'I': list<str>, 'P': list<str>, 'PNU': list<str>, 'O': str}}, not {}".format(config))
+    if(not _IsColumns(config['I']) or not _IsColumns(config['P']) or not _IsColumns(config.get('PNU', [])) or not isinstance(config['O'], str)):
+        raise _Error(path, "CONFIG must be of the form {{'I': list<str>, 'P': list<str>, 'PNU': list<str>, 'O': str}}, not {}".format(config))
+    config = {role: list(columns) if role != 'O' else columns for role, columns in config.items()}
+    validated = {'CONFIG': config, 'EXCEPTIONS': _ValidateExceptions(path, values['EXCEPTIONS'])}
+    for name, (_, description, test) in OPTIONS.items():
+        if(name in values):
+            if(not test(values[name])):
+                raise _Error(path, '{} must be {}, not {!r}'.format(name, description, values[name]))
+            validated[name] = values[name]
+    return validated
+
+
+def ValidateColumns(CONFIG, EXCEPTIONS, columns):
+    '''
+    Checks the columns of a config against the columns of a dataset, which are known without reading its rows
+    (see Loading.ReadColumns). Raises ValueError if they do not match.
+
+    Input:
+    CONFIG : {'I': list<str>, 'P': list<str>, 'O': str} . roles of the columns
+    EXCEPTIONS : dict . exceptions of every family
+    columns : list<str> . columns of the dataset
+    '''
+    require_columns = CONFIG['I'] + CONFIG['P'] + [CONFIG['O']]
+    if( len(set(CONFIG['I'])) != len(CONFIG['I']) or \
+       len(set(CONFIG['P'])) != len(CONFIG['P'])):
+        raise ValueError('I and/or P variables contain duplicated columns')
+    if(len(set(require_columns)) != len(require_columns)):
+        raise ValueError('I,P,O variables contain repeated columns')
+    if(not( set(require_columns).issubset(set(columns)) )):
+        raise ValueError('Dataset column names do not correspond with I,P,O variables set in config {}'.format(require_columns))
+    for family in EXCEPTION_FAMILIES:
+        for ex in EXCEPTIONS.get(family, []):
+            if(family == 'Explicit'):
+                used = [ex]
+            elif(family == 'Implicit'):
+                used = list(ex['I']) + [ex['P']]
+            else:
+                used = ([ex['P']] if isinstance(ex['P'], str) else list(ex['P'])) + [ex['O']]
+            unknown = [c for c in used if c not in columns]
+            if(unknown):
+                raise ValueError('{} exception {} refers to columns not in the dataset {}'.format(family, ex, unknown))
+
+
+def _Read(path, fmt):
+    if(fmt == 'json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    if(fmt == 'toml'):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError('toml configs need python 3.11 or tomli (pip3 install tomli)')
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    spec = importlib.util.spec_from_file_location("module.name", path)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    return {name: value for name, value in vars(config).items() if not name.startswith('__')}
+
+
+def LoadConfig(path):
+    '''
+    Returns the AuditConfig of a config file: a python file (see config_template.py), or a json or toml file
+    setting the same names. The file is read and validated once, and again only when its size or modification
+    time change, so the audits of a config share a single parse.
+    Names of json and toml configs that are not config options are errors (e.g. a misspelt option), while python
+    configs may define other names.
+
+    Input:
+    path : <str> . config file, its format is given by its extension (see FORMATS)
+    Returns:
+    AuditConfig
+    '''
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if(fmt is None):
+        raise ValueError('Unknown config format {}, configs are {} files'.format(path, sorted(FORMATS)))
+    stat = os.stat(path)
+    key, signature = os.path.abspath(path), (stat.st_size, stat.st_mtime_ns)
+    known = _configs.get(key)
+    if(known is not None and known[0] == signature):
+        return known[1]
+    values = _Read(path, fmt)
+    if(not isinstance(values, dict)):
+        raise _Error(path, 'it must set CONFIG, EXCEPTIONS and the thresholds')
+    config = AuditConfig(Validate(values, path, strict = fmt != 'py'), path)
+    _configs[key] = (signature, config)
+    return config
+
+
+def ToJSON(config):
+    '''
+    Returns the json text of an AuditConfig, e.g. to convert python configs to json
+    '''
+    return json.dumps(config.ToDict(), indent=4) + '\n'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validates config files (e.g. those in DatasetsClean), and converts python configs to json')
+    parser.add_argument('paths', nargs='+', help='config files, or folders searched for python configs')
+    parser.add_argument('--json', action='store_true', help='write the json config next to every python config')
+    args = parser.parse_args()
+    config_paths = []
+    for path in args.paths:
+        if(os.path.isdir(path)):
+            config_paths += sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+                                   if name.startswith('config') and name.endswith('.py'))
+        else:
+            config_paths.append(path)
+    failed = 0
+    for config_path in config_paths:
+        try:
+            config = LoadConfig(config_path)
+        except Exception as e:
+            #every config is checked, whatever the number of invalid ones
+            failed += 1
+            print('{} error: {}'.format(config_path, e))
+            continue
+        if(args.json and config_path.endswith('.py')):
+            json_path = os.path.splitext(config_path)[0] + '.json'
+            with open(json_path, 'w') as f:
+                f.write(ToJSON(config))
+            print('{} -> {}'.format(config_path, json_path))
+        else:
+            print('{} ok'.format(config_path))
+    sys.exit(1 if failed else 0)
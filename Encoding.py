@@ -0,0 +1,206 @@
+import numpy as np
+
+#largest mixed-radix key we allow before compacting a combined column back to dense codes
+_MAX_KEY = np.iinfo(np.int64).max
+#joint histograms with more cells than this many per row are built on compacted codes, so that counting
+#and scanning a table never costs more than a few passes over the rows
+_MAX_CELLS_PER_ROW = 4
+#rows scanned at once while looking for the first appearance of every value of a column
+_APPEARANCE_BLOCK = 1 << 20
+
+
+def FactorizeColumn(values):
+    '''
+    Encodes a categorical column as dense integer codes.
+    Levels are sorted, so code order follows the order of the original values. Missing values
+    are kept as a level of their own (the last one).
+
+    Input:
+    values : pd.Series or array-like . column values
+    Returns:
+    codes : np.array<int64> . code of every row, in [0, cardinality)
+    labels : list . original value of every code
+    '''
+    import pandas as pd
+    codes, uniques = pd.factorize(values, sort=True)
+    codes = np.asarray(codes, dtype=np.int64)
+    labels = list(uniques)
+    if((codes < 0).any()):
+        codes[codes < 0] = len(labels)
+        labels.append(np.nan)
+    return codes, labels
+
+
+def Compact(codes):
+    '''
+    Re-factorizes a (possibly sparse) integer key into dense codes, keeping the key order.
+
+    Input:
+    codes : np.array<int64> . integer keys
+    Returns:
+    codes : np.array<int64> . dense codes in [0, cardinality)
+    cardinality : int . number of distinct keys
+    '''
+    uniques, dense = np.unique(codes, return_inverse=True)
+    return dense.astype(np.int64).ravel(), len(uniques)
+
+
+def CompactSparse(codes, cardinality, width = 1):
+    '''
+    Compacts integer codes (see Compact) if the histogram of their values, with width cells per value (e.g. the
+    cardinality of the column they are crossed with), would have more than _MAX_CELLS_PER_ROW cells per row.
+
+    Input:
+    codes : np.array<int64> . codes in [0, cardinality)
+    cardinality : int . upper bound (exclusive) of the codes
+    width : int . cells of the histogram per value of the codes
+    Returns:
+    codes : np.array<int64> . codes, compacted or not
+    cardinality : int . upper bound (exclusive) of the returned codes
+    '''
+    if(cardinality * width > _MAX_CELLS_PER_ROW * len(codes)):
+        return Compact(codes)
+    return codes, cardinality
+
+
+def CombineCodes(codes_list, cardinalities):
+    '''
+    Combines several integer-coded columns into a single integer key, using mixed-radix
+    arithmetic (key = ((c0 * n1) + c1) * n2 + c2 ...). Two rows get the same key if and only if
+    they share the values of every combined column.
+    Whenever the product of cardinalities would overflow int64, the partial key is compacted
+    back to dense codes before going on.
+
+    Input:
+    codes_list : list<np.array<int64>> . codes of every column to combine
+    cardinalities : list<int> . cardinality of every column to combine
+    Returns:
+    key : np.array<int64> . combined key of every row
+    cardinality : int . upper bound (exclusive) of the combined key
+    '''
+    key = codes_list[0]
+    cardinality = int(cardinalities[0])
+    for codes, n in zip(codes_list[1:], cardinalities[1:]):
+        n = int(n)
+        if(cardinality > _MAX_KEY // max(n, 1)):
+            key, cardinality = Compact(key)
+        key = key * n + codes
+        cardinality *= n
+    return key, cardinality
+
+
+def JointCounts(codes_a, card_a, codes_b, card_b):
+    '''
+    Builds the contingency table of two integer-coded columns with a single np.bincount.
+    Sparse codes should be compacted beforehand (see CompactSparse).
+
+    Input:
+    codes_a, codes_b : np.array<int64> . codes of both columns, in [0, card)
+    card_a, card_b : int . cardinality of both columns
+    Returns:
+    contingency : np.array<int64> of shape (card_a, card_b)
+    '''
+    return np.bincount(codes_a * card_b + codes_b, minlength=card_a * card_b).reshape(card_a, card_b)
+
+
+class EncodedDataset():
+    def __init__(self, df):
+        '''
+        Lazily integer-encodes the columns of a dataframe. Every column is factorized once, the
+        first time it is requested, and its codes are kept for the rest of the run.
+        The dataframe is never copied nor modified.
+
+        Input:
+        df : dataset dataframe
+        '''
+        self.df = df
+        self.n_rows = len(df)
+        self._codes = {}
+        self._labels = {}
+
+    @classmethod
+    def FromCodes(cls, codes, labels):
+        '''
+        Builds an EncodedDataset from columns encoded elsewhere (e.g. arrays in shared memory), with no dataframe behind.
+
+        Input:
+        codes : dict<str, np.array<int64>> . codes of every column
+        labels : dict<str, list> . original value of every code of every column
+        '''
+        encoded = cls.__new__(cls)
+        encoded.df = None
+        encoded.n_rows = len(next(iter(codes.values()))) if len(codes) > 0 else 0
+        encoded._codes = dict(codes)
+        encoded._labels = dict(labels)
+        return encoded
+
+    def _Factorize(self, column):
+        if(column not in self._codes):
+            self._codes[column], self._labels[column] = FactorizeColumn(self.df[column])
+
+    def Codes(self, column):
+        '''
+        Returns the integer codes of the column, as np.array<int64>
+        '''
+        self._Factorize(column)
+        return self._codes[column]
+
+    def Labels(self, column):
+        '''
+        Returns the original values of the column, indexed by code
+        '''
+        self._Factorize(column)
+        return self._labels[column]
+
+    def LabelsByAppearance(self, column):
+        '''
+        Returns the original values of the column, in order of first appearance in the dataset
+        '''
+        codes = self.Codes(column)
+        labels = self.Labels(column)
+        #rows are scanned by blocks, stopping as soon as every value has appeared
+        seen = np.zeros(len(labels), dtype=bool)
+        order = []
+        for start in range(0, len(codes), _APPEARANCE_BLOCK):
+            uniques, first = np.unique(codes[start:start + _APPEARANCE_BLOCK], return_index=True)
+            new = ~seen[uniques]
+            order += list(uniques[new][np.argsort(first[new], kind='stable')])
+            seen[uniques] = True
+            if(len(order) == len(labels)):
+                break
+        return [labels[c] for c in order]
+
+    def Cardinality(self, column):
+        '''
+        Returns the number of distinct values of the column
+        '''
+        return len(self.Labels(column))
+
+    def Combine(self, columns):
+        '''
+        Returns the combined integer key of several columns, as (key, cardinality). See CombineCodes.
+        '''
+        return CombineCodes([self.Codes(c) for c in columns], [self.Cardinality(c) for c in columns])
+
+    def Crosstab(self, a, b):
+        '''
+        Counts of every (value of a, value of b) pair, as a np.array<int64> of shape 
+        (cardinality of a, cardinality of b) indexed by the codes of both columns.
+        '''
+        return JointCounts(self.Codes(a), self.Cardinality(a), self.Codes(b), self.Cardinality(b))
+
+    def Contingencies(self, columns, targets):
+        '''
+        Contingency tables of a combination of columns with several target columns.
+
+        Input:
+        columns : list<str> . combined columns
+        targets : list<str> . target columns
+        Returns:
+        counts : np.array<int64> . counts of every value of the combination
+        list<(str, np.array<int64>)> . name of every target and its contingency table with the combination
+        '''
+        codes, cardinality = self.Combine(columns)
+        codes, cardinality = CompactSparse(codes, cardinality, max([self.Cardinality(t) for t in targets], default=1))
+        return (np.bincount(codes, minlength=cardinality),
+                [(t, JointCounts(codes, cardinality, self.Codes(t), self.Cardinality(t))) for t in targets])
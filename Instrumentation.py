@@ -0,0 +1,124 @@
+import cProfile
+import io
+import json
+import platform
+import pstats
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+#lines of the cProfile report kept in the stats block
+_PROFILE_LINES = 25
+
+
+def PeakRSS():
+    '''
+    Peak resident memory of the process so far, in bytes (None where it cannot be read)
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    #ru_maxrss is in kilobytes on linux, and in bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def _Start(profiler):
+    (profiler.enable if hasattr(profiler, 'enable') else profiler.start)()
+
+
+def _Stop(profiler):
+    (profiler.disable if hasattr(profiler, 'disable') else profiler.stop)()
+
+
+class Stats():
+    def __init__(self):
+        '''
+        Instrumentation of an audit: wall time of every phase, counters of the work done (rows, combinations,
+        pairs, scipy calls, ...) and peak memory. Phases are named with dots, a phase 'a.b' being part of 'a'.
+        A profiler can be attached to a single phase (see Profile).
+        '''
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+        self.profile_phase = None
+        self.profiler = None
+
+    def Clear(self, keep = ()):
+        '''
+        Forgets every phase and counter, except the phases in keep, and detaches the profiler
+        '''
+        self.phases = OrderedDict((name, entry) for name, entry in self.phases.items() if name in keep)
+        self.counters = OrderedDict()
+        self.profile_phase = None
+        self.profiler = None
+
+    def Profile(self, phase, profiler = None):
+        '''
+        Attaches a profiler to a phase: it runs only while that phase does.
+
+        Input:
+        phase : <str> . name of the phase (e.g. 'implicit.nmi')
+        profiler : object with enable/disable (e.g. cProfile.Profile) or start/stop (e.g. a sampling profiler).
+            A cProfile.Profile is created if None, and its report is included in ToDict
+        Returns:
+        the profiler
+        '''
+        self.profile_phase = phase
+        self.profiler = profiler if profiler is not None else cProfile.Profile()
+        return self.profiler
+
+    @contextmanager
+    def Phase(self, name):
+        '''
+        Context manager timing a phase. A phase run several times accumulates its time and number of calls.
+        '''
+        profiling = self.profiler is not None and name == self.profile_phase
+        if(profiling):
+            _Start(self.profiler)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if(profiling):
+                _Stop(self.profiler)
+            entry = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peak_rss_bytes': None})
+            entry['seconds'] += elapsed
+            entry['calls'] += 1
+            entry['peak_rss_bytes'] = PeakRSS()
+
+    def Count(self, name, n = 1):
+        '''
+        Adds n to a counter
+        '''
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def ToDict(self):
+        '''
+        Returns the stats as plain (json) values:
+        {'phases': {name: {'seconds', 'calls', 'peak_rss_bytes' (peak of the process when the phase ended)}},
+         'counters': {name: int}, 'peak_rss_bytes', 'profile': {'phase', 'report'} (with a cProfile profiler)}
+        '''
+        result = {'phases': {name: dict(entry) for name, entry in self.phases.items()},
+                  'counters': dict(self.counters),
+                  'peak_rss_bytes': PeakRSS()}
+        if(isinstance(self.profiler, cProfile.Profile)):
+            report = io.StringIO()
+            try:
+                pstats.Stats(self.profiler, stream=report).sort_stats('cumulative').print_stats(_PROFILE_LINES)
+            except TypeError:
+                #the profiled phase never ran
+                pass
+            result['profile'] = {'phase': self.profile_phase, 'report': report.getvalue()}
+        return result
+
+    def ToJSON(self, path = None):
+        '''
+        Returns the stats (see ToDict) as a json string, also written to path if given
+        '''
+        text = json.dumps(self.ToDict(), indent=2)
+        if(path is not None):
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
@@ -0,0 +1,103 @@
+#Intersectional subgroups: groups defined by the joint values of several protected columns (e.g. sex x race x age),
+#counted from a single count cube and pruned by their support before any of them is compared
+import numpy as np
+from Encoding import CombineCodes, CompactSparse
+from ProxySearch import ProxyCombinations
+
+#default minimum support of a subgroup: rows if at least 1, fraction of the rows of the dataset otherwise
+DEFAULT_MIN_SUPPORT = 0.01
+
+
+def MinSupportRows(min_support, n_rows):
+    '''
+    Returns the minimum number of rows of a subgroup for a min_support setting (rows, or fraction of n_rows if below 1)
+    '''
+    if(min_support < 0):
+        raise ValueError('The minimum support of intersectional subgroups must be positive')
+    return max(1, int(np.ceil(min_support * n_rows)) if min_support < 1 else int(min_support))
+
+
+def CountCube(encoded, columns):
+    '''
+    Counts the rows of every combination of values of the columns present in the dataset, in a single pass over
+    the rows. Every intersection of the columns is then counted from the cells of the cube, whose number is
+    bounded by the number of rows, rather than from the rows themselves.
+
+    Input:
+    encoded : EncodedDataset
+    columns : list<str> . columns of the cube (e.g. the protected columns and the output)
+    Returns:
+    cells : dict<str, np.array<int64>> . code of every column in every cell
+    counts : np.array<int64> . rows of every cell
+    '''
+    key, _ = encoded.Combine(columns)
+    _, first, counts = np.unique(key, return_index=True, return_counts=True)
+    return {c: np.asarray(encoded.Codes(c))[first] for c in columns}, counts.astype(np.int64)
+
+
+def _GroupKey(cells, combo, cardinalities, mask):
+    key, cardinality = CombineCodes([cells[c][mask] for c in combo], [cardinalities[c] for c in combo])
+    return CompactSparse(key, cardinality)
+
+
+def FrequentIntersections(cells, counts, P, O, cardinalities, missing, min_rows, max_comb_size = None, counters = None):
+    '''
+    Level-wise (apriori) search of the intersectional subgroups of at least min_rows rows. The support of a subgroup
+    is at most the one of any subgroup of fewer columns it belongs to, so the cells of the cube that fall in a small
+    subgroup of a combination are dropped from every larger combination before it is counted, and combinations
+    left with no cells are not counted at all. Subgroups with a missing value are left out, as in the indirect check.
+
+    Input:
+    cells, counts : count cube of the P and O columns (see CountCube)
+    P : list<str> . protected columns
+    O : <str> . output column
+    cardinalities : dict<str, int> . cardinality of every column
+    missing : dict<str, np.array<bool>> . codes of every protected column that stand for missing values
+    min_rows : int . minimum rows of a subgroup
+    max_comb_size : int . largest number of protected columns intersected (None for all of them)
+    counters : dict . if given, the numbers of combinations and subgroups counted and pruned are added to it
+    Yields, for every combination of 2 or more protected columns with at least 2 subgroups of min_rows rows:
+    combo : list<str> . protected columns intersected
+    groups : np.array<int64> of shape (subgroups, len(combo)) . codes of the subgroups in every column, in key order
+    crosstab : np.array<int64> of shape (subgroups, cardinality of O) . rows of every subgroup with every output
+    '''
+    counters = counters if counters is not None else {}
+    for name in ('combinations', 'combinations_pruned', 'subgroups', 'subgroups_pruned'):
+        counters.setdefault(name, 0)
+    max_comb_size = len(P) if max_comb_size is None else min(max_comb_size, len(P))
+    #cells of the cube in a subgroup of min_rows rows of every combination of the previous (and current) level
+    alive = {}
+    for combo in ProxyCombinations(P, max_comb_size):
+        key = tuple(combo)
+        if(len(combo) == 1):
+            mask = ~missing[combo[0]][cells[combo[0]]]
+        else:
+            #masks of two levels below are not needed anymore
+            alive = {k: m for k, m in alive.items() if len(k) >= len(combo) - 1}
+            parents = [key[:k] + key[k + 1:] for k in range(len(key))]
+            if(any(parent not in alive for parent in parents)):
+                counters['combinations_pruned'] += 1
+                continue
+            mask = np.logical_and.reduce([alive[parent] for parent in parents])
+            if(not mask.any()):
+                counters['combinations_pruned'] += 1
+                continue
+        group_key, cardinality = _GroupKey(cells, combo, cardinalities, mask)
+        support = np.bincount(group_key, weights=counts[mask], minlength=cardinality)
+        frequent = support >= min_rows
+        counters['subgroups'] += int(frequent.sum())
+        counters['subgroups_pruned'] += int(((support > 0) & ~frequent).sum())
+        mask[mask] = frequent[group_key]
+        if(not mask.any()):
+            continue
+        alive[key] = mask
+        if(len(combo) < 2 or frequent.sum() < 2):
+            continue
+        counters['combinations'] += 1
+        group_key = group_key[frequent[group_key]]
+        _, first, inverse = np.unique(group_key, return_index=True, return_inverse=True)
+        indexes = np.flatnonzero(mask)[first]
+        groups = np.stack([cells[c][indexes] for c in combo], axis=1)
+        crosstab = np.bincount(inverse.ravel() * cardinalities[O] + cells[O][mask], weights=counts[mask],
+                               minlength=len(first) * cardinalities[O]).reshape((len(first), cardinalities[O]))
+        yield combo, groups, crosstab.astype(np.int64)
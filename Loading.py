@@ -0,0 +1,165 @@
+#Dataset loading: csv, and the columnar Parquet, Feather and Arrow IPC formats (these need pyarrow)
+import argparse
+import csv
+import os
+
+#dataset format of every file extension
+FORMATS = {'.csv': 'csv',
+           '.parquet': 'parquet', '.pq': 'parquet',
+           '.feather': 'feather',
+           '.arrow': 'arrow', '.ipc': 'arrow'}
+#extension of the files written by Convert for every format
+EXTENSIONS = {'parquet': '.parquet', 'feather': '.feather', 'arrow': '.arrow'}
+
+
+def DatasetFormat(path):
+    '''
+    Returns the format of a dataset file from its extension ('csv' for unknown extensions)
+    '''
+    return FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def _Arrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Reading or writing Parquet, Feather and Arrow datasets needs pyarrow (pip3 install pyarrow)')
+    return pyarrow
+
+
+def _ArrowTable(path, fmt, columns = None):
+    '''
+    Reads (a subset of the columns of) a columnar dataset as a pyarrow Table, memory-mapping the file when the format allows it
+    '''
+    pa = _Arrow()
+    if(fmt == 'parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if(fmt == 'feather'):
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=columns, memory_map=True)
+    source = pa.memory_map(path, 'r')
+    try:
+        table = pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        #arrow stream format, rather than file format
+        source.seek(0)
+        table = pa.ipc.open_stream(source).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def _CsvHeader(path):
+    '''
+    Returns the column names in the first row of a csv, named as pandas names them: unnamed columns are
+    'Unnamed: <position>', and repeated names get a '.<k>' suffix
+    '''
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    header = [name if name != '' else 'Unnamed: {}'.format(k) for k, name in enumerate(header)]
+    #suffixes already taken by other columns of the header are skipped, as pandas does
+    repeats = {}
+    for k, name in enumerate(header):
+        base, count = name, repeats.get(name, 0)
+        while(count > 0):
+            repeats[base] = count + 1
+            name = '{}.{}'.format(base, count)
+            count = count + 1 if name in header else repeats.get(name, 0)
+        header[k] = name
+        repeats[name] = count + 1
+    return header
+
+
+def ReadColumns(path):
+    '''
+    Returns the column names of a dataset, without reading its rows
+    '''
+    fmt = DatasetFormat(path)
+    if(fmt == 'csv'):
+        #read with the csv module, so that the columns of a dataset are known without importing pandas
+        return _CsvHeader(path)
+    if(fmt == 'parquet'):
+        _Arrow()
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path, memory_map=True).names)
+    #feather and arrow files are memory-mapped, so no row is read either
+    return list(_ArrowTable(path, fmt).schema.names)
+
+
+def LoadDataset(path, columns = None, categorical = True):
+    '''
+    Loads a dataset as a dataframe, parsing only the given columns.
+    With categorical, every column is read straight into a pandas categorical (integer codes plus the list of
+    distinct values), which takes a small fraction of the memory of object strings. Csv values are then kept as
+    text, and columnar files are dictionary-encoded.
+
+    Input:
+    path : <str> . csv (first row are the columns), parquet, feather or arrow file (see FORMATS)
+    columns : list<str> . columns to load (None for all), in the order of the file
+    categorical : <bool> . load columns as categoricals
+    Returns:
+    dataframe
+    '''
+    import pandas as pd
+    fmt = DatasetFormat(path)
+    if(fmt == 'csv'):
+        return pd.read_csv(path, sep=',', header=0, usecols=columns, dtype='category' if categorical else None)
+    if(columns is not None):
+        #columns come in the order of the file, as with csv
+        wanted = set(columns)
+        columns = [c for c in ReadColumns(path) if c in wanted]
+    table = _ArrowTable(path, fmt, columns)
+    pa = _Arrow()
+    #dictionary-encoded columns load as categoricals, and the others as plain values
+    if(categorical):
+        table = pa.table({name: column if pa.types.is_dictionary(column.type) else column.dictionary_encode()
+                          for name, column in zip(table.column_names, table.columns)})
+    else:
+        table = pa.table({name: column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+                          for name, column in zip(table.column_names, table.columns)})
+    return table.to_pandas()
+
+
+def Convert(csv_path, fmt = 'parquet', output_path = None):
+    '''
+    Converts a csv dataset to a columnar format, with every column dictionary-encoded (so that it loads as a
+    categorical). Feather and arrow files are written uncompressed, so that they can be memory-mapped.
+
+    Input:
+    csv_path : <str> . csv dataset, in which the first row are the columns
+    fmt : 'parquet' | 'feather' | 'arrow'
+    output_path : <str> . file written (None for the csv path with the extension of the format)
+    Returns:
+    <str> . path of the file written
+    '''
+    if(fmt not in EXTENSIONS):
+        raise ValueError('Unknown dataset format {}, expected one of {}'.format(fmt, list(EXTENSIONS)))
+    pa = _Arrow()
+    if(output_path is None):
+        output_path = os.path.splitext(csv_path)[0] + EXTENSIONS[fmt]
+    table = pa.Table.from_pandas(LoadDataset(csv_path), preserve_index=False)
+    if(fmt == 'parquet'):
+        import pyarrow.parquet as pq
+        pq.write_table(table, output_path)
+    elif(fmt == 'feather'):
+        import pyarrow.feather as feather
+        feather.write_feather(table, output_path, compression='uncompressed')
+    else:
+        with pa.OSFile(output_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts csv datasets (e.g. those in DatasetsClean) to a columnar format')
+    parser.add_argument('paths', nargs='+', help='csv files, or folders searched for csv files')
+    parser.add_argument('--format', default='parquet', choices=sorted(EXTENSIONS), help='columnar format (default: parquet)')
+    args = parser.parse_args()
+    csv_paths = []
+    for path in args.paths:
+        if(os.path.isdir(path)):
+            csv_paths += sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names if name.lower().endswith('.csv'))
+        else:
+            csv_paths.append(path)
+    for csv_path in csv_paths:
+        print('{} -> {}'.format(csv_path, Convert(csv_path, args.format)))
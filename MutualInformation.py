@@ -0,0 +1,138 @@
+from math import log
+import numpy as np
+from Encoding import CompactSparse, JointCounts
+
+def Entropy(counts):
+    '''
+    Entropy (natural logarithm) of a distribution given by its counts.
+
+    Input:
+    counts : np.array . number of occurrences of every value (zeros are ignored)
+    Returns:
+    entropy : float
+    '''
+    pi = np.asarray(counts, dtype=np.float64)
+    pi = pi[pi > 0]
+    if(pi.size <= 1):
+        return 0.0
+    pi_sum = np.sum(pi)
+    return float(-np.sum((pi / pi_sum) * (np.log(pi) - log(pi_sum))))
+
+
+def MutualInformation(contingency):
+    '''
+    Mutual information (natural logarithm) between the rows and the columns of a contingency table,
+    following the same arithmetic as sklearn.metrics.mutual_info_score.
+
+    Input:
+    contingency : np.array of shape (n, m) . joint counts
+    Returns:
+    mi : float
+    '''
+    pi = contingency.sum(axis=1)
+    pj = contingency.sum(axis=0)
+    if(np.count_nonzero(pi) <= 1 or np.count_nonzero(pj) <= 1):
+        return 0.0
+    nzx, nzy = np.nonzero(contingency)
+    nz_val = contingency[nzx, nzy]
+    contingency_sum = float(nz_val.sum())
+    log_contingency_nm = np.log(nz_val)
+    contingency_nm = nz_val / contingency_sum
+    outer = pi.take(nzx).astype(np.int64) * pj.take(nzy).astype(np.int64)
+    log_outer = -np.log(outer) + log(pi.sum()) + log(pj.sum())
+    mi = contingency_nm * (log_contingency_nm - log(contingency_sum)) + contingency_nm * log_outer
+    mi = np.where(np.abs(mi) < np.finfo(mi.dtype).eps, 0.0, mi)
+    return float(np.clip(mi.sum(), 0.0, None))
+
+
+def NormalizedMutualInformation(contingency, h_rows = None, h_cols = None, mi = None):
+    '''
+    Normalized mutual information of a contingency table, using the arithmetic mean of both
+    entropies as normalizer (sklearn's normalized_mutual_info_score default).
+
+    Input:
+    contingency : np.array of shape (n, m) . joint counts
+    h_rows, h_cols : float . entropies of the rows and columns marginals, if already known
+    mi : float . mutual information of the table, if already known
+    Returns:
+    nmi : float in [0,1]
+    '''
+    pi = contingency.sum(axis=1)
+    pj = contingency.sum(axis=0)
+    n_classes, n_clusters = np.count_nonzero(pi), np.count_nonzero(pj)
+    #both labelings put everything in a single cluster: perfect match
+    if(n_classes == n_clusters and n_classes <= 1):
+        return 1.0
+    if(mi is None):
+        mi = MutualInformation(contingency)
+    if(mi == 0):
+        return 0.0
+    if(h_rows is None):
+        h_rows = Entropy(pi)
+    if(h_cols is None):
+        h_cols = Entropy(pj)
+    return float(mi / ((h_rows + h_cols) / 2))
+
+
+class NMIKernel():
+    def __init__(self):
+        '''
+        Scores integer-coded columns against each other with NMI, caching the marginal entropy
+        of every named column so that it is computed only once per run.
+        '''
+        self._entropies = {}
+
+    def ColumnEntropy(self, name, counts):
+        '''
+        Returns the (cached) entropy of the named column, given the counts of its values
+        '''
+        if(name not in self._entropies):
+            self._entropies[name] = Entropy(counts)
+        return self._entropies[name]
+
+    def ScoreAgainst(self, codes, cardinality, targets):
+        '''
+        Computes the NMI between one column and several named target columns.
+
+        Input:
+        codes : np.array<int64> . codes of the scored column (e.g. a combination of inputs)
+        cardinality : int . cardinality of the scored column
+        targets : list<(str, np.array<int64>, int)> . name, codes and cardinality of every target column
+        Returns:
+        list<float> . NMI with every target, in the same order
+        '''
+        return [nmi for nmi, _, _ in self.Evaluate(codes, cardinality, targets)[2]]
+
+    def Evaluate(self, codes, cardinality, targets):
+        '''
+        Same as ScoreAgainst, but also returns the information terms behind every score, which
+        the proxy search uses to bound the NMI of larger combinations.
+
+        Returns:
+        h_codes : float . entropy of the scored column
+        n_distinct : int . number of distinct values of the scored column
+        list<(float, float, float)> . (nmi, mutual information, target entropy) for every target
+        '''
+        codes, cardinality = CompactSparse(codes, cardinality, max([c for _, _, c in targets], default=1))
+        counts = np.bincount(codes, minlength=cardinality)
+        contingencies = [(name, JointCounts(codes, cardinality, target_codes, target_cardinality)) 
+                         for name, target_codes, target_cardinality in targets]
+        return self.EvaluateContingencies(counts, contingencies)
+
+    def EvaluateContingencies(self, counts, contingencies):
+        '''
+        Same as Evaluate, starting from already built contingency tables.
+
+        Input:
+        counts : np.array . counts of the values of the scored column
+        contingencies : list<(str, np.array)> . name of every target column and its contingency table with
+            the scored column (rows follow the order of counts)
+        '''
+        h_codes = Entropy(counts)
+        results = []
+        for name, contingency in contingencies:
+            h_target = self.ColumnEntropy(name, contingency.sum(axis=0))
+            mi = MutualInformation(contingency)
+            nmi = NormalizedMutualInformation(contingency, h_rows = h_codes, h_cols = h_target, mi = mi)
+            results.append((nmi, mi, h_target))
+        return h_codes, int(np.count_nonzero(counts)), results
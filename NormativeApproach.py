@@ -1,34 +1,120 @@
-#ignore sklearn future warnings
-def warn(*args, **kwargs):
-    pass
+#pandas, scipy and sklearn are imported by the functions that use them, the first time they run, so that importing
+#this module (e.g. to run explicit checks, or from the CLIs) stays light
 import warnings
-warnings.warn = warn
-
-import pandas as pd
 import numpy as np
 import importlib.util
-from sklearn.metrics.cluster import normalized_mutual_info_score
 from itertools import combinations
 import itertools
-from scipy import stats
-import pprint
+from Encoding import EncodedDataset
+from MutualInformation import NMIKernel
+from ProxySearch import LatticeSearch, ProxyCombinations
+from Streaming import StreamedCounts, StreamCSV, AppendCSV, LoadCounts
+from Parallel import ProxyPool, ResolveJobs
+from ChiSquare import BatchChi2Contingency, AdjustPValues
+from Config import LoadConfig, ValidateColumns
+from Cache import DatasetCache, CachedDataset, DEFAULT_MAX_BYTES
+from Instrumentation import Stats
+from Loading import DatasetFormat, LoadDataset, ReadColumns
+from Intersectional import CountCube, FrequentIntersections, MinSupportRows, DEFAULT_MIN_SUPPORT
+from Sampling import StratifiedSample, NMIInterval, RatioInterval, Quantile, DEFAULT_SAMPLE_ROWS, DEFAULT_CONFIDENCE
+
+#phase of the stats in which every check runs
+_PHASES = {'Ve': 'explicit', 'Vi': 'implicit', 'Vd': 'indirect', 'Vx': 'intersectional'}
+#columns of the table returned by Sweep
+_SWEEP_COLUMNS = ['min_corr', 'max_comb_size', 'threshold', 'min_pvalue', 'type', 'P', 'I', 'corr', 
+                  'Pv', 'O', 'Ov', 'ratio', 'pvalue', 'pvalue_adjusted']
+#combinations of input columns generated and scored at once by the exhaustive proxy search (see _ScoreBatches)
+_SCORE_BATCH = 4096
+
+
+def _ImplicitKey(I, P):
+    return (frozenset(I), P)
+
+
+def _IndirectKey(P, Pv, O, Ov):
+    return (P, frozenset(Pv), O, Ov)
+
+
+def _IntersectionalKey(P, Pv, O, Ov):
+    return (frozenset(frozenset(zip(P, values)) for values in Pv), O, Ov)
+
+
+#key of every kind of exception, and the fields of an exception (or of a violation) it is built from, so that neither
+#the order of the inputs, of the two subpopulations, nor of the columns of a subgroup matters
+_EXCEPTION_KEYS = {'Implicit': (_ImplicitKey, ('I', 'P'), "{'I': list<str>, 'P': str}"),
+                   'Indirect': (_IndirectKey, ('P', 'Pv', 'O', 'Ov'), "{'P': str, 'Pv': (str, str), 'O': str, 'Ov': str}"),
+                   'Intersectional': (_IntersectionalKey, ('P', 'Pv', 'O', 'Ov'),
+                                      "{'P': list<str>, 'Pv': (list<str>, list<str>), 'O': str, 'Ov': str}")}
+
+
+def _ImplicitCase(combo, p, corr):
+    '''
+    Implicit discrimination violation of a combination of input columns, proxy of protected column p
+    '''
+    return {'I': list(combo), 'P': p, 'corr': round(float(corr), 4)}
+
+
+def _IndirectCase(p, sub1, sub2, O, o_value, v1, v2):
+    '''
+    Indirect discrimination violation between two subpopulations of protected column p, that obtain output value
+    o_value of O at rates v1 and v2 (without its chi2 test)
+    '''
+    return {'P': p.strip(), 'Pv': (sub1.strip(), sub2.strip()), 'O': O.strip(), 'Ov': o_value.strip(),
+            'ratio': np.inf if v2==0 else round(v1/v2, 4)}
 
 class NormativeApproachDiscrimination():
-    def __init__(self, csv_path_dataset, config_py_path, verbose = False):
+    def __init__(self, csv_path_dataset, config_py_path, verbose = False, streaming = False, chunksize = 100000, n_jobs = None,
+                 cache_dir = None, cache_max_bytes = None):
         '''
         Initialise a NormativeApproachDiscrimination object.
         Input:
-        csv_path_dataset : <str> . csv dataset, in which the first row are the columns
-        config_py_path : <str> . python configuration file for the dataset
+        csv_path_dataset : <str> . csv dataset, in which the first row are the columns, or a parquet, feather or 
+            arrow dataset (see Loading.py). Only the I, P and O columns of the config are loaded
+        config_py_path : <str> . configuration file for the dataset: python (see config_template.py), json or toml (see Config.py).
+            It is validated, together with the columns of the dataset, before any row is read
         verbose : <bool> . 
+        streaming : <bool> . If True, the dataset is not loaded in memory: Run() reads it in chunks of chunksize rows
+            and only keeps the count tables the checks need (see Streaming.py)
+        chunksize : <int> . rows read at once in streaming mode
+        n_jobs : <int> . worker processes scoring proxy combinations in parallel (-1 for one per core). 
+            If None, the config value _ImplicitDiscrimination_n_jobs is used (serial by default)
+        cache_dir : <str> . folder of the on-disk cache of encoded datasets (see Cache.py). If None, the config value 
+            _Cache_dir is used (no cache by default). With a cache, the csv is only parsed when it is not cached yet, 
+            and NMI scores and crosstabs are reused by later runs with other thresholds or exceptions. 
+            It is not used in streaming mode
+        cache_max_bytes : int . size of the cache folder, least recently used datasets are evicted beyond it.
+            If None, the config value _Cache_max_bytes is used (1GB by default)
         '''
-        self.df  = pd.read_csv(csv_path_dataset,sep=',', header=0)
+        self.csv_path_dataset = csv_path_dataset
         self.verbose = verbose
+        self.streaming = streaming
+        self.chunksize = chunksize
+        #time of every phase of the audit and counters of the work done (see Instrumentation.py and Run)
+        self.stats = Stats()
         
-        #import the specified config py file
-        spec = importlib.util.spec_from_file_location("module.name", config_py_path)
-        config = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(config)
+        #parse and validate the config file (only the first time, or when it changed, see Config.py)
+        with self.stats.Phase('config'):
+            config = LoadConfig(config_py_path)
+        
+        cache_dir = cache_dir if cache_dir is not None else getattr(config, '_Cache_dir', None)
+        cache_max_bytes = cache_max_bytes if cache_max_bytes is not None else getattr(config, '_Cache_max_bytes', DEFAULT_MAX_BYTES)
+        self.cache = DatasetCache(cache_dir, cache_max_bytes) if cache_dir is not None and not streaming else None
+        if(streaming and DatasetFormat(csv_path_dataset) != 'csv'):
+            raise ValueError('Streaming mode reads csv datasets, {} is a {} file'.format(csv_path_dataset, DatasetFormat(csv_path_dataset)))
+        with self.stats.Phase('load'):
+            #only the header is read here: the dataframe is loaded the first time a check needs it (see df),
+            #and counts (or the cached dataset) once the config is validated
+            self.columns = ReadColumns(csv_path_dataset)
+            #misconfigured audits fail here, before any row is read
+            ValidateColumns(config.CONFIG, config.EXCEPTIONS, self.columns)
+        self._df = None
+        #count tables accumulated in streaming mode
+        self.counts = None
+        #dataset opened from the cache
+        self.cached = None
+        #sample of the rows the approximate checks run on, and the data it was drawn from (see _Sample)
+        self.sample = None
+        self._sampled = None
         
         self.config = config.CONFIG
         self.exceptions = config.EXCEPTIONS
@@ -37,7 +123,60 @@ class NormativeApproachDiscrimination():
         self._ImplicitDiscrimination_Max_proxy_combo_size = config._ImplicitDiscrimination_max_proxy_combo_size
         self._IndirectDiscrimination_min_prop = config._IndirectDiscrimination_Threshold
         self._IndirectDiscrimination_min_pvalue = config._IndirectDiscrimination_MinPValue
+        #multiple-comparison correction of the chi2 p-values: None, 'holm' or 'bh' (Benjamini-Hochberg)
+        self._IndirectDiscrimination_pvalue_correction = getattr(config, '_IndirectDiscrimination_PValueCorrection', None)
+        #NMI implementation used to score proxies: 'native' (MutualInformation.py) or 'sklearn'
+        self._ImplicitDiscrimination_nmi_backend = getattr(config, '_ImplicitDiscrimination_nmi_backend', 'native')
+        if(self._ImplicitDiscrimination_nmi_backend == 'sklearn' and importlib.util.find_spec('sklearn') is None):
+            raise ImportError('The sklearn NMI backend needs scikit-learn (pip3 install scikit-learn)')
+        #how proxy combinations are searched: 'exhaustive' or 'lattice' (see ProxySearch.py), and its optional budgets
+        self._ImplicitDiscrimination_search = getattr(config, '_ImplicitDiscrimination_search', 'exhaustive')
+        self._ImplicitDiscrimination_time_budget = getattr(config, '_ImplicitDiscrimination_time_budget', None)
+        self._ImplicitDiscrimination_memory_budget = getattr(config, '_ImplicitDiscrimination_memory_budget', None)
+        self._ImplicitDiscrimination_n_jobs = n_jobs if n_jobs is not None else getattr(config, '_ImplicitDiscrimination_n_jobs', None)
+        #strongest proxy pairs kept whatever their score (see CheckImplicitDiscrimination)
+        self._ImplicitDiscrimination_top_k = getattr(config, '_ImplicitDiscrimination_top_k', None)
+        #approximate audits (see Run): rows of the stratified sample, confidence level of the intervals, whether the
+        #candidates whose interval straddles a threshold are computed exactly, and seed of the sample
+        self._Approximate = getattr(config, '_Approximate', False)
+        self._Approximate_sample_rows = getattr(config, '_Approximate_sample_rows', DEFAULT_SAMPLE_ROWS)
+        self._Approximate_confidence = getattr(config, '_Approximate_confidence', DEFAULT_CONFIDENCE)
+        self._Approximate_refine = getattr(config, '_Approximate_refine', True)
+        self._Approximate_seed = getattr(config, '_Approximate_seed', 0)
+        #intersectional check (see Run): whether it runs, the largest number of protected columns intersected, 
+        #and the minimum support of a subgroup
+        self._Intersectional = getattr(config, '_Intersectional', False)
+        self._Intersectional_max_comb_size = getattr(config, '_Intersectional_max_comb_size', None)
+        self._Intersectional_min_support = getattr(config, '_Intersectional_min_support', DEFAULT_MIN_SUPPORT)
         
+        #integer-encoded view of the last dataframe checked (see _Encode)
+        self._encoded = None
+        #report of the last proxy search: which combinations were evaluated or pruned, and whether it was exact
+        self.implicit_search_summary = None
+        
+    @property
+    def df(self):
+        '''
+        Dataframe of the I, P, O columns of the dataset, parsed straight into categoricals the first time it is used
+        (in the load phase of the stats). None in streaming mode and with a cache, whose checks do not use it.
+        '''
+        if(self._df is None and not self.streaming and self.cache is None):
+            with self.stats.Phase('load'):
+                used_columns = [c for c in dict.fromkeys(self.config['I'] + self.config['P'] + [self.config['O']]) if c in self.columns]
+                self._df = LoadDataset(self.csv_path_dataset, used_columns)
+        return self._df
+    
+    def _Encode(self, df):
+        '''
+        Returns the EncodedDataset of df, reusing the previous one if df is the same dataframe,
+        so that every column is factorized only once per run.
+        Count tables (StreamedCounts) and encoded datasets are returned as they are.
+        '''
+        if(df is None or isinstance(df, (EncodedDataset, StreamedCounts))):
+            return df
+        if(self._encoded is None or self._encoded.df is not df):
+            self._encoded = EncodedDataset(df)
+        return self._encoded
         
     def CheckExplicitDiscrimination(self, df, P, E):
         '''
@@ -53,10 +192,40 @@ class NormativeApproachDiscrimination():
         candidate_explicit_errors = list( set(P) - set(E))
         return candidate_explicit_errors
     
+    def _ExceptionIndex(self, kind, E):
+        '''
+        Compiles exceptions of a kind ('Implicit', 'Indirect' or 'Intersectional') into a set of keys (see _EXCEPTION_KEYS),
+        so that matching a candidate takes constant time. Every check compiles the exceptions it is given when it runs,
+        so that exceptions changed after the audit was created apply. A compiled index is returned as it is.
+        '''
+        if(isinstance(E, (set, frozenset))):
+            return E
+        key, fields, form = _EXCEPTION_KEYS[kind]
+        try:
+            return frozenset(key(*[ex[f] for f in fields]) for ex in E)
+        except (KeyError, TypeError):
+            raise ValueError('{} exceptions must be of the form {}'.format(kind, form))
+    
+    def _Covered(self, kind, case, E):
+        '''
+        Checks whether a candidate violation of a kind is covered by exceptions (a list, or their index)
+        '''
+        key, fields, _ = _EXCEPTION_KEYS[kind]
+        return key(*[case[f] for f in fields]) in self._ExceptionIndex(kind, E)
+    
+    def _Exempted(self, kind, P, Pv, O, o_values, exceptions):
+        '''
+        Checks whether exceptions cover a pair of subpopulations for every one of its flagged output values,
+        in which case it needs no chi2 test
+        '''
+        key = _EXCEPTION_KEYS[kind][0]
+        return all(key(P, Pv, O, o_value) in exceptions for o_value in o_values)
+    
     def _CoveredByImplicitException(self, implicit_candidate_case, E_Implicit):
         '''
         Checks whether the candidate for implicit discrimination tuple is covered
-        by any of the explicit discrimination exceptions. If it is, returns True; returns False otherwise
+        by any of the explicit discrimination exceptions. If it is, returns True; returns False otherwise.
+        The order of the inputs does not matter: ['a', 'b'] is covered by an exception on ['b', 'a']
         
         Input:
         implicit_candidate_case : candidate case of implicit discrimination, of the form
@@ -65,28 +234,155 @@ class NormativeApproachDiscrimination():
                 I : List of inputs columns related with possible implicit discrimination
                 P : protected column related with possible implicit discrimination
                 value : unused 
-        E : List of implicit exceptions, [{'I': list<str>, 'P'=str }]
+        E : List of implicit exceptions, [{'I': list<str>, 'P'=str }], or their index (see _ExceptionIndex)
         Returns:
         True, if an exception covers the possible case of implict discrimination;
         False, otherwise
         '''
-        for ex in E_Implicit:
-            if(implicit_candidate_case['I'] == ex['I'] and implicit_candidate_case['P'] == ex['P']):
-                return True
-        return False
+        return self._Covered('Implicit', implicit_candidate_case, E_Implicit)
             
     
-    def CheckImplicitDiscrimination(self, df, I, P, E, proxy_corr_threshold, max_comb_size = None):
+    def _ScoreBatch(self, encoded, kernel, combos, P, exceptions, backend = 'native', pool = None):
+        '''
+        NMI of a batch of combinations of input columns with every protected column, as list<list<float>>.
+        Pairs covered by an exception are not scored (NaN), and a column is not a proxy of itself (0).
+        Returns the scores and the number of combinations scored.
+        '''
+        targets = [[p for p in P if _ImplicitKey(combo, p) not in exceptions] for combo in combos]
+        scored = [k for k in range(len(combos)) if len(targets[k]) > 0]
+        all_scores = [[np.nan] * len(P) for _ in combos]
+        if(pool is not None):
+            for k, scores in zip(scored, pool.Score([combos[k] for k in scored], P)):
+                all_scores[k] = [score if p in targets[k] else np.nan for p, score in zip(P, scores)]
+        elif(backend == 'native'):
+            for k in scored:
+                results = kernel.EvaluateContingencies(*encoded.Contingencies(combos[k], targets[k]))[2]
+                for p, (nmi, _, _) in zip(targets[k], results):
+                    all_scores[k][P.index(p)] = nmi
+        else:
+            from sklearn.metrics.cluster import normalized_mutual_info_score
+            #sklearn warns about changes of its defaults on every call
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', FutureWarning)
+                for k in scored:
+                    for p in targets[k]:
+                        all_scores[k][P.index(p)] = normalized_mutual_info_score(encoded.Combine(combos[k])[0], encoded.Codes(p))
+                    self.stats.Count('implicit.sklearn_calls', len(targets[k]))
+        self.stats.Count('implicit.pairs_exempted', sum(len(P) - len(t) for t in targets))
+        #a column is not a proxy of itself
+        nmi_values = [[0 if combo == [p] else res for p, res in zip(P, scores)] for combo, scores in zip(combos, all_scores)]
+        return nmi_values, len(scored)
+    
+    def _ScoreBatches(self, encoded, kernel, I, P, exceptions, max_comb_size, backend = 'native', pool = None):
+        '''
+        Exhaustive scoring of proxies, as a pipeline: combinations of up to max_comb_size input columns are generated 
+        (see ProxyCombinations), scored against every protected column and handed over _SCORE_BATCH at a time, so 
+        that the memory held does not grow with the number of combinations. Every combination is encoded as a single 
+        integer key only while it is scored.
+        The scores of a cached dataset are stored (or read) for all the combinations at once, in a single batch.
+        
+        Input:
+        encoded : EncodedDataset (or StreamedCounts)
+        kernel : NMIKernel
+        I, P : list<str> . input and protected attributes as column names
+        exceptions : index of the implicit exceptions (see _ExceptionIndex). Pairs they cover are not scored (NaN),
+            except in a cached dataset, whose scores are reused by later runs with other exceptions
+        max_comb_size : int . maximum number of input columns combined (at most len(I))
+        backend : 'native' | 'sklearn' . NMI implementation
+        pool : ProxyPool . worker processes scoring the combinations (None for serial)
+        Yields:
+        (combos, nmi_values, n_scored) : list<list<str>>, list<list<float>>, int . combinations of the batch (single columns
+            first), their NMI with every protected column, and the number of them scored
+        '''
+        if(isinstance(encoded, CachedDataset)):
+            with self.stats.Phase('implicit.combinations'):
+                combos = list(ProxyCombinations(I, max_comb_size))
+            with self.stats.Phase('implicit.nmi'):
+                nmi_values = encoded.Scores(combos, P)
+                if(nmi_values is not None):
+                    nmi_values = nmi_values.tolist()
+                    self.stats.Count('implicit.combinations_cached', len(combos))
+                else:
+                    nmi_values, _ = self._ScoreBatch(encoded, kernel, combos, P, frozenset(), backend, pool)
+                    encoded.StoreScores(combos, P, nmi_values)
+            yield combos, nmi_values, len(combos)
+            return
+        generated = ProxyCombinations(I, max_comb_size)
+        while(True):
+            with self.stats.Phase('implicit.combinations'):
+                combos = list(itertools.islice(generated, _SCORE_BATCH))
+            if(len(combos) == 0):
+                return
+            with self.stats.Phase('implicit.nmi'):
+                nmi_values, n_scored = self._ScoreBatch(encoded, kernel, combos, P, exceptions, backend, pool)
+            yield combos, nmi_values, n_scored
+    
+    def _ScoreCombinations(self, encoded, kernel, I, P, exceptions, max_comb_size, backend = 'native', pool = None):
+        '''
+        Scores of every combination at once (see _ScoreBatches), for the callers that need them all (e.g. Sweep).
+        
+        Returns:
+        combos : list<list<str>> . every combination, single columns first
+        nmi_values : list<list<float>> . NMI of every combination with every protected column
+        n_scored : int . number of combinations scored
+        '''
+        combos, nmi_values, n_scored = [], [], 0
+        for batch_combos, batch_values, batch_scored in self._ScoreBatches(encoded, kernel, I, P, exceptions, max_comb_size, backend, pool):
+            combos += batch_combos
+            nmi_values += batch_values
+            n_scored += batch_scored
+        return combos, nmi_values, n_scored
+    
+    def _TopPairs(self, top, combos, nmi_values, P, exceptions, top_k, offset):
+        '''
+        Merges the strongest (combination, protected column) pairs of a batch into the top_k pairs found so far.
+        Pairs covered by an exception, or not scored, are left out.
+
+        Input:
+        top : list<(-corr, position, case)> . top pairs so far, strongest first (ties in the order they were evaluated)
+        combos, nmi_values : combinations of the batch and their NMI matrix
+        exceptions : index of the implicit exceptions (see _ExceptionIndex)
+        top_k : int . number of pairs kept
+        offset : int . number of combinations evaluated before the batch
+        Returns:
+        list<(-corr, position, case)> . the top_k strongest pairs, where case is {'I': list<str>, 'P': <str>, 'corr': <float>}
+        '''
+        values = np.where(np.isnan(nmi_values), -np.inf, nmi_values).ravel()
+        candidates = []
+        for k in np.argsort(-values, kind='stable'):
+            if(len(candidates) >= top_k or values[k] == -np.inf):
+                break
+            row, col = divmod(int(k), len(P))
+            if(_ImplicitKey(combos[row], P[col]) in exceptions):
+                continue
+            candidates.append((-float(values[k]), offset * len(P) + int(k), _ImplicitCase(combos[row], P[col], values[k])))
+        return sorted(top + candidates, key=lambda t: t[:2])[:top_k]
+
+    def CheckImplicitDiscrimination(self, df, I, P, E, proxy_corr_threshold, max_comb_size = None,
+                                    search = 'exhaustive', time_budget = None, memory_budget = None, n_jobs = None,
+                                    top_k = None):
         '''
         This function checks implicit discrimination between dataframe protected columns P and input columns I,
         that is not covered by the defined exceptions.
         If any correlation above the set threshold 'proxy_corr_threshold' is found, it returns a warning/error
         Input:
-        df: dataset dataframe
+        df: dataset dataframe (or StreamedCounts)
         I : list<str> . input attributes as column names
         P : list<str> . protected attributes as column names
-        E : list<str> . Set of exceptions consisting in protected column names
+        E : list<{'I': list<str>, 'P': <str>}> . Implicit exceptions (see _CoveredByImplicitException). In the exhaustive
+            search, the combinations they cover are not scored
         proxy_corr_threshold : float \in [0,1] . Defines the min threshold to consider proxy correlation
+        max_comb_size : int . Maximum number of input columns combined as a single proxy
+        search : 'exhaustive' | 'lattice' . Enumerate every combination, or run the pruned level-wise search
+            of ProxySearch.LatticeSearch, which reports the same violations unless a budget stops it early
+        time_budget, memory_budget : seconds and bytes allowed to the lattice search (None for no limit)
+        n_jobs : int . worker processes sharing the scoring of combinations (None or 1 for serial, -1 for one per core).
+            Results are identical to the serial run
+        top_k : int . also keep the top_k strongest (combination, protected column) pairs not covered by an exception,
+            above the threshold or not, in self.implicit_search_summary['top'] (None to keep none). In the lattice
+            search, only among the combinations it evaluated
+        The exhaustive search scores the combinations as they are generated, a batch at a time, and only keeps the
+        violations (and the top_k pairs): its memory does not grow with the number of combinations.
         Returns:
         candidate_implicit_errors : list<{'I': list<str>, 'P': <str>, 'value': <float>}> . 
             List of explicit discrimination violations, where value is the strength of the correaltion between I and P
@@ -100,53 +396,85 @@ class NormativeApproachDiscrimination():
             max_comb_size+=1
             
         
-        #generate combined proxy columns and update the df
-        newcols = sum([list(map(list, combinations(I, i))) for i in range(max_comb_size)], [])   
-        newcols = [x for x in newcols if len(x)>1]
-        df_aux = df.copy()
-        for newcol in newcols:
-            df_aux['+'.join(newcol)] = df_aux[newcol].agg('_'.join, axis=1)
-
-        #consider new created columns as new inputs to check whether they are proxies for protected variables
-        I = I+['+'.join(newcol) for newcol in newcols]
-        factors_paired = [(i,j) for i in I for j in P] 
-        nmi_values =[]
-        for f in factors_paired:
-            if f[0] != f[1]:
-                res = normalized_mutual_info_score(df_aux[f[0]].tolist(), df_aux[f[1]].tolist()) 
-                nmi_values.append(res)
-            else:      
-                nmi_values.append(0)
+        encoded = self._Encode(df)
+        exceptions = self._ExceptionIndex('Implicit', E)
+        kernel = NMIKernel()
+        backend = self._ImplicitDiscrimination_nmi_backend
+        if(not isinstance(encoded, EncodedDataset)):
+            #count tables hold every combination already: they are scored exhaustively with the native kernel
+            if(search == 'lattice' and self.verbose):
+                print('[streaming mode: the lattice search is not available, all combinations are scored]')
+            search, backend = 'exhaustive', 'native'
+        n_jobs = ResolveJobs(n_jobs)
+        if(n_jobs > 1 and (not isinstance(encoded, EncodedDataset) or backend != 'native')):
+            n_jobs = 1
+        pool = ProxyPool(encoded, I + P, n_jobs) if n_jobs > 1 else None
+        candidate_implicit_errors, top = [], []
+        n_combos, n_scored = 0, 0
+        try:
+            if(search == 'lattice'):
+                with self.stats.Phase('implicit.search'):
+                    rows, summary = LatticeSearch(encoded, kernel, I, P, proxy_corr_threshold, max_comb_size-1,
+                                                  time_budget = time_budget, memory_budget = memory_budget,
+                                                  pool = pool)
+                if(not summary['exact']):
+                    print('''
+        [!] Warning, the proxy search was stopped by its {} after {} complete levels, combinations of more
+        columns were not checked and implicit discrimination violations may be missing.
+                    '''.format(summary['truncated_by'].replace('_', ' '), summary['levels_completed']))
+                batches = [([combo for combo, _ in rows], [scores for _, scores in rows], len(rows))]
+            else:
+                batches = self._ScoreBatches(encoded, kernel, I, P, exceptions, max_comb_size-1, backend, pool)
+            for combos, nmi_values, batch_scored in batches:
+                n_combos += len(combos)
+                n_scored += batch_scored
+                nmi_values = np.array(nmi_values, dtype=float).reshape( (len(combos), len(P)) ) # shape it as a matrix
                 
-        nmi_values = np.array(nmi_values).reshape( (len(I), len(P)) ) # shape it as a matrix
-        nmi_values = pd.DataFrame(nmi_values, index = I, columns=P)   # then to a df for convenience  
-        
-        if(self.verbose):
-            print('[Mutual Information correlation between Input and Protected columns:]')
-            print('implicit correlation threshold: {}'.format(proxy_corr_threshold))
-            print(nmi_values)
-            print()
-        
-        #collect all index, column pairs that satisfy the min proxy proxy_corr_threshold threshold
-        candidate_implicit_errors = []
-        for index, row in nmi_values.iterrows():
-            p_corr_c = row[row.gt(proxy_corr_threshold)]
-            if(len(p_corr_c) == 0):
-                continue
-            for case in list(zip(p_corr_c.index.tolist(), p_corr_c.tolist())): 
-                index_t = index.split('+')
-                implicit_candidate_case =  {'I':index_t, 
-                                            'P':case[0], 
-                                            'corr':round(case[1], 4)}
-                if( not(self._CoveredByImplicitException(implicit_candidate_case, E)) ):
-                    candidate_implicit_errors.append( implicit_candidate_case )
+                if(self.verbose):
+                    import pandas as pd
+                    if(n_combos == len(combos)):
+                        print('[Mutual Information correlation between Input and Protected columns:]')
+                        print('implicit correlation threshold: {}'.format(proxy_corr_threshold))
+                    print(pd.DataFrame(nmi_values, index = ['+'.join(combo) for combo in combos], columns=P))
+                    print()
+                
+                #collect all index, column pairs that satisfy the min proxy proxy_corr_threshold threshold
+                with self.stats.Phase('implicit.filter'):
+                    for row, col in zip(*np.nonzero(nmi_values > proxy_corr_threshold)):
+                        implicit_candidate_case = _ImplicitCase(combos[row], P[col], nmi_values[row, col])
+                        if( not(self._CoveredByImplicitException(implicit_candidate_case, exceptions)) ):
+                            candidate_implicit_errors.append( implicit_candidate_case )
+                    if(top_k is not None and top_k > 0):
+                        top = self._TopPairs(top, combos, nmi_values, P, exceptions, top_k, n_combos - len(combos))
+        finally:
+            if(pool is not None):
+                pool.Close()
+        if(search == 'lattice'):
+            self.implicit_search_summary = summary
+        else:
+            self.implicit_search_summary = {'search': 'exhaustive',
+                                            'exact': True,
+                                            'evaluated': n_scored,
+                                            'skipped': n_combos - n_scored,
+                                            'pruned': {},
+                                            'truncated_by': None,
+                                            'levels_completed': max_comb_size-1}
+        if(top_k is not None):
+            self.implicit_search_summary['top'] = [case for _, _, case in top]
+        summary = self.implicit_search_summary
+        self.stats.Count('implicit.rows', encoded.n_rows)
+        self.stats.Count('implicit.combinations_evaluated', summary['evaluated'])
+        self.stats.Count('implicit.combinations_skipped', summary['skipped'])
+        self.stats.Count('implicit.combinations_pruned', sum(summary['pruned'].values()))
+        self.stats.Count('implicit.workers', n_jobs)
             
         return candidate_implicit_errors
     
     def _CoveredByIndirectException(self, indirect_candidate_discr, E_Indirect):
         '''
         Checks whether the candidate for indirect discrimination tuple is covered
-        by any of the indirect discrimination exceptions. If it is, returns True; returns False otherwise
+        by any of the indirect discrimination exceptions. If it is, returns True; returns False otherwise.
+        The order of the two subpopulations does not matter: ('a', 'b') is covered by an exception on ('b', 'a')
         
         Input:
         indirect_candidate_discr : candidate case of indirect discrimination, of the form
@@ -158,26 +486,57 @@ class NormativeApproachDiscrimination():
                 Pv:(<str>,<str>) . Tuple with the values that define the two subpopulations from P
                 O : output variable
                 Ov: output value from O
+            or their index (see _ExceptionIndex)
         Returns:
         True, if an exception covers the possible case of implict discrimination;
         False, otherwise
         '''
-        for ex in E_Indirect:
-            if(indirect_candidate_discr['P'] == ex['P'] and \
-               indirect_candidate_discr['Pv'] == ex['Pv'] and \
-               indirect_candidate_discr['O'] == ex['O'] and \
-               indirect_candidate_discr['Ov'] == ex['Ov']):
-                return True
-        return False
+        return self._Covered('Indirect', indirect_candidate_discr, E_Indirect)
+    
     
+    def _OutputValues(self, encoded, O):
+        '''
+        Returns the values of the output column that indirect discrimination compares, as (o_df_values, o_idx, o_valid):
+        the values, their codes, and a mask of the codes that are not missing values.
+        Missing values are neither an output nor a subpopulation, and are left out as in pd.crosstab.
+        '''
+        import pandas as pd
+        o_labels = encoded.Labels(O)
+        o_df_values = [v for v in set(encoded.LabelsByAppearance(O)) if not pd.isnull(v)]
+        o_valid = np.array([not pd.isnull(v) for v in o_labels])
+        o_code = {v: code for code, v in enumerate(o_labels)}
+        return o_df_values, np.array([o_code[v] for v in o_df_values], dtype=np.int64), o_valid
     
-    def CheckIndirectDiscrimination(self, df, P, O, E, ID_proportion, ID_minpval = 0.05):
+    def _SubpopulationRates(self, encoded, P, O, o_idx):
+        '''
+        Yields, for every protected column with at least two subpopulations, (p, p_df_values, p_idx, pairs, counts, v1, v2):
+        its subpopulations and their codes, every pair of subpopulations (as indexes of p_df_values), the crosstab of p
+        and O, and the rate of every output (of o_idx, see _OutputValues) in the first and second subpopulation of every pair
+        '''
+        import pandas as pd
+        for p in P:
+            #a single pass over the rows builds the (value of p) x (value of O) count matrix, 
+            #from which all rates and contingency tables are derived
+            with self.stats.Phase('indirect.disparate_impact.crosstabs'):
+                counts = encoded.Crosstab(p, O)
+            rates = counts / counts.sum(axis=1, keepdims=True)
+        
+            #prepare all sets and possible combinations of populations and outputs to check
+            p_df_values = [v for v in set(encoded.LabelsByAppearance(p)) if not pd.isnull(v)]
+            p_code = {v: code for code, v in enumerate(encoded.Labels(p))}
+            p_idx = np.array([p_code[v] for v in p_df_values], dtype=np.int64)
+            if(len(p_idx) < 2):
+                continue
+            pairs = np.array(list(itertools.combinations(range(len(p_idx)), 2)), dtype=np.int64)
+            yield p, p_df_values, p_idx, pairs, counts, rates[p_idx[pairs[:,0]]][:, o_idx], rates[p_idx[pairs[:,1]]][:, o_idx]
+    
+    def CheckIndirectDiscrimination(self, df, P, O, E, ID_proportion, ID_minpval = 0.05, pvalue_correction = None):
         '''
         This function checks for indirect discrimination between dataframe protected columns P and output column O,
         that is not covered by the defined exceptions.
         If any correlation above the set threshold 'proxy_corr_threshold' is found, it returns a warning/error
         Input:
-        df: dataset dataframe        
+        df: dataset dataframe (or StreamedCounts)
         P : list<str> . protected attributes as column names
         O : <str> . output column name
         E : list< {'P': <str>, 'Pv':(<str>,<str>), 'O':<str>, 'Ov':<str>} > 
@@ -186,110 +545,797 @@ class NormativeApproachDiscrimination():
                 Pv:(<str>,<str>) . Tuple with the values that define the two subpopulations from P
                 O : output variable
                 Ov: output value from O
+            Pairs of subpopulations whose flagged outputs are all covered by exceptions are not tested, unless
+            a pvalue_correction is applied
         ID_proportion : float \in [0,1] . Defines the min proportion to consider ID
+        ID_minpval : float . Max p-value of the chi2 test between both subpopulations to report a case
+        pvalue_correction : None | 'holm' | 'bh' . Multiple-comparison correction applied to the p-values of all
+            the chi2 tests run in this check (one per flagged pair of subpopulations) before comparing them with ID_minpval
         Returns:
         candidate_indirect_errors : list<{'P': <str>, 
                                         'Pv': (<str>, <str>), 
                                         'O' : <str>,
                                         'Ov': <str>,
-                                        'ratio': <float> (or Inf)
+                                        'ratio': <float> (or Inf),
+                                        'chi2': {'pvalue', 'chi2', 'degrees_freedom'} (plus 'pvalue_adjusted' and
+                                            'correction' when a correction is applied)
                                         }>
             List of explicit indirect discrimination violations, where P is the protected column name
             Pv the two subpoulations extracted from P values, O is the output column name,
             Ov is the output column value from which both subpopulations where compared,
             and ratio is the proportion between how many persons obtained output Ov between Pv1 and Pv2.
         '''
-        #prepare all possible outputs to compare
-        o_df_values = list(set(df[O].tolist()))  
+        encoded = self._Encode(df)
+        exceptions = self._ExceptionIndex('Indirect', E)
+        o_df_values, o_idx, o_valid = self._OutputValues(encoded, O)
 
         #check, for every protected variable, if there exist disparate impact with any of the possible  
-        #combinations of the output
+        #combinations of the output. Flagged pairs are collected first, and tested all together below
+        flagged_pairs = []
+        tables = []
+        with self.stats.Phase('indirect.disparate_impact'):
+            for p, p_df_values, p_idx, pairs, counts, v1, v2 in self._SubpopulationRates(encoded, P, O, o_idx):
+                flagged = v1*ID_proportion > v2
+                self.stats.Count('indirect.pairs', len(pairs))
+                self.stats.Count('indirect.pairs_flagged', flagged.any(axis=1).sum())
+            
+                for pair in np.flatnonzero(flagged.any(axis=1)):
+                    sub1, sub2 = p_df_values[pairs[pair][0]], p_df_values[pairs[pair][1]]
+                    outputs = np.flatnonzero(flagged[pair])
+                    #pairs whose outputs are all covered by exceptions need no test, unless p-values are corrected
+                    #for multiple comparisons (the family of tests must stay the same whatever the exceptions)
+                    if(pvalue_correction is None and 
+                       self._Exempted('Indirect', p.strip(), (sub1.strip(), sub2.strip()), O.strip(), 
+                                      [o_df_values[o].strip() for o in outputs], exceptions)):
+                        self.stats.Count('indirect.pairs_exempted')
+                        continue
+                    #chi2 comparing both subgroups for all output values O to obtain 
+                    #explanation on how significant are findings (outputs neither subgroup obtained are left out)
+                    tables.append(counts[sorted(p_idx[pairs[pair]])] * o_valid)
+                    flagged_pairs.append((p, 
+                                          sub1, 
+                                          sub2,
+                                          [(o, float(v1[pair, o]), float(v2[pair, o])) for o in outputs]))
+        
+        self.stats.Count('indirect.rows', encoded.n_rows)
+        if(len(tables) == 0):
+            return []
+        with self.stats.Phase('indirect.chi2'):
+            chi2_values, p_values, dofs = BatchChi2Contingency(np.array(tables))
+            if(pvalue_correction is not None):
+                adjusted_p_values = AdjustPValues(p_values, pvalue_correction)
+        self.stats.Count('indirect.chi2_tests', len(tables))
+        #a single scipy call computes the p-values of the whole batch
+        self.stats.Count('indirect.scipy_calls', 1)
+        
         candidate_indirect_errors = []
-        for p in P:
-            #prepare all sets and possible combinations of populations and outputs to check
-            p_df_values = list(set(df[p].tolist()))
-            p_df_values_comb = list(itertools.combinations(p_df_values, 2))
-            for sub1, sub2 in p_df_values_comb:
-                for o_df_value in o_df_values:
-                    v1a = len(df[ (df[p] == sub1) & (df[O] == o_df_value) ]) / len(df[df[p] == sub1])
-                    v2a = len(df[ (df[p] == sub2) & (df[O] == o_df_value) ]) / len(df[df[p] == sub2])
-                    if( v1a*ID_proportion > v2a ):
-                        #chi2 comparing both subgroups for all output values O to obtain 
-                        #explanation on how significant are findings
-                        npd = df[(df[p].isin([sub1, sub2]))]
-                        contingency_table = pd.crosstab(npd[p],npd[O],margins = True)
-                        c1 = contingency_table.iloc[0][0:len(contingency_table.columns)-1].values
-                        c2 = contingency_table.iloc[1][0:len(contingency_table.columns)-1].values
-                        f_obs = np.array([c1,c2])
-                        chi2, p_value, degrees_freedom = stats.chi2_contingency(np.array(f_obs))[:3]
-                        
-                        if(p_value < ID_minpval):
-                            indirect_candidate_discr = {
-                                'P' : p.strip(),
-                                'Pv': (sub1.strip(), sub2.strip()),
-                                'O' : O.strip(),
-                                'Ov': o_df_value.strip(),
-                                'ratio': np.Inf if v2a==0 else round(v1a/v2a, 4),
-                                'chi2': {'pvalue': p_value, 'chi2':chi2, 'degrees_freedom': degrees_freedom}
-                            }
-                            if( not(self._CoveredByIndirectException(indirect_candidate_discr, E)) ):
-                                candidate_indirect_errors.append(indirect_candidate_discr)
+        for k, (p, sub1, sub2, outputs) in enumerate(flagged_pairs):
+            chi2_result = {'pvalue': p_values[k], 'chi2': chi2_values[k], 'degrees_freedom': int(dofs[k])}
+            if(pvalue_correction is not None):
+                chi2_result['pvalue_adjusted'] = adjusted_p_values[k]
+                chi2_result['correction'] = pvalue_correction
+            if(chi2_result.get('pvalue_adjusted', p_values[k]) >= ID_minpval):
+                continue
+            for o, v1a, v2a in outputs:
+                indirect_candidate_discr = dict(_IndirectCase(p, sub1, sub2, O, o_df_values[o], v1a, v2a), 
+                                                chi2 = dict(chi2_result))
+                if( not(self._CoveredByIndirectException(indirect_candidate_discr, exceptions)) ):
+                    candidate_indirect_errors.append(indirect_candidate_discr)
 
         return candidate_indirect_errors
             
     
-    def Run(self):
+    def CheckIntersectionalDiscrimination(self, df, P, O, E, ID_proportion, ID_minpval = 0.05, pvalue_correction = None,
+                                          max_comb_size = None, min_support = DEFAULT_MIN_SUPPORT):
+        '''
+        Checks for indirect discrimination between intersectional subgroups: groups defined by the values of several
+        protected columns at once (e.g. sex x race x age), which the indirect check, one protected column at a time,
+        does not compare. For every combination of 2 to max_comb_size protected columns (see ProxySearch.ProxyCombinations),
+        every pair of its subgroups is compared as in CheckIndirectDiscrimination: an output is flagged when its rate
+        in one subgroup is below ID_proportion times its rate in the other, and reported if the chi2 test of both
+        subgroups is significant.
+        All the combinations are counted from a single count cube of the P and O columns, and subgroups with fewer than
+        min_support rows are pruned level by level, before any larger combination is counted (see Intersectional.py).
+        Not available in streaming mode.
+        
+        Input:
+        df: dataset dataframe (or EncodedDataset)
+        P : list<str> . protected attributes as column names
+        O : <str> . output column name
+        E : list< {'P': list<str>, 'Pv': (list<str>, list<str>), 'O': <str>, 'Ov': <str>} > . Intersectional exceptions,
+            where Pv are the values of both subgroups in the columns of P. Pairs of subgroups whose flagged outputs are
+            all covered by exceptions are not tested, unless a pvalue_correction is applied
+        ID_proportion, ID_minpval, pvalue_correction : see CheckIndirectDiscrimination
+        max_comb_size : int . largest number of protected columns intersected (None for all of them)
+        min_support : float . minimum rows of a subgroup, or fraction of the rows of the dataset if below 1
+        Returns:
+        candidate_intersectional_errors : list<{'P': list<str>, 
+                                              'Pv': (tuple<str>, tuple<str>),
+                                              'O' : <str>,
+                                              'Ov': <str>,
+                                              'ratio': <float> (or Inf),
+                                              'support': (<int>, <int>),
+                                              'chi2': see CheckIndirectDiscrimination
+                                              }>
+            where Pv are the values of both subgroups in the columns P, the first one being the subgroup that obtains 
+            output Ov more often, ratio is the proportion between the rates of Ov in both subgroups, and support
+            their number of rows.
+        '''
+        import pandas as pd
+        encoded = self._Encode(df)
+        if(not isinstance(encoded, EncodedDataset)):
+            raise ValueError('Intersectional checks count every combination of the protected columns, '
+                             'which the count tables of streaming mode do not keep')
+        exceptions = self._ExceptionIndex('Intersectional', E)
+        o_df_values, o_idx, o_valid = self._OutputValues(encoded, O)
+        cardinalities = {c: encoded.Cardinality(c) for c in P + [O]}
+        missing = {p: np.array([pd.isnull(v) for v in encoded.Labels(p)], dtype=bool) for p in P}
+        min_rows = MinSupportRows(min_support, encoded.n_rows)
+        
+        with self.stats.Phase('intersectional.cube'):
+            cells, counts = CountCube(encoded, P + [O])
+        self.stats.Count('intersectional.cells', len(counts))
+        
+        #flagged pairs of every combination, and their 2xk tables, are collected first and tested all together below
+        blocks = []
+        tables = []
+        counters = {}
+        with self.stats.Phase('intersectional.disparate_impact'):
+            for combo, groups, crosstab in FrequentIntersections(cells, counts, P, O, cardinalities, missing, min_rows, 
+                                                                  max_comb_size, counters):
+                labels = [[str(v).strip() for v in encoded.Labels(c)] for c in combo]
+                values = [tuple(labels[k][code] for k, code in enumerate(group)) for group in groups]
+                support = crosstab.sum(axis=1)
+                rates = (crosstab / support[:, None])[:, o_idx]
+                pairs = np.array(list(itertools.combinations(range(len(groups)), 2)), dtype=np.int64)
+                #an output is flagged whichever of both subgroups obtains it more often
+                flagged = np.maximum(rates[pairs[:, 0]], rates[pairs[:, 1]])*ID_proportion > np.minimum(rates[pairs[:, 0]], rates[pairs[:, 1]])
+                flagged_idx = np.flatnonzero(flagged.any(axis=1))
+                self.stats.Count('intersectional.pairs', len(pairs))
+                self.stats.Count('intersectional.pairs_flagged', len(flagged_idx))
+                #pairs whose outputs are all covered by exceptions need no test, unless p-values are corrected
+                if(pvalue_correction is None and len(exceptions) > 0):
+                    exempted = [k for k in flagged_idx 
+                                if self._Exempted('Intersectional', combo, (values[pairs[k, 0]], values[pairs[k, 1]]), O.strip(),
+                                                  [o_df_values[o].strip() for o in np.flatnonzero(flagged[k])], exceptions)]
+                    self.stats.Count('intersectional.pairs_exempted', len(exempted))
+                    flagged_idx = np.setdiff1d(flagged_idx, np.array(exempted, dtype=np.int64))
+                if(len(flagged_idx) == 0):
+                    continue
+                tables.append(crosstab[pairs[flagged_idx]] * o_valid)
+                blocks.append((combo, values, support, rates, pairs[flagged_idx], flagged[flagged_idx]))
+        for name, value in counters.items():
+            self.stats.Count('intersectional.{}'.format(name), value)
+        
+        self.stats.Count('intersectional.rows', encoded.n_rows)
+        if(len(tables) == 0):
+            return []
+        with self.stats.Phase('intersectional.chi2'):
+            chi2_values, p_values, dofs = BatchChi2Contingency(np.concatenate(tables))
+            adjusted_p_values = AdjustPValues(p_values, pvalue_correction) if pvalue_correction is not None else p_values
+        self.stats.Count('intersectional.chi2_tests', len(p_values))
+        
+        candidate_intersectional_errors = []
+        offset = 0
+        for combo, values, support, rates, pairs, flagged in blocks:
+            for pair in np.flatnonzero(adjusted_p_values[offset:offset + len(pairs)] < ID_minpval):
+                k = offset + pair
+                chi2_result = {'pvalue': p_values[k], 'chi2': chi2_values[k], 'degrees_freedom': int(dofs[k])}
+                if(pvalue_correction is not None):
+                    chi2_result['pvalue_adjusted'] = adjusted_p_values[k]
+                    chi2_result['correction'] = pvalue_correction
+                for o in np.flatnonzero(flagged[pair]):
+                    #the first subgroup is the one that obtains the output more often
+                    first, second = pairs[pair] if rates[pairs[pair, 0], o] >= rates[pairs[pair, 1], o] else pairs[pair][::-1]
+                    v1a, v2a = float(rates[first, o]), float(rates[second, o])
+                    intersectional_candidate_discr = {
+                        'P' : list(combo),
+                        'Pv': (values[first], values[second]),
+                        'O' : O.strip(),
+                        'Ov': o_df_values[o].strip(),
+                        'ratio': np.inf if v2a==0 else round(v1a/v2a, 4),
+                        'support': (int(support[first]), int(support[second])),
+                        'chi2': dict(chi2_result)
+                    }
+                    if( not(self._Covered('Intersectional', intersectional_candidate_discr, exceptions)) ):
+                        candidate_intersectional_errors.append(intersectional_candidate_discr)
+            offset += len(pairs)
+        
+        return candidate_intersectional_errors
+    
+    def ApproximateImplicitDiscrimination(self, df, sample, I, P, E, proxy_corr_threshold, max_comb_size = None,
+                                          confidence = DEFAULT_CONFIDENCE, refine = True, n_jobs = None):
+        '''
+        Approximate version of CheckImplicitDiscrimination. The NMI of every combination of input columns with every
+        protected column is estimated on a sample of the rows, with a confidence interval (see Sampling.NMIInterval).
+        Pairs whose interval lies above proxy_corr_threshold are violations, and pairs whose interval lies below it
+        are not: both are definite, at the given confidence level. Only the pairs whose interval straddles the threshold
+        are computed on the whole dataset, or reported as provisional violations if refine is False.
+        Every combination up to max_comb_size is estimated, as estimates on a sample are cheap.
+        
+        Input:
+        df: dataset dataframe (or CachedDataset)
+        sample : EncodedDataset . sample of the rows of df (see Sampling.StratifiedSample)
+        I, P, E, proxy_corr_threshold, max_comb_size, n_jobs : see CheckImplicitDiscrimination
+        confidence : float in (0,1) . confidence level of the intervals
+        refine : <bool> . compute on the whole dataset the pairs whose interval straddles the threshold
+        Returns:
+        candidate_implicit_errors : list<{'I': list<str>, 'P': <str>, 'corr': <float>, 'ci': (<float>, <float>), 
+                                          'exact': <bool>, 'status': 'definite' | 'provisional'}> . 
+            As in CheckImplicitDiscrimination, where corr is either the NMI of the whole dataset (exact, and ci is None)
+            or the NMI estimated on the sample and ci its confidence interval
+        '''
+        if(max_comb_size is None or max_comb_size > len(I)):
+            max_comb_size = len(I)
+        encoded = self._Encode(df)
+        exceptions = self._ExceptionIndex('Implicit', E)
+        z = Quantile(confidence)
+        combos = [list(combo) for i in range(1, max_comb_size+1) for combo in combinations(I, i)]
+        
+        #(estimate, low, high, exact) of every (combination, protected column) pair scored. A column is not a proxy 
+        #of itself, and pairs covered by an exception are not scored
+        scores = {}
+        with self.stats.Phase('implicit.sample'):
+            sample_kernel = NMIKernel()
+            for k, combo in enumerate(combos):
+                targets = [p for p in P if combo != [p] and _ImplicitKey(combo, p) not in exceptions]
+                if(len(targets) == 0):
+                    continue
+                counts, contingencies = sample.Contingencies(combo, targets)
+                if(sample is encoded):
+                    #the sample holds every row
+                    for p, (nmi, _, _) in zip(targets, sample_kernel.EvaluateContingencies(counts, contingencies)[2]):
+                        scores[(k, p)] = (nmi, nmi, nmi, True)
+                else:
+                    for p, contingency in contingencies:
+                        scores[(k, p)] = NMIInterval(contingency, z) + (False,)
+        straddling = [key for key, (_, low, high, exact) in scores.items() 
+                      if not exact and low <= proxy_corr_threshold < high]
+        
+        if(refine and len(straddling) > 0):
+            with self.stats.Phase('implicit.refine'):
+                refined = {}
+                for k, p in straddling:
+                    refined.setdefault(k, []).append(p)
+                n_jobs = ResolveJobs(n_jobs)
+                if(n_jobs > 1):
+                    with ProxyPool(encoded, I + P, n_jobs) as pool:
+                        for k, nmis in zip(refined, pool.Score([combos[k] for k in refined], P)):
+                            for p in refined[k]:
+                                scores[(k, p)] = (nmis[P.index(p)],)*3 + (True,)
+                else:
+                    kernel = NMIKernel()
+                    for k, targets in refined.items():
+                        results = kernel.EvaluateContingencies(*encoded.Contingencies(combos[k], targets))[2]
+                        for p, (nmi, _, _) in zip(targets, results):
+                            scores[(k, p)] = (nmi, nmi, nmi, True)
+        
+        candidate_implicit_errors = []
+        for k, combo in enumerate(combos):
+            for p in P:
+                if((k, p) not in scores):
+                    continue
+                estimate, low, high, exact = scores[(k, p)]
+                if(estimate <= proxy_corr_threshold if exact else high <= proxy_corr_threshold):
+                    continue
+                implicit_candidate_case = dict(_ImplicitCase(combo, p, estimate),
+                                               ci = None if exact else (round(low, 4), round(high, 4)),
+                                               exact = exact,
+                                               status = 'definite' if exact or low > proxy_corr_threshold else 'provisional')
+                if( not(self._CoveredByImplicitException(implicit_candidate_case, exceptions)) ):
+                    candidate_implicit_errors.append( implicit_candidate_case )
+        
+        self.implicit_search_summary = {'search': 'approximate',
+                                        'exact': all(case['status'] == 'definite' for case in candidate_implicit_errors),
+                                        'evaluated': len(set(k for k, _ in scores)),
+                                        'skipped': len(combos) - len(set(k for k, _ in scores)),
+                                        'pruned': {},
+                                        'truncated_by': None,
+                                        'levels_completed': max_comb_size}
+        self.stats.Count('implicit.rows', encoded.n_rows)
+        self.stats.Count('implicit.sample_rows', sample.n_rows)
+        self.stats.Count('implicit.pairs_estimated', len(scores))
+        self.stats.Count('implicit.pairs_refined', len(straddling) if refine else 0)
+        self.stats.Count('implicit.pairs_provisional', sum(case['status'] == 'provisional' for case in candidate_implicit_errors))
+        return candidate_implicit_errors
+    
+    def ApproximateIndirectDiscrimination(self, df, sample, P, O, E, ID_proportion, ID_minpval = 0.05, pvalue_correction = None,
+                                          confidence = DEFAULT_CONFIDENCE, refine = True):
+        '''
+        Approximate version of CheckIndirectDiscrimination. The rate of every output in every subpopulation is estimated
+        on a sample of the rows, and the ratio of the rates of every pair of subpopulations gets a confidence interval
+        (see Sampling.RatioInterval). A ratio whose interval lies on one side of ID_proportion is decided on the sample,
+        and so is the chi2 test of a flagged pair that is significant on the sample alone (the whole dataset only adds
+        evidence). The crosstab of a protected column with the output is computed on the whole dataset only when one 
+        of its ratios straddles ID_proportion, or one of its flagged pairs is not significant on the sample.
+        If refine is False, those cases are reported as provisional violations instead.
+        
+        Input:
+        df, sample, confidence, refine : see ApproximateImplicitDiscrimination
+        P, O, E, ID_proportion, ID_minpval, pvalue_correction : see CheckIndirectDiscrimination
+        Returns:
+        candidate_indirect_errors : as in CheckIndirectDiscrimination, where ratio and chi2 are computed either on the
+            whole dataset or on the sample, plus
+            'ci': (<float>, <float>) . confidence interval of the ratio (None if computed on the whole dataset)
+            'exact': <bool> . ratio and chi2 computed on the whole dataset
+            'status': 'definite' | 'provisional'
+        '''
+        import pandas as pd
+        encoded = self._Encode(df)
+        exceptions = self._ExceptionIndex('Indirect', E)
+        z = Quantile(confidence)
+        #outputs and subpopulations are those of the whole dataset, in the same order as in CheckIndirectDiscrimination
+        o_df_values, o_idx, o_valid = self._OutputValues(encoded, O)
+        p_values_of = {}
+        for p in P:
+            p_code = {v: code for code, v in enumerate(encoded.Labels(p))}
+            p_df_values = [v for v in set(encoded.LabelsByAppearance(p)) if not pd.isnull(v)]
+            p_values_of[p] = (p_df_values, np.array([p_code[v] for v in p_df_values], dtype=np.int64))
+        
+        #crosstabs computed on the whole dataset. Every protected column is refined at most once, so the loop ends
+        exact_counts = {p: encoded.Crosstab(p, O) for p in P} if sample is encoded else {}
+        while(True):
+            flagged_pairs, tables, pending = [], [], set()
+            with self.stats.Phase('indirect.disparate_impact'):
+                for p in P:
+                    exact = p in exact_counts
+                    counts = exact_counts[p] if exact else sample.Crosstab(p, O)
+                    totals = counts.sum(axis=1, keepdims=True)
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        rates = counts / totals
+                    p_df_values, p_idx = p_values_of[p]
+                    if(len(p_idx) < 2):
+                        continue
+                    pairs = np.array(list(itertools.combinations(range(len(p_idx)), 2)), dtype=np.int64)
+                    v1 = rates[p_idx[pairs[:,0]]][:, o_idx]
+                    v2 = rates[p_idx[pairs[:,1]]][:, o_idx]
+                    if(exact):
+                        flagged = v1*ID_proportion > v2
+                        undecided = np.zeros_like(flagged)
+                        low = high = np.zeros_like(v1)
+                    else:
+                        #interval of v2/v1: the pair is flagged when it lies below ID_proportion
+                        low, high = RatioInterval(counts[p_idx[pairs[:,0]]][:, o_idx], totals[p_idx[pairs[:,0]]],
+                                                  counts[p_idx[pairs[:,1]]][:, o_idx], totals[p_idx[pairs[:,1]]], z)
+                        flagged = high < ID_proportion
+                        undecided = (low < ID_proportion) & ~flagged
+                        if(refine and undecided.any()):
+                            pending.add(p)
+                            continue
+                    candidates = flagged | undecided
+                    for pair in np.flatnonzero(candidates.any(axis=1)):
+                        sub1, sub2 = p_df_values[pairs[pair][0]], p_df_values[pairs[pair][1]]
+                        outputs = np.flatnonzero(candidates[pair])
+                        if(pvalue_correction is None and 
+                           self._Exempted('Indirect', p.strip(), (sub1.strip(), sub2.strip()), O.strip(), 
+                                          [o_df_values[o].strip() for o in outputs], exceptions)):
+                            continue
+                        tables.append(counts[sorted(p_idx[pairs[pair]])] * o_valid)
+                        flagged_pairs.append((p, sub1, sub2, exact,
+                                              [(o, float(v1[pair, o]), float(v2[pair, o]), float(low[pair, o]), float(high[pair, o]),
+                                                bool(undecided[pair, o])) for o in outputs]))
+            if(len(pending) == 0 and len(tables) > 0):
+                with self.stats.Phase('indirect.chi2'):
+                    chi2_values, p_values, dofs = BatchChi2Contingency(np.array(tables))
+                    adjusted_p_values = AdjustPValues(p_values, pvalue_correction) if pvalue_correction is not None else p_values
+                #flagged pairs not significant on the sample are tested on the whole dataset
+                pending = set(p for (p, _, _, exact, _), pvalue in zip(flagged_pairs, adjusted_p_values) 
+                              if refine and not exact and pvalue >= ID_minpval)
+            if(len(pending) == 0):
+                break
+            with self.stats.Phase('indirect.refine'):
+                for p in pending:
+                    exact_counts[p] = encoded.Crosstab(p, O)
+        
+        self.stats.Count('indirect.rows', encoded.n_rows)
+        self.stats.Count('indirect.sample_rows', sample.n_rows)
+        self.stats.Count('indirect.protected_refined', len(exact_counts) if sample is not encoded else 0)
+        self.stats.Count('indirect.chi2_tests', len(tables))
+        if(len(tables) == 0):
+            return []
+        candidate_indirect_errors = []
+        for k, (p, sub1, sub2, exact, outputs) in enumerate(flagged_pairs):
+            chi2_result = {'pvalue': p_values[k], 'chi2': chi2_values[k], 'degrees_freedom': int(dofs[k])}
+            if(pvalue_correction is not None):
+                chi2_result['pvalue_adjusted'] = adjusted_p_values[k]
+                chi2_result['correction'] = pvalue_correction
+            significant = adjusted_p_values[k] < ID_minpval
+            if(exact and not significant):
+                continue
+            for o, v1a, v2a, low, high, undecided in outputs:
+                indirect_candidate_discr = dict(_IndirectCase(p, sub1, sub2, O, o_df_values[o], v1a, v2a),
+                                                chi2 = dict(chi2_result),
+                                                #the interval of v1/v2 follows from the one of v2/v1
+                                                ci = None if exact else (round(1/high, 4) if high > 0 else np.inf, 
+                                                                         round(1/low, 4) if low > 0 else np.inf),
+                                                exact = exact,
+                                                status = 'definite' if significant and not undecided else 'provisional')
+                if( not(self._CoveredByIndirectException(indirect_candidate_discr, exceptions)) ):
+                    candidate_indirect_errors.append(indirect_candidate_discr)
+        self.stats.Count('indirect.pairs_provisional', sum(case['status'] == 'provisional' for case in candidate_indirect_errors))
+        return candidate_indirect_errors
+    
+    def _CheckConfig(self):
+        '''
+        Input sanity check of the config against the dataset columns. Raises ValueError if it is not valid.
+        It is already checked when the config is loaded, this checks the config as it may have been changed since.
+        '''
+        ValidateColumns(self.config, self.exceptions, self.columns)
+        if(len(self.config['I']) > 5 and self._ImplicitDiscrimination_search == 'exhaustive'):
+            print('''
+        [!] Warning, the dataset contains many columns, please beware it may take a long time generating combinations of 
+        columns to identify proxies between Input and Protected variables to attest Implicit Discrimination. 
+        Consider setting 'max_comb_size' to a small number (e.g. 3 or smaller), or '_ImplicitDiscrimination_search' to 'lattice'
+        with a high threshold or a time budget ('_ImplicitDiscrimination_time_budget').
+                ''')
+    
+    def _Data(self):
+        '''
+        Returns the data the checks run on: the dataframe, the count tables in streaming mode
+        (accumulated the first time they are needed), or the cached dataset when a cache is set.
+        '''
+        if(self.cache is not None):
+            if(self.cached is None):
+                with self.stats.Phase('data'):
+                    self.cached = self.cache.Open(self.csv_path_dataset, self.config['I'], self.config['P'], self.config['O'])
+            return self.cached
+        if(not self.streaming):
+            return self.df
+        if(self.counts is None):
+            with self.stats.Phase('data'):
+                self.counts = StreamCSV(self.csv_path_dataset, 
+                                        self.config['I'], 
+                                        self.config['P'], 
+                                        self.config['O'], 
+                                        max_comb_size = self._ImplicitDiscrimination_Max_proxy_combo_size,
+                                        chunksize = self.chunksize)
+        return self.counts
+    
+    def _Sample(self, data):
+        '''
+        Returns the stratified sample of the rows of data that approximate checks run on. It is drawn once,
+        stratified by the protected columns (see Sampling.StratifiedSample), and reused by later checks.
+        The sample is taken from the encoded dataset, so the whole file is still read and encoded once.
+        '''
+        if(self.sample is None or self._sampled is not data):
+            with self.stats.Phase('sample'):
+                self.sample = StratifiedSample(self._Encode(data), 
+                                               self.config['P'], 
+                                               self.config['I'] + self.config['P'] + [self.config['O']],
+                                               self._Approximate_sample_rows,
+                                               seed = self._Approximate_seed)
+            self._sampled = data
+        return self.sample
+    
+    def RunCheck(self, violation_type, approximate = None):
+        '''
+        Runs a single check with the parameters set up in the config file.
+        
+        Input:
+        violation_type : 'Ve' (explicit), 'Vi' (implicit), 'Vd' (indirect) or 'Vx' (intersectional discrimination)
+        approximate : <bool> . run the approximate check (see Run). None for the config value (_Approximate)
+        Returns:
+        list of violations, see Run
+        '''
+        if(violation_type not in _PHASES):
+            raise ValueError('Unknown violation type {}, expected Ve, Vi, Vd or Vx'.format(violation_type))
+        approximate = approximate if approximate is not None else self._Approximate
+        if(approximate and self.streaming):
+            raise ValueError('Approximate checks sample rows, which the count tables of streaming mode do not keep')
+        #explicit discrimination only reads the config, so the dataset is not loaded for it
+        data = self._Data() if violation_type != 'Ve' else self._df
+        with self.stats.Phase(_PHASES[violation_type]):
+            #explicit and intersectional checks are always exact
+            if(approximate and violation_type in ('Vi', 'Vd')):
+                return self._RunApproximateCheck(violation_type, data)
+            return self._RunCheck(violation_type, data)
+    
+    def _RunApproximateCheck(self, violation_type, data):
+        if(violation_type == 'Vi'):
+            return self.ApproximateImplicitDiscrimination(data, 
+                                                          self._Sample(data),
+                                                          self.config['I'], 
+                                                          self.config['P'], 
+                                                          self.exceptions['Implicit'], 
+                                                          self._ImplicitDiscrimination_min_corr,
+                                                          max_comb_size = self._ImplicitDiscrimination_Max_proxy_combo_size,
+                                                          confidence = self._Approximate_confidence,
+                                                          refine = self._Approximate_refine,
+                                                          n_jobs = self._ImplicitDiscrimination_n_jobs)
+        if(violation_type == 'Vd'):
+            return self.ApproximateIndirectDiscrimination(data, 
+                                                          self._Sample(data),
+                                                          self.config['P'], 
+                                                          self.config['O'], 
+                                                          self.exceptions['Indirect'], 
+                                                          self._IndirectDiscrimination_min_prop,
+                                                          self._IndirectDiscrimination_min_pvalue,
+                                                          pvalue_correction = self._IndirectDiscrimination_pvalue_correction,
+                                                          confidence = self._Approximate_confidence,
+                                                          refine = self._Approximate_refine)
+    
+    def _RunCheck(self, violation_type, data):
+        if(violation_type == 'Ve'):
+            #Attesting Direct Discrimination (protected variables used as input P)
+            return self.CheckExplicitDiscrimination(data, 
+                                                    self.config['P'], 
+                                                    self.exceptions['Explicit'])
+        if(violation_type == 'Vi'):
+            #Attesting Implicit Discrimination (proxy variables in I vs P)
+            return self.CheckImplicitDiscrimination(data, 
+                                                    self.config['I'], 
+                                                    self.config['P'], 
+                                                    self.exceptions['Implicit'], 
+                                                    self._ImplicitDiscrimination_min_corr,
+                                                    max_comb_size = self._ImplicitDiscrimination_Max_proxy_combo_size,
+                                                    search = self._ImplicitDiscrimination_search,
+                                                    time_budget = self._ImplicitDiscrimination_time_budget,
+                                                    memory_budget = self._ImplicitDiscrimination_memory_budget,
+                                                    n_jobs = self._ImplicitDiscrimination_n_jobs,
+                                                    top_k = self._ImplicitDiscrimination_top_k)
+        if(violation_type == 'Vd'):
+            #Attesting Indirect Discrimination (disparate impact)
+            return self.CheckIndirectDiscrimination(data, 
+                                                    self.config['P'], 
+                                                    self.config['O'], 
+                                                    self.exceptions['Indirect'], 
+                                                    self._IndirectDiscrimination_min_prop,
+                                                    self._IndirectDiscrimination_min_pvalue,
+                                                    pvalue_correction = self._IndirectDiscrimination_pvalue_correction)
+        if(violation_type == 'Vx'):
+            #Attesting Indirect Discrimination between intersectional subgroups
+            return self.CheckIntersectionalDiscrimination(data, 
+                                                          self.config['P'], 
+                                                          self.config['O'], 
+                                                          self.exceptions.get('Intersectional', []), 
+                                                          self._IndirectDiscrimination_min_prop,
+                                                          self._IndirectDiscrimination_min_pvalue,
+                                                          pvalue_correction = self._IndirectDiscrimination_pvalue_correction,
+                                                          max_comb_size = self._Intersectional_max_comb_size,
+                                                          min_support = self._Intersectional_min_support)
+    
+    def Update(self, rows = None, return_stats = False, profile = None, profiler = None):
+        '''
+        Incremental re-audit in streaming mode: folds new rows into the count tables behind the checks and
+        returns the updated violations (see Run). Only the new rows are read and counted, the rows already counted
+        are not read again (see Streaming.CountTable), and the count tables can be kept between runs with
+        SaveState / LoadState.
+        
+        Input:
+        rows : dataframe . new rows, with (at least) the I, P and O columns. Values are compared as text, as they
+            are read from the csv. If None, the rows appended to the csv dataset since it was last read are folded 
+            (the csv must only grow by appending rows)
+        return_stats, profile, profiler : see Run
+        Returns:
+        dictionary of discrimination violations, see Run
+        '''
+        if(not self.streaming):
+            raise ValueError('Incremental updates need the count tables of streaming mode (streaming = True)')
+        self._CheckConfig()
+        #the stats (and profile) of the update cover the folding of the new rows too
+        self.stats.Clear(keep = ('config', 'load'))
+        if(profile is not None):
+            self.stats.Profile(profile, profiler)
+        n_rows = self.counts.n_rows if self.counts is not None else 0
+        if(self.counts is None):
+            #first update: every row of the csv is new
+            self._Data()
+        with self.stats.Phase('update'):
+            if(rows is None):
+                AppendCSV(self.counts, self.csv_path_dataset, chunksize = self.chunksize)
+            else:
+                self.counts.AddChunk(rows[self.counts.columns].astype(str).where(rows[self.counts.columns].notnull()))
+        self.stats.Count('update.rows', self.counts.n_rows - n_rows)
+        return self._Run(return_stats)
+    
+    def SaveState(self, path):
+        '''
+        Writes the count tables of streaming mode to a file, see Update
+        '''
+        if(not self.streaming):
+            raise ValueError('Only the count tables of streaming mode can be saved (streaming = True)')
+        self._Data().Save(path)
+    
+    def LoadState(self, path):
+        '''
+        Reads count tables written by SaveState, to go on updating them with Update.
+        They must have been built with the same I, P, O columns and max_comb_size as the config.
+        '''
+        if(not self.streaming):
+            raise ValueError('Count tables can only be used in streaming mode (streaming = True)')
+        counts = LoadCounts(path)
+        max_comb_size = self._ImplicitDiscrimination_Max_proxy_combo_size
+        if(max_comb_size is None or max_comb_size > len(self.config['I'])):
+            max_comb_size = len(self.config['I'])
+        if(counts.I != list(self.config['I']) or counts.P != list(self.config['P']) or counts.O != self.config['O'] or \
+           max(map(len, counts.combos), default=0) != max_comb_size):
+            raise ValueError('The count tables in {} were built for other I, P, O columns or max_comb_size than the config'.format(path))
+        self.counts = counts
+    
+    def Bytes(self):
+        '''
+        Memory held by the audit between runs, in bytes: the loaded dataframe, its encoded columns, the count tables of 
+        streaming mode and the sample of approximate checks. Columns memory-mapped from the cache are not counted.
+        '''
+        total = int(self._df.memory_usage(index=True, deep=True).sum()) if self._df is not None else 0
+        for encoded in [self._encoded] + ([self.sample] if self.sample is not self._encoded else []):
+            if(isinstance(encoded, EncodedDataset) and not isinstance(encoded, CachedDataset)):
+                total += sum(codes.nbytes for codes in encoded._codes.values() if not isinstance(codes, np.memmap))
+        if(self.counts is not None):
+            total += self.counts.Bytes()
+        return total
+    
+    def Run(self, return_stats = False, profile = None, profiler = None, approximate = None):
         '''
         Main function for the normative approach, checks the dataset and information set up when configuring the 
         main object and returns a dictionary of the different violations of discrimination rules, if any.
         
+        Input:
+        return_stats : <bool> . If True, the instrumentation of the audit is returned too, under 'stats' (see below). 
+            It is also available, after any run, as self.stats (see Instrumentation.Stats, e.g. self.stats.ToJSON(path))
+        profile : <str> . name of a phase to profile (e.g. 'implicit.nmi'), see below
+        profiler : profiler attached to that phase, an object with enable/disable (e.g. cProfile.Profile) or start/stop 
+            (e.g. a sampling profiler). If None, cProfile is used and its report is included in the stats
+        approximate : <bool> . Approximate audit, for a fast first answer on large datasets: implicit and indirect 
+            discrimination are estimated on a stratified sample of _Approximate_sample_rows rows, with confidence 
+            intervals at the _Approximate_confidence level, and only the candidates whose interval straddles
+            _ImplicitDiscrimination_min_corr or _IndirectDiscrimination_Threshold are computed on the whole dataset
+            (see ApproximateImplicitDiscrimination and ApproximateIndirectDiscrimination). Every Vi and Vd violation
+            is then marked 'definite' or 'provisional' (when _Approximate_refine is False), under 'status'.
+            None for the config value (_Approximate). Not available in streaming mode. The whole dataset is
+            still loaded and encoded before sampling: only the checks are faster
         returns:
         dictionary of discrimination violations:
         {
             'Ve': Explicit Discimirnation violations,
             'Vi': Implicit violations,
-            'Vd': IndirectDiscrimination violations
+            'Vd': IndirectDiscrimination violations,
+            'Vx': (only if _Intersectional is set in the config) Indirect discrimination violations between intersectional 
+                subgroups, see CheckIntersectionalDiscrimination,
+            'stats': (only if return_stats) {
+                'phases': {name: {'seconds', 'calls', 'peak_rss_bytes'}} for the phases
+                    config, load (header, and the dataframe the first time a check needs it), data (streaming counts or cache), update (see Update),
+                    explicit, implicit (implicit.combinations, implicit.nmi or implicit.search, implicit.filter),
+                    indirect (indirect.disparate_impact, indirect.disparate_impact.crosstabs, indirect.chi2),
+                    intersectional (intersectional.cube, intersectional.disparate_impact, intersectional.chi2),
+                    and in approximate audits sample, implicit.sample, implicit.refine and indirect.refine,
+                'counters': {name: int} . rows, combinations evaluated/skipped/pruned/cached, pairs of subpopulations
+                    compared and flagged, chi2 tests, scipy and sklearn calls...,
+                'peak_rss_bytes': peak resident memory of the process,
+                'profile': {'phase', 'report'} (when profiled with cProfile)
+            }
         }
         '''
         #input sanity check
-        require_columns = self.config['I'] + self.config['P'] + [self.config['O']]
-        if( len(set(self.config['I'])) != len(self.config['I']) or \
-           len(set(self.config['P'])) != len(self.config['P'])):
-            raise ValueError('I and/or P variables contain duplicated columns')
-        if(len(set(require_columns)) != len(require_columns)):
-            raise ValueError('I,P,O variables contain repeated columns')
-        if(not( set(require_columns).issubset(set(self.df.columns)) )):
-            raise ValueError('Dataset column names do not correspond with I,P,O variables set in config {}'.format(require_columns))
-        if(len(self.config['I']) > 5):
-            print('''
-        [!] Warning, the dataset contains many columns, please beware it may take a long time generating combinations of 
-        columns to identify proxies between Input and Protected variables to attest Implicit Discrimination. 
-        Consider setting 'max_comb_size' to a small number (e.g. 3 or smaller).
-                ''')
-        
-        
+        self._CheckConfig()
+        self.stats.Clear(keep = ('config', 'load'))
+        if(profile is not None):
+            self.stats.Profile(profile, profiler)
+        return self._Run(return_stats, approximate)
+    
+    def _Run(self, return_stats = False, approximate = None):
+        '''
+        Runs every check on stats already cleared (see Run and Update)
+        '''
         tor = {'Ve': [], 'Vi':[], 'Vd':[]}
-        #Attesting Direct Discrimination (protected variables used as input P)
-        tor['Ve'] = self.CheckExplicitDiscrimination(self.df, 
-                                                     self.config['P'], 
-                                                     self.exceptions['Explicit'])
-        
-        #Attesting Implicit Discrimination (proxy variables in I vs P)
-        tor['Vi'] = self.CheckImplicitDiscrimination(self.df, 
-                                                     self.config['I'], 
-                                                     self.config['P'], 
-                                                     self.exceptions['Implicit'], 
-                                                     self._ImplicitDiscrimination_min_corr,
-                                                     max_comb_size = self._ImplicitDiscrimination_Max_proxy_combo_size)
-            
-        #Attesting Indirect Discrimination (disparate impact)
-        tor['Vd'] = self.CheckIndirectDiscrimination(self.df, 
-                                                     self.config['P'], 
-                                                     self.config['O'], 
-                                                     self.exceptions['Indirect'], 
-                                                     self._IndirectDiscrimination_min_prop,
-                                                     self._IndirectDiscrimination_min_pvalue)
+        if(self._Intersectional):
+            tor['Vx'] = []
+        for violation_type in tor:
+            tor[violation_type] = self.RunCheck(violation_type, approximate)
         
         if(self.verbose):
+            import pprint
             pprint.pprint(tor)
-        return tor
\ No newline at end of file
+        if(return_stats):
+            tor['stats'] = self.stats.ToDict()
+        return tor
+    
+    def Sweep(self, min_corr = None, threshold = None, min_pvalue = None, max_comb_size = None):
+        '''
+        Evaluates a grid of thresholds in one pass, to see how the violations change across them. The expensive
+        statistics are computed only once: the NMI of every combination of up to the largest max_comb_size input columns
+        with every protected column, and the rates and chi2 test of every pair of subpopulations flagged at the largest
+        threshold. Every point of the grid then only filters them, and gets the same violations as Run would with 
+        those values in the config. Proxies are always scored exhaustively, and the exceptions, p-value correction 
+        and NMI backend of the config apply to every point.
+        
+        Input:
+        min_corr : list<float> . values of _ImplicitDiscrimination_min_corr
+        threshold : list<float> . values of _IndirectDiscrimination_Threshold
+        min_pvalue : list<float> . values of _IndirectDiscrimination_MinPValue
+        max_comb_size : list<int> . values of _ImplicitDiscrimination_max_proxy_combo_size (None in the list for no limit).
+            In streaming mode, they cannot exceed the one of the config, up to which combinations are counted
+            (the value of the config is used for any of the four that is None)
+        Returns:
+        dataframe . tidy table, with a row per violation and point of the grid (points without violations have no rows):
+            min_corr, max_comb_size, threshold, min_pvalue : point of the grid
+            type : 'Ve', 'Vi' or 'Vd'
+            P : protected column
+            I, corr : combination of input columns (as a tuple) and its NMI with P, for Vi
+            Pv, O, Ov, ratio : see CheckIndirectDiscrimination, for Vd
+            pvalue, pvalue_adjusted : p-value of the chi2 test, and adjusted p-value when a correction is applied, for Vd
+        '''
+        self._CheckConfig()
+        self.stats.Clear(keep = ('config', 'load'))
+        I, P, O = self.config['I'], self.config['P'], self.config['O']
+        min_corr = [self._ImplicitDiscrimination_min_corr] if min_corr is None else list(min_corr)
+        threshold = [self._IndirectDiscrimination_min_prop] if threshold is None else list(threshold)
+        min_pvalue = [self._IndirectDiscrimination_min_pvalue] if min_pvalue is None else list(min_pvalue)
+        max_comb_size = [self._ImplicitDiscrimination_Max_proxy_combo_size] if max_comb_size is None else list(max_comb_size)
+        #number of input columns combined at every size of the grid
+        sizes = {size: len(I) if size is None or size > len(I) else size for size in max_comb_size}
+        correction = self._IndirectDiscrimination_pvalue_correction
+        implicit_exceptions = self._ExceptionIndex('Implicit', self.exceptions['Implicit'])
+        indirect_exceptions = self._ExceptionIndex('Indirect', self.exceptions['Indirect'])
+        
+        data = self._Data()
+        encoded = self._Encode(data)
+        backend = self._ImplicitDiscrimination_nmi_backend
+        if(not isinstance(encoded, EncodedDataset)):
+            backend = 'native'
+            if(max(sizes.values()) > max(map(len, encoded.combos), default=0)):
+                raise ValueError('In streaming mode, combinations are only counted up to the max_comb_size of the config')
+        with self.stats.Phase('sweep.implicit'):
+            n_jobs = ResolveJobs(self._ImplicitDiscrimination_n_jobs)
+            pool = ProxyPool(encoded, I + P, n_jobs) if n_jobs > 1 and isinstance(encoded, EncodedDataset) and backend == 'native' else None
+            try:
+                combos, nmi_values, _ = self._ScoreCombinations(encoded, NMIKernel(), I, P, implicit_exceptions, 
+                                                                max(sizes.values()), backend, pool)
+            finally:
+                if(pool is not None):
+                    pool.Close()
+            nmi_values = np.array(nmi_values, dtype=float).reshape( (len(combos), len(P)) )
+            #violations of every (min_corr, size) point, in the order of CheckImplicitDiscrimination
+            implicit = {}
+            for corr in min_corr:
+                cases = []
+                for row, col in zip(*np.nonzero(nmi_values > corr)):
+                    case = dict(_ImplicitCase(combos[row], P[col], nmi_values[row, col]), I = tuple(combos[row]))
+                    if( not(self._CoveredByImplicitException(case, implicit_exceptions)) ):
+                        cases.append(case)
+                for size in set(sizes.values()):
+                    implicit[(corr, size)] = [case for case in cases if len(case['I']) <= size]
+        
+        with self.stats.Phase('sweep.indirect'):
+            o_df_values, o_idx, o_valid = self._OutputValues(encoded, O)
+            #pairs flagged at some threshold are those flagged at the largest one
+            widest = max(threshold)
+            pairs_flagged, tables = [], []
+            for p, p_df_values, p_idx, pairs, counts, v1, v2 in self._SubpopulationRates(encoded, P, O, o_idx):
+                for pair in np.flatnonzero((v1*widest > v2).any(axis=1)):
+                    tables.append(counts[sorted(p_idx[pairs[pair]])] * o_valid)
+                    pairs_flagged.append((p, p_df_values[pairs[pair][0]], p_df_values[pairs[pair][1]], v1[pair], v2[pair]))
+            p_values = BatchChi2Contingency(np.array(tables))[1] if len(tables) > 0 else np.zeros(0)
+            #violations of every (threshold, min_pvalue) point, in the order of CheckIndirectDiscrimination
+            indirect = {}
+            for t in threshold:
+                flagged = [v1*t > v2 for _, _, _, v1, v2 in pairs_flagged]
+                family = [k for k in range(len(pairs_flagged)) if flagged[k].any()]
+                #the family of tests corrected for multiple comparisons depends on the threshold
+                adjusted = AdjustPValues(p_values[family], correction) if correction is not None else p_values[family]
+                for minp in min_pvalue:
+                    cases = []
+                    for k, pvalue in zip(family, adjusted):
+                        if(pvalue >= minp):
+                            continue
+                        p, sub1, sub2, v1, v2 = pairs_flagged[k]
+                        for o in np.flatnonzero(flagged[k]):
+                            case = dict(_IndirectCase(p, sub1, sub2, O, o_df_values[o], float(v1[o]), float(v2[o])),
+                                        pvalue = p_values[k],
+                                        pvalue_adjusted = pvalue if correction is not None else None)
+                            if( not(self._CoveredByIndirectException(case, indirect_exceptions)) ):
+                                cases.append(case)
+                    indirect[(t, minp)] = cases
+        
+        explicit = self.CheckExplicitDiscrimination(self._df, P, self.exceptions['Explicit'])
+        records = []
+        for corr, size, t, minp in itertools.product(min_corr, max_comb_size, threshold, min_pvalue):
+            point = {'min_corr': corr, 'max_comb_size': size, 'threshold': t, 'min_pvalue': minp}
+            records += [dict(point, type='Ve', P=p) for p in explicit]
+            records += [dict(point, type='Vi', **case) for case in implicit[(corr, sizes[size])]]
+            records += [dict(point, type='Vd', **case) for case in indirect[(t, minp)]]
+        self.stats.Count('sweep.points', len(min_corr) * len(max_comb_size) * len(threshold) * len(min_pvalue))
+        self.stats.Count('sweep.combinations', len(combos))
+        self.stats.Count('sweep.chi2_tests', len(tables))
+        import pandas as pd
+        return pd.DataFrame.from_records(records, columns=_SWEEP_COLUMNS)
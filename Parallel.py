@@ -0,0 +1,105 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+import numpy as np
+from Encoding import EncodedDataset
+from MutualInformation import NMIKernel
+
+#number of shards given to every worker, so that uneven shards still keep all workers busy
+_SHARDS_PER_JOB = 4
+
+#state of a worker process: the dataset attached from shared memory and its NMI kernel
+_worker = {}
+
+
+def ResolveJobs(n_jobs):
+    '''
+    Number of worker processes for an n_jobs setting (None or 1: serial, -1: one per core)
+    '''
+    if(n_jobs is None):
+        return 1
+    if(n_jobs < 0):
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, int(n_jobs))
+
+
+def _Attach(name, shape, columns, labels):
+    '''
+    Worker initializer: maps the shared block of codes and wraps it as an EncodedDataset
+    '''
+    #workers share the resource tracker of the parent, which owns (and unlinks) the block
+    block = shared_memory.SharedMemory(name=name)
+    codes = np.ndarray(shape, dtype=np.int64, buffer=block.buf)
+    _worker['block'] = block
+    _worker['encoded'] = EncodedDataset.FromCodes({c: codes[k] for k, c in enumerate(columns)}, labels)
+    _worker['kernel'] = NMIKernel()
+
+
+def _ScoreShard(combos, P):
+    encoded, kernel = _worker['encoded'], _worker['kernel']
+    return [[nmi for nmi, _, _ in kernel.EvaluateContingencies(*encoded.Contingencies(combo, P))[2]] for combo in combos]
+
+
+def _EvaluateShard(shard, P):
+    encoded, kernel = _worker['encoded'], _worker['kernel']
+    results = []
+    for combo, alive in shard:
+        codes, cardinality = encoded.Combine(combo)
+        targets = [(p, encoded.Codes(p), encoded.Cardinality(p)) for p, a in zip(P, alive) if a]
+        results.append(kernel.Evaluate(codes, cardinality, targets))
+    return results
+
+
+class ProxyPool():
+    def __init__(self, encoded, columns, n_jobs):
+        '''
+        Process pool that scores combinations of input columns against protected columns.
+        The integer codes of the columns are copied once into a shared memory block that every worker maps,
+        so no dataframe is ever pickled. Results are always returned in the order of the submitted combinations.
+        Use it as a context manager, so that the workers and the shared block are released.
+
+        Input:
+        encoded : EncodedDataset . integer-encoded dataset
+        columns : list<str> . columns the workers need (inputs and protected columns)
+        n_jobs : int . number of worker processes
+        '''
+        self.n_jobs = n_jobs
+        columns = list(dict.fromkeys(columns))
+        shape = (len(columns), encoded.n_rows)
+        self._block = shared_memory.SharedMemory(create=True, size=max(1, 8 * shape[0] * shape[1]))
+        codes = np.ndarray(shape, dtype=np.int64, buffer=self._block.buf)
+        for k, c in enumerate(columns):
+            codes[k] = encoded.Codes(c)
+        labels = {c: encoded.Labels(c) for c in columns}
+        self._executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_Attach,
+                                             initargs=(self._block.name, shape, columns, labels))
+
+    def _Shards(self, items):
+        size = max(1, -(-len(items) // (self.n_jobs * _SHARDS_PER_JOB)))
+        return [items[k:k + size] for k in range(0, len(items), size)]
+
+    def Score(self, combos, P):
+        '''
+        NMI of every combination with every protected column, as list<list<float>> (see NMIKernel.ScoreAgainst)
+        '''
+        shards = self._Shards(list(combos))
+        return [scores for shard in self._executor.map(_ScoreShard, shards, repeat(P)) for scores in shard]
+
+    def Evaluate(self, combos, alive, P):
+        '''
+        NMIKernel.Evaluate of every combination against the protected columns flagged in its alive mask
+        '''
+        shards = self._Shards(list(zip(combos, [list(a) for a in alive])))
+        return [result for shard in self._executor.map(_EvaluateShard, shards, repeat(P)) for result in shard]
+
+    def Close(self):
+        self._executor.shutdown()
+        self._block.close()
+        self._block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
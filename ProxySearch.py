@@ -0,0 +1,246 @@
+import time
+from itertools import combinations
+from math import log
+import numpy as np
+from Encoding import CombineCodes
+
+#margin kept when comparing bounds with the threshold, so that rounding never prunes a real violation
+_BOUND_TOLERANCE = 1e-9
+#rough bookkeeping cost of every combination kept in the lattice frontier, in bytes
+_FRONTIER_ENTRY_BYTES = 256
+#candidates planned and scored at once (times the number of workers); budgets are checked between blocks
+_BLOCK_SIZE = 64
+
+
+def ProxyCombinations(I, max_comb_size):
+    '''
+    Yields every combination of 1 to max_comb_size columns of I, as list<str>: single columns first, then by size,
+    in the order of itertools.combinations. They are generated one at a time, never held all at once.
+    '''
+    for size in range(1, max_comb_size + 1):
+        for combo in combinations(I, size):
+            yield list(combo)
+
+
+def NMIUpperBound(mi, h_combo, h_target, h_max):
+    '''
+    Upper bound of the NMI between a target column P and any superset S' of a combination of columns S.
+    Adding columns to S can only increase the information it carries, so H(S) <= H(S') <= h_max and
+    MI(S';P) <= min(H(P), MI(S;P) + H(S') - H(S)). The bound is the maximum of
+    2*MI(S';P) / (H(S') + H(P)) under those constraints.
+
+    Input:
+    mi : float . MI(S;P)
+    h_combo : float . H(S)
+    h_target : float . H(P)
+    h_max : float . largest entropy any superset of S can reach
+    Returns:
+    float . upper bound of NMI(S';P)
+    '''
+    if(h_target <= 0):
+        #a constant target can still be perfectly matched by a constant combination
+        return 1.0
+    #entropy at which the superset would hold all the information of P
+    peak = h_combo + h_target - mi
+    if(h_max >= peak):
+        return 2 * h_target / (peak + h_target)
+    return 2 * (mi + h_max - h_combo) / (h_max + h_target)
+
+
+def LatticeSearch(encoded, kernel, I, P, proxy_corr_threshold, max_comb_size, time_budget = None, memory_budget = None, pool = None):
+    '''
+    Level-wise (Apriori-style) search of proxy combinations of input columns. Combinations of size k are
+    only built by joining combinations of size k-1 that survived, and are pruned with two sound rules:
+        unique_key : once the joint key of a combination is unique per row, every superset has exactly the
+            same NMI with every protected column, so their scores are copied instead of computed (and
+            dropped altogether if none of them crosses the threshold).
+        nmi_upper_bound : a (combination, protected column) pair is dropped once NMIUpperBound shows that
+            no superset can cross the threshold. A combination is only scored against the protected columns
+            that are still alive in all its subsets, and skipped if there are none.
+    Both rules are exact: the search reports the same violations as the exhaustive enumeration. Only the
+    optional budgets can make it inexact, by stopping the search before the lattice is exhausted.
+
+    Input:
+    encoded : EncodedDataset . integer-encoded dataset
+    kernel : NMIKernel . NMI scorer
+    I : list<str> . input attributes as column names
+    P : list<str> . protected attributes as column names
+    proxy_corr_threshold : float in [0,1] . min threshold to consider proxy correlation
+    max_comb_size : int . largest combination of inputs to consider
+    time_budget : float . seconds after which the search stops (None for no limit)
+    memory_budget : int . bytes of combination keys and frontier bookkeeping kept between levels (None for no limit).
+        Keys of previous levels are cached while they fit, to build the next level incrementally; past the budget
+        they are rebuilt from single columns, and the search stops if the frontier alone does not fit.
+    pool : Parallel.ProxyPool . if given, the candidates of every level are scored by its workers (None for serial)
+    Returns:
+    rows : list<(list<str>, list<float>)> . every combination kept, in the same order as the exhaustive search,
+        with its NMI with every protected column (nan where the pair was pruned)
+    summary : dict . search report, with
+        evaluated : number of combinations scored
+        skipped : number of joined combinations discarded without scoring
+        pruned : number of times every pruning rule applied (combinations for unique_key,
+            (combination, protected column) pairs for nmi_upper_bound)
+        exact : whether the search is guaranteed to report the same violations as the exhaustive one
+        truncated_by : None, 'time_budget' or 'memory_budget'
+        levels_completed : largest combination size fully explored
+    '''
+    start = time.time()
+    n_rows = encoded.n_rows
+    log_n = log(n_rows) if n_rows > 1 else 0.0
+    targets = [(p, encoded.Codes(p), encoded.Cardinality(p)) for p in P]
+    summary = {'search': 'lattice',
+               'exact': True,
+               'evaluated': 0,
+               'skipped': 0,
+               'pruned': {'unique_key': 0, 'nmi_upper_bound': 0},
+               'truncated_by': None,
+               'levels_completed': 0}
+
+    def _Truncate(rule):
+        summary['exact'] = False
+        summary['truncated_by'] = rule
+
+    def _OverTime():
+        return time_budget is not None and time.time() - start > time_budget
+
+    def _Evaluate(candidate, alive):
+        #build the combination key, incrementally from the cached key of its prefix when possible
+        parent = frontier.get(candidate[:-1]) if len(candidate) > 1 else None
+        if(parent is not None and parent['codes'] is not None):
+            last = I[candidate[-1]]
+            codes, cardinality = CombineCodes([parent['codes'], encoded.Codes(last)],
+                                              [parent['cardinality'], encoded.Cardinality(last)])
+        else:
+            codes, cardinality = encoded.Combine([I[i] for i in candidate])
+        alive_targets = [t for t, a in zip(targets, alive) if a]
+        return kernel.Evaluate(codes, cardinality, alive_targets) + (codes, cardinality)
+
+    block_size = _BLOCK_SIZE if pool is None else _BLOCK_SIZE * pool.n_jobs
+    rows = []
+    single_entropies = []
+    cached_bytes = 0
+    #frontier : index tuple -> {'unique', 'scores', 'alive', 'h', 'codes', 'cardinality'}
+    frontier = {}
+    for level in range(1, max_comb_size + 1):
+        if(level == 1):
+            candidates = [((i,), None) for i in range(len(I))]
+        else:
+            candidates = _JoinFrontier(frontier, level)
+        extensions = max_comb_size - level
+        h_extension = sum(sorted(single_entropies, reverse=True)[:extensions])
+        next_frontier = {}
+        next_bytes = 0
+        for block_start in range(0, len(candidates), block_size):
+            if(_OverTime()):
+                _Truncate('time_budget')
+                break
+            #decide what to do with every candidate of the block, then score the ones that need it
+            plan = []
+            for candidate, subsets in candidates[block_start:block_start + block_size]:
+                if(subsets is None):
+                    plan.append((candidate, 'evaluate', np.ones(len(P), dtype=bool)))
+                    continue
+                if(any(s is None for s in subsets)):
+                    summary['skipped'] += 1
+                    continue
+                unique_subsets = [s for s in subsets if s['unique']]
+                if(len(unique_subsets) > 0):
+                    #superset of a combination whose key is unique per row: same scores for every P
+                    summary['pruned']['unique_key'] += 1
+                    plan.append((candidate, 'copy', unique_subsets[0]))
+                    continue
+                alive = np.logical_and.reduce([s['alive'] for s in subsets])
+                if(not alive.any()):
+                    summary['skipped'] += 1
+                    continue
+                plan.append((candidate, 'evaluate', alive))
+            
+            to_evaluate = [(candidate, alive) for candidate, action, alive in plan if action == 'evaluate']
+            if(pool is None):
+                evaluations = [_Evaluate(candidate, alive) for candidate, alive in to_evaluate]
+            else:
+                evaluations = [result + (None, None) for result in 
+                               pool.Evaluate([[I[i] for i in c] for c, _ in to_evaluate], [a for _, a in to_evaluate], P)]
+            evaluations = iter(evaluations)
+            
+            for candidate, action, payload in plan:
+                combo = [I[i] for i in candidate]
+                if(action == 'copy'):
+                    rows.append((combo, list(payload['scores'])))
+                    if(extensions > 0):
+                        next_frontier[candidate] = payload
+                    continue
+                alive = payload
+                h_combo, n_distinct, results, codes, cardinality = next(evaluations)
+                summary['evaluated'] += 1
+                if(level == 1):
+                    single_entropies.append(h_combo)
+
+                scores = np.full(len(P), np.nan)
+                scores[alive] = [nmi for nmi, _, _ in results]
+                for j, p in enumerate(P):
+                    #a column is not a proxy of itself
+                    if(combo == [p]):
+                        scores[j] = 0
+                rows.append((combo, list(scores)))
+                if(extensions == 0):
+                    continue
+
+                if(n_distinct == n_rows):
+                    if(not (scores > proxy_corr_threshold).any()):
+                        summary['pruned']['unique_key'] += 1
+                        continue
+                    state = {'unique': True, 'scores': scores, 'alive': alive}
+                else:
+                    #h_extension is only known once every single column has been scored
+                    state = {'unique': False, 'scores': scores, 'alive': alive, 'mi': dict(zip(np.flatnonzero(alive), results)), 'h': h_combo}
+                state['codes'], state['cardinality'] = None, cardinality
+                if(codes is not None and (memory_budget is None or cached_bytes + next_bytes + codes.nbytes <= memory_budget)):
+                    state['codes'] = codes
+                    next_bytes += codes.nbytes
+                next_frontier[candidate] = state
+
+        if(level == 1):
+            #bounds of single columns need the entropies of every other single column
+            h_extension = sum(sorted(single_entropies, reverse=True)[:extensions])
+        for state in next_frontier.values():
+            if(not state['unique'] and 'mi' in state):
+                h_max = min(log_n, state['h'] + h_extension)
+                for j, (_, mi, h_target) in state.pop('mi').items():
+                    bound = NMIUpperBound(mi, state['h'], h_target, h_max)
+                    if(bound + _BOUND_TOLERANCE <= proxy_corr_threshold):
+                        summary['pruned']['nmi_upper_bound'] += 1
+                        state['alive'][j] = False
+        next_frontier = {c: s for c, s in next_frontier.items() if s['unique'] or s['alive'].any()}
+        if(summary['truncated_by'] is not None):
+            break
+        summary['levels_completed'] = level
+
+        frontier = next_frontier
+        cached_bytes = next_bytes
+        if(memory_budget is not None and len(frontier) * _FRONTIER_ENTRY_BYTES > memory_budget):
+            if(level < max_comb_size):
+                _Truncate('memory_budget')
+            break
+        if(len(frontier) == 0):
+            break
+    return rows, summary
+
+
+def _JoinFrontier(frontier, level):
+    '''
+    Apriori join: builds every combination of size level whose two (level-1)-prefixes are in the frontier,
+    in lexicographic order, together with the frontier state of all its (level-1)-subsets (None if missing).
+    '''
+    by_prefix = {}
+    for key in sorted(frontier):
+        by_prefix.setdefault(key[:-1], []).append(key[-1])
+    candidates = []
+    for prefix in sorted(by_prefix):
+        lasts = by_prefix[prefix]
+        for a in range(len(lasts)):
+            for b in range(a + 1, len(lasts)):
+                candidate = prefix + (lasts[a], lasts[b])
+                subsets = [frontier.get(candidate[:k] + candidate[k+1:]) for k in range(level)]
+                candidates.append((candidate, subsets))
+    return candidates
@@ -1,42 +1,24 @@
 #Experiments
-import NormativeApproach as daddna
+import Batch
 import pprint
 
 
 #
-# adult dataset quantile
+# The bundled datasets (adult, german credit and COMPAS recidivism) are listed in DatasetsClean/manifest.json.
+# They are audited over a shared pool of worker processes, and the results of every dataset, with timings,
+# are written as json in the results/ folder.
 #
-print('''
---adult dataset--
-The dataset was collected from https://archive.ics.uci.edu/ml/datasets/adult and discretised using quantile discretisation.
-''')
-na = daddna.NormativeApproachDiscrimination('DatasetsClean/adult_quantile/adult_quantile.csv', 'DatasetsClean/adult_quantile/config_adult_quantile.py', verbose= False)
-violations = na.Run()
-pprint.pprint(violations)
-
-
-
-#
-# german credit quantile
-#
-print('''
---german credit--
-The dataset was collected from https://archive.ics.uci.edu/ml/datasets/statlog+(german+credit+data) and discretised using quantile discretisation.
-''')
-na = daddna.NormativeApproachDiscrimination('DatasetsClean/german_credit_quantile/german_credit_quantile.csv', 'DatasetsClean/german_credit_quantile/config_german_credit_quantile.py', verbose= False)
-violations = na.Run()
-pprint.pprint(violations)
-
-
-
-#
-# COMPAS recidivism
-#
-print('''
---compas recidivism small--
-The dataset was collected from https://github.com/propublica/compas-analysis/.
-''')
-na = daddna.NormativeApproachDiscrimination('DatasetsClean/compas_recidivism/compas-scores-pretrial-reduced.csv',
-'DatasetsClean/compas_recidivism/config_compas-recidivism-parsed.py', verbose= False)
-violations = na.Run()
-pprint.pprint(violations)
+if __name__ == '__main__':
+    entries = Batch.ReadManifest('DatasetsClean/manifest.json')
+    results = Batch.RunBatch(entries, output_folder='results')
+    for entry in entries:
+        result = results[entry['name']]
+        print('''
+--{}--
+{}
+'''.format(entry['name'], entry.get('description', '')))
+        if(result['status'] == 'ok'):
+            pprint.pprint(result['violations'])
+        else:
+            for violation_type, error in result['errors'].items():
+                print('[!] {} check failed: {}'.format(violation_type, error.strip().splitlines()[-1]))
@@ -0,0 +1,141 @@
+#Approximate audits: stratified row samples, and confidence intervals of the scores estimated on them
+import numpy as np
+from Encoding import EncodedDataset, Compact
+from MutualInformation import NormalizedMutualInformation
+
+#default number of sampled rows and confidence level of the intervals
+DEFAULT_SAMPLE_ROWS = 100000
+DEFAULT_CONFIDENCE = 0.99
+#candidate rows drawn per sampled row, see StratifiedRows
+_OVERSAMPLING = 4
+#strata beyond this many are compacted to the joint values actually present
+_MAX_STRATA = 1 << 16
+#estimates resting on fewer sampled rows than this per non-empty cell (or per subpopulation) are not trusted
+_MIN_ROWS_PER_CELL = 5
+
+
+def Quantile(confidence):
+    '''
+    Returns the normal quantile z of a two-sided interval at the given confidence level (e.g. 2.576 for 0.99)
+    '''
+    from scipy import stats
+    return float(stats.norm.ppf(1 - (1 - confidence) / 2))
+
+
+def StratifiedRows(strata, cardinality, n_sample, rng):
+    '''
+    Row indices of a stratified sample with proportional allocation: every stratum gets its share of n_sample
+    (rounded by largest remainders), drawn without replacement.
+    Candidate rows are drawn uniformly at random, in random order, and every stratum keeps the first ones that
+    fall in it, which are a simple random sample of the stratum. Only the strata short of candidates are searched
+    in full, so the whole dataset is read once (to count the strata) whatever the size of the sample.
+
+    Input:
+    strata : np.array<int64> . stratum of every row, in [0, cardinality)
+    cardinality : int . number of strata
+    n_sample : int . number of rows sampled (smaller than the number of rows)
+    rng : np.random.Generator
+    Returns:
+    np.array<int64> . sorted indices of the sampled rows
+    '''
+    n = len(strata)
+    counts = np.bincount(strata, minlength=cardinality)
+    quota = counts * (n_sample / n)
+    take = np.floor(quota).astype(np.int64)
+    take[np.argsort(take - quota, kind='stable')[:n_sample - int(take.sum())]] += 1
+
+    candidates = rng.choice(n, min(n, _OVERSAMPLING * n_sample), replace=False)
+    candidate_strata = strata[candidates]
+    order = np.argsort(candidate_strata, kind='stable')
+    found = np.bincount(candidate_strata, minlength=cardinality)
+    starts = np.cumsum(found) - found
+    rank = np.arange(len(order)) - starts[candidate_strata[order]]
+    rows = [candidates[order[rank < take[candidate_strata[order]]]]]
+    for s in np.flatnonzero(found < take):
+        rows.append(rng.choice(np.flatnonzero(strata == s), take[s], replace=False))
+    return np.sort(np.concatenate(rows))
+
+
+def StratifiedSample(encoded, strata_columns, columns, n_sample, seed = 0):
+    '''
+    Draws a stratified sample of the rows of an encoded dataset, stratified by the joint values of strata_columns
+    (see StratifiedRows). The sample keeps the codes and labels of the dataset, so that its count tables line up
+    with the ones of the whole dataset.
+
+    Input:
+    encoded : EncodedDataset . whole dataset
+    strata_columns : list<str> . columns whose joint values define the strata (e.g. the protected columns)
+    columns : list<str> . columns kept in the sample
+    n_sample : int . number of rows sampled
+    seed : int . seed of the random generator, the same seed always draws the same rows
+    Returns:
+    EncodedDataset . the sampled rows, or encoded itself if n_sample is not smaller than its number of rows
+    '''
+    if(n_sample >= encoded.n_rows):
+        return encoded
+    strata, cardinality = encoded.Combine(strata_columns)
+    if(cardinality > _MAX_STRATA):
+        strata, cardinality = Compact(strata)
+    rows = StratifiedRows(strata, cardinality, n_sample, np.random.default_rng(seed))
+    columns = list(dict.fromkeys(columns))
+    return EncodedDataset.FromCodes({c: encoded.Codes(c)[rows] for c in columns}, {c: encoded.Labels(c) for c in columns})
+
+
+def NMIInterval(contingency, z):
+    '''
+    Estimates the NMI of a whole dataset from the contingency table of a sample of its rows, with a confidence interval.
+    The estimate corrects the entropies for the bias of small samples (Miller-Madow), and the interval follows
+    from the asymptotic variance of the NMI (delta method), widened by the variance the mutual information has
+    when both columns are independent. Tables with too few rows per non-empty cell (or a single value in a column)
+    get the plain NMI of the sample and the interval [0, 1].
+
+    Input:
+    contingency : np.array of shape (n, m) . joint counts in the sample
+    z : float . normal quantile of the confidence level (see Quantile)
+    Returns:
+    (estimate, low, high) : float . estimated NMI and bounds of its interval, in [0, 1]
+    '''
+    table = np.asarray(contingency, dtype=np.float64)
+    n = table.sum()
+    pi, pj = table.sum(axis=1), table.sum(axis=0)
+    pi, pj = pi[pi > 0] / n, pj[pj > 0] / n
+    nzx, nzy = np.nonzero(table)
+    if(len(pi) <= 1 or len(pj) <= 1 or len(nzx) * _MIN_ROWS_PER_CELL > n):
+        return NormalizedMutualInformation(contingency), 0.0, 1.0
+    p_ij = table[nzx, nzy] / n
+    p_i = table.sum(axis=1)[nzx] / n
+    p_j = table.sum(axis=0)[nzy] / n
+    h_x, h_y, h_xy = -np.sum(pi * np.log(pi)), -np.sum(pj * np.log(pj)), -np.sum(p_ij * np.log(p_ij))
+    s, dof = h_x + h_y, (len(pi) - 1) * (len(pj) - 1)
+    #influence of every cell on NMI = 2 - 2 * H(x,y) / (H(x) + H(y))
+    influence = -2 * ((-np.log(p_ij) - h_xy) * s - h_xy * ((-np.log(p_i) - h_x) + (-np.log(p_j) - h_y))) / s ** 2
+    variance = np.sum(p_ij * influence ** 2) / n + 2 * dof / (s * n) ** 2
+    corrected_mi = s - h_xy - (len(p_ij) - len(pi) - len(pj) + 1) / (2 * n)
+    corrected_s = s + (len(pi) + len(pj) - 2) / (2 * n)
+    estimate = float(np.clip(2 * corrected_mi / corrected_s, 0.0, 1.0))
+    margin = z * float(np.sqrt(variance))
+    return estimate, max(0.0, estimate - margin), min(1.0, estimate + margin)
+
+
+def RatioInterval(x1, n1, x2, n2, z):
+    '''
+    Confidence intervals of ratios of two rates x2/n2 : x1/n1 estimated on a sample (Katz log interval).
+    Half a row is added to the counts of the ratios where one of them is zero.
+    Ratios of subpopulations with too few sampled rows get the interval [0, inf].
+
+    Input:
+    x1, n1, x2, n2 : np.array . rows with the output and rows of the subpopulation, in the sample, for both subpopulations
+    z : float . normal quantile of the confidence level (see Quantile)
+    Returns:
+    (low, high) : np.array<float> . bounds of the interval of every ratio
+    '''
+    x1, n1, x2, n2 = [np.asarray(v, dtype=np.float64) for v in np.broadcast_arrays(x1, n1, x2, n2)]
+    zero = (x1 == 0) | (x2 == 0)
+    x1, x2 = np.where(zero, x1 + 0.5, x1), np.where(zero, x2 + 0.5, x2)
+    n1, n2 = np.where(zero, n1 + 0.5, n1), np.where(zero, n2 + 0.5, n2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_ratio = np.log((x2 / n2) / (x1 / n1))
+        margin = z * np.sqrt(1 / x1 - 1 / n1 + 1 / x2 - 1 / n2)
+        low, high = np.exp(log_ratio - margin), np.exp(log_ratio + margin)
+    unreliable = (n1 < _MIN_ROWS_PER_CELL) | (n2 < _MIN_ROWS_PER_CELL)
+    return np.where(unreliable, 0.0, low), np.where(unreliable, np.inf, high)
@@ -0,0 +1,288 @@
+#Audit service: keeps datasets loaded and encoded between requests, and serves the checks over a local HTTP/JSON API
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import NormativeApproach as daddna
+from Batch import ToJSON
+
+#memory the warm audits may hold, in bytes, before the least recently used ones are dropped
+DEFAULT_MAX_BYTES = 2 << 30
+DEFAULT_PORT = 8765
+#results kept for every warm audit, so that a repeated request is answered without running its check again
+_MAX_RESULTS = 64
+#methods of NormativeApproachDiscrimination served, each one at /<method>
+METHODS = ('Run', 'RunCheck', 'Sweep',
+           'CheckExplicitDiscrimination', 'CheckImplicitDiscrimination', 'CheckIndirectDiscrimination',
+           'CheckIntersectionalDiscrimination')
+
+
+def _FileSignature(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def CheckArguments(na, method):
+    '''
+    Returns the keyword arguments of a Check* method as set up in the config of an audit (see _RunCheck),
+    which the arguments of a request override
+    '''
+    if(method == 'CheckExplicitDiscrimination'):
+        return {'P': na.config['P'], 'E': na.exceptions['Explicit']}
+    if(method == 'CheckImplicitDiscrimination'):
+        return {'I': na.config['I'],
+                'P': na.config['P'],
+                'E': na.exceptions['Implicit'],
+                'proxy_corr_threshold': na._ImplicitDiscrimination_min_corr,
+                'max_comb_size': na._ImplicitDiscrimination_Max_proxy_combo_size,
+                'search': na._ImplicitDiscrimination_search,
+                'time_budget': na._ImplicitDiscrimination_time_budget,
+                'memory_budget': na._ImplicitDiscrimination_memory_budget,
+                'n_jobs': na._ImplicitDiscrimination_n_jobs,
+                'top_k': na._ImplicitDiscrimination_top_k}
+    if(method == 'CheckIntersectionalDiscrimination'):
+        return {'P': na.config['P'],
+                'O': na.config['O'],
+                'E': na.exceptions.get('Intersectional', []),
+                'ID_proportion': na._IndirectDiscrimination_min_prop,
+                'ID_minpval': na._IndirectDiscrimination_min_pvalue,
+                'pvalue_correction': na._IndirectDiscrimination_pvalue_correction,
+                'max_comb_size': na._Intersectional_max_comb_size,
+                'min_support': na._Intersectional_min_support}
+    return {'P': na.config['P'],
+            'O': na.config['O'],
+            'E': na.exceptions['Indirect'],
+            'ID_proportion': na._IndirectDiscrimination_min_prop,
+            'ID_minpval': na._IndirectDiscrimination_min_pvalue,
+            'pvalue_correction': na._IndirectDiscrimination_pvalue_correction}
+
+
+def Dispatch(na, method, args):
+    '''
+    Calls a method of an audit with the arguments of a request, and returns its result as plain json values
+    '''
+    if(method not in METHODS):
+        raise ValueError('Unknown method {}, expected one of {}'.format(method, list(METHODS)))
+    if(method == 'Run'):
+        return ToJSON(na.Run(**args))
+    if(method == 'RunCheck'):
+        return ToJSON(na.RunCheck(**args))
+    if(method == 'Sweep'):
+        #cells of the table that do not apply to the type of a violation are left out
+        return ToJSON([{k: v for k, v in row.items() if not (isinstance(v, float) and math.isnan(v))}
+                       for row in na.Sweep(**args).to_dict(orient='records')])
+    kwargs = CheckArguments(na, method)
+    unknown = set(args) - set(kwargs)
+    if(len(unknown) > 0):
+        raise ValueError('Unknown arguments {} for {}'.format(sorted(unknown), method))
+    kwargs.update(args)
+    na._CheckConfig()
+    data = na._df if method == 'CheckExplicitDiscrimination' else na._Data()
+    return ToJSON(getattr(na, method)(data, **kwargs))
+
+
+class _WarmAudit():
+    def __init__(self):
+        #the audit is only used by one request at a time
+        self.lock = threading.Lock()
+        self.audit = None
+        #size and modification time of the csv and config the audit was loaded from
+        self.signature = None
+        self.results = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.last_used = time.time()
+
+
+class AuditStore():
+    def __init__(self, max_bytes = DEFAULT_MAX_BYTES, root = '.'):
+        '''
+        Warm audits (NormativeApproachDiscrimination objects) of the datasets requested so far: their dataframes, encoded
+        columns, count tables and samples stay in memory between requests, together with the results of the last
+        requests. An audit is reloaded whenever its csv or config file changes, and the least recently used audits
+        are dropped when they hold more than max_bytes (see NormativeApproachDiscrimination.Bytes).
+        Config files are python files run by the service: only datasets and configs inside root are served.
+
+        Input:
+        max_bytes : int . memory the warm audits may hold
+        root : <str> . folder relative csv and config paths are taken from, and that they must be in
+        '''
+        self.max_bytes = max_bytes
+        self.root = os.path.realpath(root)
+        self._audits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _Path(self, path):
+        path = os.path.realpath(os.path.join(self.root, path))
+        if(os.path.commonpath([path, self.root]) != self.root):
+            raise ValueError('{} is outside the folder served, {}'.format(path, self.root))
+        return path
+
+    def Call(self, request, method, args = None):
+        '''
+        Runs a method of the audit of a dataset, loading the dataset first if it is not warm (or changed on disk).
+
+        Input:
+        request : {'csv': <str>, 'config': <str>, 'streaming': <bool> (optional), 'chunksize': <int> (optional),
+                   'cache_dir': <str> (optional)} . dataset and options of its NormativeApproachDiscrimination
+        method : <str> . one of METHODS
+        args : dict . keyword arguments of the method (for Check* methods, they override the values of the config,
+            see CheckArguments)
+        Returns:
+        {'result': json value returned by the method, 'seconds': <float>, 'load_seconds': <float> (0 if the audit was warm),
+         'cached': <bool> (the result of an identical request was reused)}
+        '''
+        start = time.time()
+        args = dict(args or {})
+        csv, config = self._Path(request['csv']), self._Path(request['config'])
+        streaming = bool(request.get('streaming', False))
+        cache_dir = self._Path(request['cache_dir']) if request.get('cache_dir') is not None else None
+        key = (csv, config, streaming, request.get('chunksize', 100000), cache_dir)
+        signature = (_FileSignature(csv), _FileSignature(config))
+        with self._lock:
+            warm = self._audits.setdefault(key, _WarmAudit())
+            self._audits.move_to_end(key)
+        response = {'result': None, 'seconds': 0.0, 'load_seconds': 0.0, 'cached': False}
+        with warm.lock:
+            if(warm.audit is None or warm.signature != signature):
+                load_start = time.time()
+                warm.audit = None
+                warm.results.clear()
+                try:
+                    warm.audit = daddna.NormativeApproachDiscrimination(csv, config, streaming = streaming, chunksize = key[3],
+                                                                        cache_dir = cache_dir)
+                except Exception:
+                    #datasets that cannot be loaded are not kept
+                    with self._lock:
+                        if(self._audits.get(key) is warm):
+                            del self._audits[key]
+                    raise
+                warm.signature = signature
+                response['load_seconds'] = time.time() - load_start
+            #stats and profiles describe a single run, so those requests are always run
+            memo = json.dumps([method, args], sort_keys=True, default=str) \
+                if not (args.get('return_stats') or args.get('profile')) else None
+            if(memo is not None and memo in warm.results):
+                warm.results.move_to_end(memo)
+                response['result'], response['cached'] = warm.results[memo], True
+            else:
+                response['result'] = Dispatch(warm.audit, method, args)
+                if(memo is not None):
+                    warm.results[memo] = response['result']
+                    while(len(warm.results) > _MAX_RESULTS):
+                        warm.results.popitem(last=False)
+            warm.hits += 1
+            warm.last_used = time.time()
+            warm.bytes = warm.audit.Bytes()
+        self.Evict(keep = key)
+        response['seconds'] = time.time() - start
+        return response
+
+    def Bytes(self):
+        return sum(warm.bytes for warm in self._audits.values())
+
+    def Evict(self, keep = None):
+        '''
+        Drops the least recently used audits until the warm ones hold at most max_bytes. The audit keep is never dropped.
+        '''
+        with self._lock:
+            total = self.Bytes()
+            for key in list(self._audits):
+                if(total <= self.max_bytes):
+                    break
+                if(key == keep):
+                    continue
+                total -= self._audits.pop(key).bytes
+
+    def Clear(self):
+        with self._lock:
+            self._audits.clear()
+
+    def Status(self):
+        '''
+        Returns the warm audits, least recently used first, and the memory they hold
+        '''
+        with self._lock:
+            audits = [{'csv': key[0], 'config': key[1], 'streaming': key[2], 'cache_dir': key[4], 'loaded': warm.audit is not None,
+                       'bytes': warm.bytes, 'hits': warm.hits, 'results': len(warm.results), 'last_used': warm.last_used}
+                      for key, warm in self._audits.items()]
+        return {'audits': audits, 'bytes': sum(a['bytes'] for a in audits), 'max_bytes': self.max_bytes}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    store = None
+    verbose = False
+
+    def _Reply(self, code, value):
+        body = json.dumps(value).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if(urlparse(self.path).path.strip('/') == 'status'):
+            self._Reply(200, self.store.Status())
+        else:
+            self._Reply(404, {'error': 'Unknown path {}, expected /status or POST /<method>'.format(self.path)})
+
+    def do_POST(self):
+        path = urlparse(self.path).path.strip('/')
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8')) if length > 0 else {}
+            if(path == 'clear'):
+                self.store.Clear()
+                self._Reply(200, self.store.Status())
+            elif(path in METHODS):
+                self._Reply(200, self.store.Call(request, path, request.get('args')))
+            else:
+                self._Reply(404, {'error': 'Unknown method {}, expected one of {}'.format(path, list(METHODS))})
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            #malformed requests, missing files, configs that do not match their dataset, ...
+            self._Reply(400, {'error': '{}: {}'.format(type(e).__name__, e)})
+        except Exception as e:
+            self._Reply(500, {'error': '{}: {}'.format(type(e).__name__, e)})
+
+    def log_message(self, format, *args):
+        if(self.verbose):
+            super().log_message(format, *args)
+
+
+def MakeServer(host = '127.0.0.1', port = DEFAULT_PORT, store = None, verbose = False):
+    '''
+    Returns the HTTP server of an AuditStore (call serve_forever on it). Every request is served on its own thread,
+    so that requests on different datasets run side by side.
+
+    Endpoints:
+    POST /<method> (see METHODS) . json body {'csv', 'config', 'streaming', 'chunksize', 'cache_dir', 'args'}, see AuditStore.Call
+        e.g. {"csv": "DatasetsClean/compas/compas.csv", "config": "DatasetsClean/compas/config_compas.py",
+              "args": {"proxy_corr_threshold": 0.3}} to /CheckImplicitDiscrimination
+    GET /status . warm audits and memory held
+    POST /clear . drops every warm audit
+    Errors are answered with a json {'error'}, status 400 for bad requests and 500 for failures of the checks.
+    '''
+    handler = type('Handler', (_Handler,), {'store': store if store is not None else AuditStore(), 'verbose': verbose})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves the checks over a local HTTP/JSON API, keeping datasets warm between requests')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on (default: 127.0.0.1, local requests only)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-bytes', type=float, default=DEFAULT_MAX_BYTES, help='memory the warm datasets may hold')
+    parser.add_argument('--root', default='.', help='folder datasets and configs are served from (default: current folder)')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    server = MakeServer(args.host, args.port, AuditStore(int(args.max_bytes), args.root), args.verbose)
+    print('Serving audits of {} on http://{}:{}'.format(os.path.realpath(args.root), args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,391 @@
+import os
+import pickle
+from itertools import combinations
+from math import prod
+import numpy as np
+from Encoding import CombineCodes, Compact, _MAX_KEY
+from Loading import ReadColumns
+
+#code given to missing values while streaming (the vocabulary maps labels to codes, and nan != nan)
+_MISSING = object()
+#bytes read at once while looking for the end of the last complete line of a csv
+_TAIL_BLOCK = 1 << 16
+
+
+def CountRows(codes_list, cardinalities, weights = None):
+    '''
+    Counts the distinct rows of several integer-coded columns.
+
+    Input:
+    codes_list : list<np.array<int64>> . codes of every column
+    cardinalities : list<int> . cardinality of every column
+    weights : np.array<int64> . count of every row (None for one)
+    Returns:
+    keys : np.array<int64> of shape (distinct rows, columns) . distinct rows, in lexicographic order
+    counts : np.array<int64> . count of every distinct row
+    '''
+    key, cardinality = CombineCodes(codes_list, cardinalities)
+    uniques, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(uniques)).astype(np.int64)
+    keys = np.stack([codes[first] for codes in codes_list], axis=1) if len(uniques) > 0 \
+        else np.empty((0, len(codes_list)), dtype=np.int64)
+    return keys, counts
+
+
+class CountTable():
+    def __init__(self, columns):
+        '''
+        Mergeable table with the number of rows of every distinct combination of values of a group of columns.
+        Values are stored as the codes of a shared vocabulary (see StreamedCounts), and rows in lexicographic order.
+        The table keeps the mixed-radix key of its rows as a sorted index, so that adding rows only sorts the rows
+        added and looks them up by binary search, instead of sorting the whole table again. The index is rebuilt
+        when a column gets new values (its radix changes).
+
+        Input:
+        columns : list<str> . names of the columns of the group
+        '''
+        self.columns = list(columns)
+        self.keys = np.empty((0, len(self.columns)), dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        #sorted key of every row, for the cardinalities in _radix (None until rows are added)
+        self._index = None
+        self._radix = None
+
+    def _Key(self, keys, cardinalities):
+        '''
+        Mixed-radix key of some rows, in their lexicographic order, or None if it would overflow int64
+        '''
+        if(prod(cardinalities) > _MAX_KEY):
+            return None
+        return CombineCodes([keys[:, k] for k in range(keys.shape[1])], cardinalities)[0]
+
+    def Add(self, keys, counts, cardinalities):
+        '''
+        Adds the counts of some rows (keys may repeat rows already in the table).
+
+        Input:
+        keys : np.array<int64> of shape (n, columns) . distinct rows to add
+        counts : np.array<int64> . count of every row
+        cardinalities : list<int> . current cardinality of every column
+        '''
+        cardinalities = [int(n) for n in cardinalities]
+        if(self._radix != cardinalities):
+            #rows are kept in lexicographic order, so their keys are sorted for any radix
+            self._index, self._radix = self._Key(self.keys, cardinalities), cardinalities
+        added = self._Key(keys, cardinalities)
+        if(added is None):
+            keys = np.concatenate([self.keys, keys])
+            weights = np.concatenate([self.counts, counts])
+            self.keys, self.counts = CountRows([keys[:, k] for k in range(keys.shape[1])], cardinalities, weights)
+            return
+        if((added[1:] < added[:-1]).any()):
+            order = np.argsort(added, kind='stable')
+            added, keys, counts = added[order], keys[order], counts[order]
+        positions = np.searchsorted(self._index, added)
+        found = positions < len(self._index)
+        found[found] = self._index[positions[found]] == added[found]
+        self.counts[positions[found]] += counts[found]
+        new = np.flatnonzero(~found)
+        if(len(new) > 0):
+            #merge the new rows into the sorted table, in a single pass over it
+            n_rows = len(self.counts) + len(new)
+            inserted = np.zeros(n_rows, dtype=bool)
+            inserted[positions[new] + np.arange(len(new))] = True
+            merged_index = np.empty(n_rows, dtype=np.int64)
+            merged_keys = np.empty((n_rows, len(self.columns)), dtype=np.int64)
+            merged_counts = np.empty(n_rows, dtype=np.int64)
+            for merged, old, rows in ((merged_index, self._index, added), (merged_keys, self.keys, keys), (merged_counts, self.counts, counts)):
+                merged[inserted] = rows[new]
+                merged[~inserted] = old
+            self._index, self.keys, self.counts = merged_index, merged_keys, merged_counts
+
+    def Merge(self, other, cardinalities):
+        '''
+        Adds the counts of another table over the same columns and vocabulary
+        '''
+        self.Add(other.keys, other.counts, cardinalities)
+
+    def Bytes(self):
+        return self.keys.nbytes + self.counts.nbytes + (self._index.nbytes if self._index is not None else 0)
+
+    def __getstate__(self):
+        #the index is rebuilt the next time rows are added
+        state = dict(self.__dict__)
+        state['_index'], state['_radix'] = None, None
+        return state
+
+
+class StreamedCounts():
+    def __init__(self, I, P, O, max_comb_size = None):
+        '''
+        Count tables needed to attest discrimination, accumulated chunk by chunk so that the dataset never
+        has to fit in memory:
+            - one table per (combination of inputs, protected column), for the NMI of implicit discrimination
+            - one table per (protected column, output column), for the disparate impact of indirect discrimination
+        It exposes the same Labels/Crosstab/Contingencies interface as EncodedDataset, so the checks can
+        run on it directly. Codes are assigned in order of appearance while streaming, and reported sorted.
+
+        Input:
+        I : list<str> . input attributes as column names
+        P : list<str> . protected attributes as column names
+        O : <str> . output column name
+        max_comb_size : int . Maximum number of input columns combined as a single proxy (None for all)
+        '''
+        if(max_comb_size is None or max_comb_size > len(I)):
+            max_comb_size = len(I)
+        self.I, self.P, self.O = list(I), list(P), O
+        self.columns = list(dict.fromkeys(self.I + self.P + [O]))
+        self.combos = [list(c) for size in range(1, max_comb_size + 1) for c in combinations(self.I, size)]
+        self.n_rows = 0
+        #csv the counts were read from: its header and the bytes of it folded so far (see AppendCSV)
+        self.header = None
+        self.offset = 0
+        #vocabulary of every column: label -> code, and labels by code (in order of appearance)
+        self._vocabulary = {c: {} for c in self.columns}
+        self._appearance = {c: [] for c in self.columns}
+        self._tables = {}
+        for combo in self.combos:
+            for p in self.P:
+                self._tables[(tuple(combo), p)] = CountTable(combo + [p])
+        for p in self.P:
+            self._tables[((p,), O)] = CountTable([p, O])
+        self._sorted = None
+
+    def _ChunkCodes(self, column, values):
+        '''
+        Codes of a chunk of values of the column in the shared vocabulary, extending it with new labels
+        '''
+        import pandas as pd
+        codes, uniques = pd.factorize(values)
+        vocabulary, appearance = self._vocabulary[column], self._appearance[column]
+        lookup = []
+        for label in list(uniques) + [_MISSING]:
+            if(label is not _MISSING or (codes < 0).any()):
+                if(label not in vocabulary):
+                    vocabulary[label] = len(appearance)
+                    appearance.append(np.nan if label is _MISSING else label)
+                lookup.append(vocabulary[label])
+            else:
+                lookup.append(-1)
+        #-1 (missing) picks the last entry of the lookup
+        return np.array(lookup, dtype=np.int64)[codes]
+
+    def AddChunk(self, df):
+        '''
+        Folds a chunk of rows (a dataframe with, at least, the I, P and O columns) into the count tables
+        '''
+        codes = {c: self._ChunkCodes(c, df[c]) for c in self.columns}
+        cardinalities = {c: len(self._appearance[c]) for c in self.columns}
+        for table in self._tables.values():
+            chunk_keys, chunk_counts = CountRows([codes[c] for c in table.columns], [cardinalities[c] for c in table.columns])
+            table.Add(chunk_keys, chunk_counts, [cardinalities[c] for c in table.columns])
+        self.n_rows += len(df)
+        self._sorted = None
+
+    def Merge(self, other):
+        '''
+        Adds the counts accumulated by another StreamedCounts over the same columns
+        (e.g. built on another part of the dataset)
+        '''
+        if(other.columns != self.columns or other.combos != self.combos):
+            raise ValueError('Cannot merge counts of different columns')
+        import pandas as pd
+        #translate the codes of the other vocabularies to ours
+        translation = {}
+        for c in self.columns:
+            self._ChunkCodes(c, pd.Series(other._appearance[c], dtype=object))
+            translation[c] = np.array([self._vocabulary[c][_MISSING if pd.isnull(l) else l] for l in other._appearance[c]],
+                                      dtype=np.int64)
+        cardinalities = {c: len(self._appearance[c]) for c in self.columns}
+        for key, table in self._tables.items():
+            theirs = other._tables[key]
+            keys = np.stack([translation[c][theirs.keys[:, k]] for k, c in enumerate(table.columns)], axis=1) \
+                if len(theirs.counts) > 0 else theirs.keys
+            table.Add(keys, theirs.counts, [cardinalities[c] for c in table.columns])
+        self.n_rows += other.n_rows
+        self._sorted = None
+
+    def Bytes(self):
+        '''
+        Memory held by the count tables, in bytes
+        '''
+        return sum(table.Bytes() for table in self._tables.values())
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        #the vocabularies are keyed by the _MISSING sentinel, which does not survive pickling: they are rebuilt on load
+        del state['_vocabulary']
+        state['_sorted'] = None
+        return state
+
+    def __setstate__(self, state):
+        import pandas as pd
+        self.__dict__.update(state)
+        self._vocabulary = {c: {(_MISSING if pd.isnull(l) else l): code for code, l in enumerate(self._appearance[c])}
+                            for c in self.columns}
+
+    def Save(self, path):
+        '''
+        Writes the count tables to a file, so that a later run can go on folding new rows into them (see LoadCounts)
+        '''
+        tmp = '{}.tmp-{}'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp, path)
+
+    def _Sorted(self, column):
+        '''
+        Returns (rank, labels): the sorted position of every appearance code, and the labels sorted
+        as FactorizeColumn does (missing values last)
+        '''
+        if(self._sorted is None):
+            self._sorted = {}
+        if(column not in self._sorted):
+            import pandas as pd
+            appearance = self._appearance[column]
+            present = [k for k, l in enumerate(appearance) if not pd.isnull(l)]
+            order = sorted(present, key=lambda k: appearance[k]) + [k for k in range(len(appearance)) if pd.isnull(appearance[k])]
+            rank = np.empty(len(appearance), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self._sorted[column] = (rank, [appearance[k] for k in order])
+        return self._sorted[column]
+
+    def Labels(self, column):
+        '''
+        Returns the original values of the column, indexed by (sorted) code
+        '''
+        return self._Sorted(column)[1]
+
+    def LabelsByAppearance(self, column):
+        '''
+        Returns the original values of the column, in order of first appearance in the stream
+        '''
+        return list(self._appearance[column])
+
+    def Cardinality(self, column):
+        '''
+        Returns the number of distinct values of the column
+        '''
+        return len(self._appearance[column])
+
+    def _SortedKeys(self, table):
+        return [self._Sorted(c)[0][table.keys[:, k]] for k, c in enumerate(table.columns)]
+
+    def Crosstab(self, a, b):
+        '''
+        Counts of every (value of a, value of b) pair, see EncodedDataset.Crosstab.
+        Only available for the (protected, output) pairs accumulated while streaming.
+        '''
+        table = self._tables[((a,), b)]
+        keys = self._SortedKeys(table)
+        counts = np.zeros((self.Cardinality(a), self.Cardinality(b)), dtype=np.int64)
+        np.add.at(counts, (keys[0], keys[1]), table.counts)
+        return counts
+
+    def Contingencies(self, columns, targets):
+        '''
+        Contingency tables of a combination of inputs with several protected columns, see EncodedDataset.Contingencies.
+        Rows only cover the combined values that were observed, in the same order as in EncodedDataset.
+        '''
+        combo_counts = None
+        contingencies = []
+        for t in targets:
+            table = self._tables[(tuple(columns), t)]
+            keys = self._SortedKeys(table)
+            combined, _ = CombineCodes(keys[:-1], [self.Cardinality(c) for c in columns])
+            rows, n_rows = Compact(combined)
+            contingency = np.zeros((n_rows, self.Cardinality(t)), dtype=np.int64)
+            np.add.at(contingency, (rows, keys[-1]), table.counts)
+            contingencies.append((t, contingency))
+            if(combo_counts is None):
+                combo_counts = contingency.sum(axis=1)
+        return combo_counts, contingencies
+
+
+def LoadCounts(path):
+    '''
+    Reads count tables written by StreamedCounts.Save
+    '''
+    with open(path, 'rb') as f:
+        counts = pickle.load(f)
+    if(not isinstance(counts, StreamedCounts)):
+        raise ValueError('{} does not hold count tables'.format(path))
+    return counts
+
+
+class _FileSlice():
+    '''
+    Read-only view of an open file up to a given byte, for pd.read_csv
+    '''
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def read(self, size = -1):
+        remaining = max(0, self.end - self.f.tell())
+        return self.f.read(remaining if size is None or size < 0 else min(size, remaining))
+
+
+def _LastLineEnd(f, start, end):
+    '''
+    Returns the position after the last newline of the file in [start, end), or start if there is none
+    '''
+    position = end
+    while(position > start):
+        block_start = max(start, position - _TAIL_BLOCK)
+        f.seek(block_start)
+        newline = f.read(position - block_start).rfind(b'\n')
+        if(newline >= 0):
+            return block_start + newline + 1
+        position = block_start
+    return start
+
+
+def AppendCSV(counts, csv_path_dataset, chunksize = 100000, complete_lines = True):
+    '''
+    Folds into the count tables the rows appended to a csv since it was last read (all of it the first time),
+    so that an update only reads the new rows. The csv must only grow by appending rows to its end.
+
+    Input:
+    counts : StreamedCounts . count tables to update
+    csv_path_dataset : <str> . csv dataset, in which the first row are the columns
+    chunksize : int . rows read at once
+    complete_lines : bool . leave out a last line not ended by a newline yet (e.g. still being written),
+        it is read by the next update
+    Returns:
+    StreamedCounts . counts, updated
+    '''
+    import pandas as pd
+    header = ReadColumns(csv_path_dataset)
+    if(counts.header is not None and counts.header != header):
+        raise ValueError('The columns of {} changed since it was last read'.format(csv_path_dataset))
+    with open(csv_path_dataset, 'rb') as f:
+        end = os.fstat(f.fileno()).st_size
+        if(end < counts.offset):
+            raise ValueError('{} is shorter than when it was last read, rows were not only appended'.format(csv_path_dataset))
+        if(complete_lines):
+            end = _LastLineEnd(f, counts.offset, end)
+        f.seek(counts.offset)
+        if(end > counts.offset):
+            first = counts.offset == 0
+            for chunk in pd.read_csv(_FileSlice(f, end), sep=',', header=0 if first else None, names=None if first else header,
+                                     usecols=counts.columns, dtype=str, chunksize=chunksize):
+                counts.AddChunk(chunk)
+    counts.header = header
+    counts.offset = end
+    return counts
+
+
+def StreamCSV(csv_path_dataset, I, P, O, max_comb_size = None, chunksize = 100000):
+    '''
+    Reads a csv dataset chunk by chunk, keeping only the count tables needed to attest discrimination.
+    Peak memory is bounded by the size of a chunk plus the size of the tables.
+
+    Input:
+    csv_path_dataset : <str> . csv dataset, in which the first row are the columns
+    I, P, O, max_comb_size : see StreamedCounts
+    chunksize : int . rows read at once
+    Returns:
+    StreamedCounts
+    '''
+    return AppendCSV(StreamedCounts(I, P, O, max_comb_size), csv_path_dataset, chunksize, complete_lines = False)
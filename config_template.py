@@ -1,3 +1,8 @@
+#
+# Configuration of the audit of a dataset. The same names can be set in a json or toml file instead (see Config.py),
+# where tuples are written as lists, and None as null in json (toml has no None, options left out take their default).
+#
+
 #
 # DATASET
 #
@@ -34,6 +39,7 @@ CONFIG = {
 #         [{'I':['input_column_1', 'input_column_2'], 'P'='protected_column_name' } ]
 # e.g.
 #     >>[{'I':['strength', 'age'], 'P'='gender' } ]
+# The order of the columns in I does not matter.
 # 
 # [Indirect]
 # Indirect exceptions are defined as:
@@ -45,11 +51,21 @@ CONFIG = {
 #         Ov: output value from O (value of the output O)
 # e.g.
 #     >>[{'P':'ethnicity', 'Pv':('white', 'caucasian'), 'O':'salary', 'Ov':'>50k']
+# The order of the two values in Pv does not matter.
+#
+# [Intersectional] (optional, see _Intersectional)
+# Intersectional exceptions are defined as the indirect ones, with a list of protected columns in P and the values of
+# both subgroups in those columns in Pv:
+#     list< {'P': list<str>, 'Pv':(list<str>, list<str>), 'O':<str>, 'Ov':<str>} > 
+# e.g.
+#     >>[{'P':['sex', 'race'], 'Pv':(['male', 'white'], ['female', 'black']), 'O':'salary', 'Ov':'>50k'}]
+# Neither the order of the columns nor the order of the two subgroups matters.
 # >>
 EXCEPTIONS = {
     'Explicit' : [],
     'Implicit' : [],
-    'Indirect' : []
+    'Indirect' : [],
+    'Intersectional' : []
     
 }
 
@@ -75,4 +91,62 @@ _IndirectDiscrimination_Threshold = 0.8
 # Minimum p-value to consider any indirect discrimiantion findings. Results with higher p-values will be ignored.
 _IndirectDiscrimination_MinPValue = 0.05
 
+# Multiple-comparison correction applied to the p-values of all the chi2 tests of indirect discrimination before comparing
+# them with _IndirectDiscrimination_MinPValue: None (default), 'holm' (Holm-Bonferroni) or 'bh' (Benjamini-Hochberg).
+_IndirectDiscrimination_PValueCorrection = None
+
+# Implementation of the normalized mutual information used to score proxies: 'native' (default, MutualInformation.py)
+# or 'sklearn' (sklearn.metrics.cluster.normalized_mutual_info_score, much slower, needs scikit-learn installed).
+# Both give the same values.
+_ImplicitDiscrimination_nmi_backend = 'native'
+
+# How combinations of input columns are searched for proxies:
+#   'exhaustive' : every combination up to _ImplicitDiscrimination_max_proxy_combo_size is scored (default).
+#   'lattice' : level-wise search that only extends combinations which can still lead to a violation (see ProxySearch.py).
+#               It reports the same violations as 'exhaustive'. Its pruning only pays off at high thresholds
+#               (e.g. _ImplicitDiscrimination_min_corr = 0.6) or when some combinations are unique per row (unique_key):
+#               at lower thresholds almost every combination can still reach the threshold, and it scores as many
+#               combinations as 'exhaustive' (e.g. all of the 21,777 combinations of size 6 of german_credit at 0.1-0.4).
+# The cost of the lattice search is bounded with a time budget (seconds) and a memory budget (bytes). If a budget stops
+# the search, a warning is printed and larger combinations are left unchecked. None means no limit.
+_ImplicitDiscrimination_search = 'exhaustive'
+_ImplicitDiscrimination_time_budget = None
+_ImplicitDiscrimination_memory_budget = None
+
+# Number of worker processes that score combinations of input columns in parallel (None or 1 for serial, -1 for one
+# per core). Workers read the encoded columns from shared memory, and results are identical to the serial run.
+# It can also be given as the n_jobs argument of NormativeApproachDiscrimination, which takes precedence.
+_ImplicitDiscrimination_n_jobs = None
+
+# Number of strongest (combination, protected column) pairs kept by the implicit check whether they reach
+# _ImplicitDiscrimination_min_corr or not, e.g. to review the near misses. They are reported in the
+# implicit_search_summary['top'] of the NormativeApproachDiscrimination object. None keeps none.
+_ImplicitDiscrimination_top_k = None
+
+# Intersectional check (Vx): indirect discrimination between subgroups defined by the values of several protected
+# columns at once (e.g. sex x race x age), with the _IndirectDiscrimination_* threshold, p-value and correction.
+# Combinations of 2 to _Intersectional_max_comb_size protected columns are checked (None for up to all of them),
+# and subgroups with fewer rows than _Intersectional_min_support (a number of rows, or a fraction of the rows of
+# the dataset if below 1) are skipped. Not available in streaming mode.
+_Intersectional = False
+_Intersectional_max_comb_size = None
+_Intersectional_min_support = 0.01
+
+# On-disk cache of encoded datasets (see Cache.py): folder, and maximum size in bytes beyond which the least recently
+# used datasets are evicted. Cached datasets are keyed by the contents of the csv and the I, P, O columns, so runs with
+# other thresholds or exceptions reuse the encoded columns, NMI scores and crosstabs of previous runs. None for no cache.
+# Both can also be given as arguments of NormativeApproachDiscrimination (cache_dir, cache_max_bytes), which take precedence.
+_Cache_dir = None
+_Cache_max_bytes = 1 << 30
 
+# Approximate audits, for a fast first answer on large datasets (see Run and Sampling.py). Implicit and indirect discrimination
+# are estimated on a sample of _Approximate_sample_rows rows, stratified by the protected columns, and every estimate gets a
+# confidence interval at the _Approximate_confidence level. Only the candidates whose interval straddles
+# _ImplicitDiscrimination_min_corr or _IndirectDiscrimination_Threshold are computed on the whole dataset, unless 
+# _Approximate_refine is False, in which case they are reported as 'provisional' violations. The same seed draws the same sample.
+# It can also be set for a single run with Run(approximate = True). Not available in streaming mode.
+_Approximate = False
+_Approximate_sample_rows = 100000
+_Approximate_confidence = 0.99
+_Approximate_refine = True
+_Approximate_seed = 0
@@ -0,0 +1,11 @@
+#the modules of the repository are imported from its root folder
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#csv and config of every bundled dataset, under DatasetsClean (the adult csv is not bundled)
+DATASETS = {'german': ('german_credit_quantile/german_credit_quantile.csv', 'german_credit_quantile/config_german_credit_quantile.py'),
+            'compas': ('compas_recidivism/compas-scores-pretrial-reduced.csv', 'compas_recidivism/config_compas-recidivism-parsed.py'),
+            'adult': ('adult_quantile/adult_quantile.csv', 'adult_quantile/config_adult_quantile.py')}
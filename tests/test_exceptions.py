@@ -0,0 +1,18 @@
+#Exceptions added to the config of an audit after it was created must apply to the next run
+import os
+from conftest import ROOT, DATASETS
+import NormativeApproach as daddna
+
+
+def test_exceptions_added_after_creation_apply():
+    csv_path, config_path = [os.path.join(ROOT, 'DatasetsClean', path) for path in DATASETS['compas']]
+    na = daddna.NormativeApproachDiscrimination(csv_path, config_path)
+    na._ImplicitDiscrimination_min_corr = 0.02
+    violations = na.Run()
+    assert len(violations['Vi']) > 0 and len(violations['Vd']) > 0
+    na.exceptions['Implicit'] += [{'I': v['I'], 'P': v['P']} for v in violations['Vi']]
+    na.exceptions['Indirect'] += [{'P': v['P'], 'Pv': v['Pv'], 'O': v['O'], 'Ov': v['Ov']} for v in violations['Vd']]
+    violations = na.Run()
+    assert violations['Vi'] == [] and violations['Vd'] == []
+    sweep = na.Sweep()
+    assert (sweep['type'] == 'Ve').all()
@@ -0,0 +1,10 @@
+#Importing the library must stay light: under the import budget, and without the heavy dependencies it loads lazily
+import pytest
+from Benchmark import ImportTime, DEFAULT_IMPORT_BUDGET
+
+
+@pytest.mark.parametrize('module', ['NormativeApproach', 'Config', 'Batch', 'Service'])
+def test_import_is_light(module):
+    result = ImportTime(module, repeat = 3)
+    assert result['imported'] == [], '{} imports {}'.format(module, result['imported'])
+    assert result['seconds'] < DEFAULT_IMPORT_BUDGET, '{} takes {:.3f}s to import'.format(module, result['seconds'])
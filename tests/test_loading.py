@@ -0,0 +1,49 @@
+#Columnar datasets (Parquet, Feather, Arrow) must load as the csv they were converted from
+import os
+import pytest
+from conftest import ROOT, DATASETS
+import NormativeApproach as daddna
+from Config import LoadConfig
+from Loading import Convert, LoadDataset, ReadColumns, EXTENSIONS
+
+pa = pytest.importorskip('pyarrow')
+pd = pytest.importorskip('pandas')
+
+
+def _Paths(name):
+    csv_path, config_path = [os.path.join(ROOT, 'DatasetsClean', path) for path in DATASETS[name]]
+    if(not os.path.exists(csv_path)):
+        pytest.skip('{} is not bundled'.format(csv_path))
+    return csv_path, config_path
+
+
+@pytest.mark.parametrize('fmt', sorted(EXTENSIONS))
+@pytest.mark.parametrize('name', sorted(DATASETS))
+def test_columnar_load_matches_csv(name, fmt, tmp_path):
+    csv_path, config_path = _Paths(name)
+    path = Convert(csv_path, fmt, str(tmp_path / ('dataset' + EXTENSIONS[fmt])))
+    assert ReadColumns(path) == ReadColumns(csv_path)
+    config = LoadConfig(config_path).CONFIG
+    columns = config['I'] + config['P'] + [config['O']]
+    for categorical in (True, False):
+        pd.testing.assert_frame_equal(LoadDataset(path, columns, categorical), LoadDataset(csv_path, columns, categorical))
+    pd.testing.assert_frame_equal(LoadDataset(path), LoadDataset(csv_path))
+
+
+def test_arrow_stream_load_matches_csv(tmp_path):
+    csv_path, _ = _Paths('compas')
+    table = pa.Table.from_pandas(LoadDataset(csv_path), preserve_index=False)
+    path = str(tmp_path / 'dataset.arrow')
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    assert ReadColumns(path) == ReadColumns(csv_path)
+    pd.testing.assert_frame_equal(LoadDataset(path), LoadDataset(csv_path))
+
+
+@pytest.mark.parametrize('fmt', sorted(EXTENSIONS))
+def test_columnar_audit_matches_csv(fmt, tmp_path):
+    csv_path, config_path = _Paths('compas')
+    path = Convert(csv_path, fmt, str(tmp_path / ('dataset' + EXTENSIONS[fmt])))
+    expected = daddna.NormativeApproachDiscrimination(csv_path, config_path).Run()
+    assert daddna.NormativeApproachDiscrimination(path, config_path).Run() == expected
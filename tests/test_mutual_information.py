@@ -0,0 +1,34 @@
+#The native NMI (MutualInformation.py) must give the scores of sklearn's normalized_mutual_info_score
+import os
+import warnings
+import pytest
+from conftest import ROOT, DATASETS
+from Config import LoadConfig
+from Encoding import EncodedDataset
+from Loading import LoadDataset
+from MutualInformation import NMIKernel
+from ProxySearch import ProxyCombinations
+
+#scores farther apart than this are not the same
+TOLERANCE = 1e-12
+
+
+@pytest.mark.parametrize('name', sorted(DATASETS))
+def test_native_nmi_matches_sklearn(name):
+    metrics = pytest.importorskip('sklearn.metrics')
+    csv_path, config_path = [os.path.join(ROOT, 'DatasetsClean', path) for path in DATASETS[name]]
+    if(not os.path.exists(csv_path)):
+        pytest.skip('{} is not bundled'.format(csv_path))
+    config = LoadConfig(config_path)
+    I, P = config.CONFIG['I'], config.CONFIG['P']
+    encoded = EncodedDataset(LoadDataset(csv_path, I + P))
+    kernel = NMIKernel()
+    targets = [(p, encoded.Codes(p), encoded.Cardinality(p)) for p in P]
+    #sklearn warns about changes of its defaults on every call
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        for combo in ProxyCombinations(I, config._ImplicitDiscrimination_max_proxy_combo_size):
+            codes, cardinality = encoded.Combine(combo)
+            for p, nmi in zip(P, kernel.ScoreAgainst(codes, cardinality, targets)):
+                expected = metrics.normalized_mutual_info_score(codes, encoded.Codes(p))
+                assert abs(nmi - expected) <= TOLERANCE, (combo, p, nmi, expected)
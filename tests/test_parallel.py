@@ -0,0 +1,19 @@
+#Scoring the proxy combinations in several processes must report the same violations, in the same order
+import os
+import pytest
+from conftest import ROOT, DATASETS
+import NormativeApproach as daddna
+
+
+@pytest.mark.parametrize('search', ['exhaustive', 'lattice'])
+def test_workers_report_the_serial_violations(search):
+    csv_path, config_path = [os.path.join(ROOT, 'DatasetsClean', path) for path in DATASETS['german']]
+    violations = {}
+    for n_jobs in (1, 2):
+        na = daddna.NormativeApproachDiscrimination(csv_path, config_path, n_jobs = n_jobs)
+        na._ImplicitDiscrimination_min_corr = 0.3
+        na._ImplicitDiscrimination_search = search
+        violations[n_jobs] = na.RunCheck('Vi')
+        assert na.stats.counters['implicit.workers'] == n_jobs
+    assert len(violations[1]) > 0
+    assert violations[2] == violations[1]
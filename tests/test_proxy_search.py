@@ -0,0 +1,52 @@
+#The lattice search must report the same implicit violations as the exhaustive one, unless a budget stops it
+import os
+import pytest
+from conftest import ROOT, DATASETS
+import NormativeApproach as daddna
+
+#thresholds low enough for both datasets to have implicit violations
+THRESHOLDS = {'german': 0.3, 'compas': 0.02}
+
+
+def _Audit(name):
+    csv_path, config_path = [os.path.join(ROOT, 'DatasetsClean', path) for path in DATASETS[name]]
+    na = daddna.NormativeApproachDiscrimination(csv_path, config_path)
+    na._ImplicitDiscrimination_min_corr = THRESHOLDS[name]
+    return na
+
+
+@pytest.mark.parametrize('name', ['german', 'compas'])
+def test_lattice_reports_the_exhaustive_violations(name):
+    na = _Audit(name)
+    na._ImplicitDiscrimination_search = 'exhaustive'
+    exhaustive = na.RunCheck('Vi')
+    na._ImplicitDiscrimination_search = 'lattice'
+    lattice = na.RunCheck('Vi')
+    assert len(exhaustive) > 0
+    assert lattice == exhaustive
+    assert na.implicit_search_summary['exact']
+
+
+@pytest.mark.parametrize('name', ['german', 'compas'])
+def test_lattice_unique_key_pruning(name):
+    #a row identifier is a unique key: every combination that contains it is pruned by the unique_key rule
+    na = _Audit(name)
+    df = na.df.copy()
+    df['row_id'] = range(len(df))
+    I = ['row_id'] + na.config['I']
+    args = (df, I, na.config['P'], na.exceptions['Implicit'], THRESHOLDS[name])
+    exhaustive = na.CheckImplicitDiscrimination(*args, max_comb_size = 2)
+    lattice = na.CheckImplicitDiscrimination(*args, max_comb_size = 2, search = 'lattice')
+    assert lattice == exhaustive
+    assert na.implicit_search_summary['pruned']['unique_key'] > 0
+
+
+def test_lattice_time_budget(capsys):
+    na = _Audit('german')
+    na._ImplicitDiscrimination_search = 'lattice'
+    na._ImplicitDiscrimination_time_budget = 1e-9
+    na.RunCheck('Vi')
+    summary = na.implicit_search_summary
+    assert not summary['exact']
+    assert summary['truncated_by'] == 'time_budget'
+    assert '[!] Warning, the proxy search was stopped by its time budget' in capsys.readouterr().out
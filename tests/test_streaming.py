@@ -0,0 +1,51 @@
+#Streaming mode must report the same violations as the in-memory audit
+import os
+import pytest
+from conftest import ROOT, DATASETS
+import NormativeApproach as daddna
+
+#thresholds low enough for both datasets to have implicit violations
+THRESHOLDS = {'german': 0.3, 'compas': 0.02}
+
+
+def _Paths(name):
+    return [os.path.join(ROOT, 'DatasetsClean', path) for path in DATASETS[name]]
+
+
+def _Audit(csv_path, config_path, name, **kwargs):
+    na = daddna.NormativeApproachDiscrimination(csv_path, config_path, **kwargs)
+    na._ImplicitDiscrimination_min_corr = THRESHOLDS[name]
+    return na
+
+
+def test_update_from_saved_state(tmp_path):
+    csv_path, config_path = _Paths('compas')
+    expected = _Audit(csv_path, config_path, 'compas').Run()
+    with open(csv_path, 'rb') as f:
+        lines = f.read().splitlines(keepends = True)
+    log, state = str(tmp_path / 'log.csv'), str(tmp_path / 'state.pkl')
+    split = len(lines) // 3
+    with open(log, 'wb') as f:
+        f.write(b''.join(lines[:split]))
+    na = _Audit(log, config_path, 'compas', streaming = True, chunksize = 1000)
+    na.Update()
+    na.SaveState(state)
+    #a later run goes on from the saved count tables, with the rest of the rows
+    with open(log, 'ab') as f:
+        f.write(b''.join(lines[split:]))
+    na = _Audit(log, config_path, 'compas', streaming = True, chunksize = 1000)
+    na.LoadState(state)
+    violations = na.Update()
+    assert na.counts.n_rows == len(lines) - 1
+    assert len(expected['Vi']) > 0 and len(expected['Vd']) > 0
+    for violation_type in ('Ve', 'Vi', 'Vd'):
+        assert violations[violation_type] == expected[violation_type]
+
+
+@pytest.mark.parametrize('name', ['german', 'compas'])
+def test_streaming_matches_in_memory(name):
+    csv_path, config_path = _Paths(name)
+    expected = _Audit(csv_path, config_path, name).Run()
+    violations = _Audit(csv_path, config_path, name, streaming = True, chunksize = 333).Run()
+    assert len(expected['Vi']) > 0 and len(expected['Vd']) > 0
+    assert violations == expected
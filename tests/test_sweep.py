@@ -0,0 +1,46 @@
+#Every point of a sweep must get the violations Run reports with those values in the config
+import os
+import itertools
+import pytest
+import pandas as pd
+from conftest import ROOT, DATASETS
+import NormativeApproach as daddna
+
+#grid of (min_corr, max_comb_size, threshold, min_pvalue) of every dataset
+GRIDS = {'german': ([0.1, 0.15], [1, 2], [0.8, 0.95], [0.01, 0.5]),
+         'compas': ([0.02, 0.3], [1, 2], [0.8, 0.95], [0.01, 0.5])}
+
+
+def _Violations(table):
+    #sweep rows of a point, as the violations of Run
+    implicit = [{'I': list(row.I), 'P': row.P, 'corr': row.corr} for row in table[table.type == 'Vi'].itertuples()]
+    indirect = [(row.P, row.Pv, row.O, row.Ov, row.ratio, row.pvalue, None if pd.isnull(row.pvalue_adjusted) else row.pvalue_adjusted)
+                for row in table[table.type == 'Vd'].itertuples()]
+    return list(table[table.type == 'Ve'].P), implicit, indirect
+
+
+@pytest.mark.parametrize('name, correction', list(itertools.product(['german', 'compas'], [None, 'holm', 'bh'])))
+def test_sweep_matches_run(name, correction):
+    csv_path, config_path = [os.path.join(ROOT, 'DatasetsClean', path) for path in DATASETS[name]]
+    na = daddna.NormativeApproachDiscrimination(csv_path, config_path)
+    na._IndirectDiscrimination_pvalue_correction = correction
+    min_corr, max_comb_size, threshold, min_pvalue = GRIDS[name]
+    #exceptions covering some of the violations of the loosest point
+    na._ImplicitDiscrimination_min_corr, na._ImplicitDiscrimination_Max_proxy_combo_size = min(min_corr), max(max_comb_size)
+    na._IndirectDiscrimination_min_prop, na._IndirectDiscrimination_min_pvalue = max(threshold), max(min_pvalue)
+    violations = na.Run()
+    assert len(violations['Vi']) > 0 and len(violations['Vd']) > 0
+    na.exceptions['Implicit'] += [{'I': v['I'], 'P': v['P']} for v in violations['Vi'][::3]]
+    na.exceptions['Indirect'] += [{'P': v['P'], 'Pv': v['Pv'], 'O': v['O'], 'Ov': v['Ov']} for v in violations['Vd'][::3]]
+
+    sweep = na.Sweep(min_corr, threshold, min_pvalue, max_comb_size)
+    for corr, size, t, minp in itertools.product(min_corr, max_comb_size, threshold, min_pvalue):
+        na._ImplicitDiscrimination_min_corr, na._ImplicitDiscrimination_Max_proxy_combo_size = corr, size
+        na._IndirectDiscrimination_min_prop, na._IndirectDiscrimination_min_pvalue = t, minp
+        violations = na.Run()
+        point = sweep[(sweep.min_corr == corr) & (sweep.max_comb_size == size) & (sweep.threshold == t) & (sweep.min_pvalue == minp)]
+        explicit, implicit, indirect = _Violations(point)
+        assert explicit == violations['Ve']
+        assert implicit == violations['Vi']
+        assert indirect == [(v['P'], v['Pv'], v['O'], v['Ov'], v['ratio'], v['chi2']['pvalue'], v['chi2'].get('pvalue_adjusted'))
+                            for v in violations['Vd']]